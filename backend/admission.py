@@ -0,0 +1,257 @@
+"""
+Admission control of the contract routes.
+
+Before its body is parsed, every POST to a `contract/*` route gets an
+estimated token cost: the size of the uploaded documents, or the size of the
+thread for a `thread_id` follow-up. The request is admitted while the cost in
+flight for its endpoint and for its client stays within
+`ADMISSION_ENDPOINT_TOKENS` and `ADMISSION_CLIENT_TOKENS`. A request on an
+idle endpoint or client is always admitted, whatever its cost. Past capacity,
+the request is rejected at once with 429 and a `Retry-After` of the time the
+requests in flight need to free enough capacity, estimated from the measured
+serving time per token of every endpoint. A burst then gets quick 429s instead
+of queueing behind the workers until the gunicorn timeout kills it.
+
+The limits are per worker process. The client is identified by the header
+named in `ADMISSION_CLIENT_HEADER`, set by the reverse proxy in front of
+gunicorn (e.g. `X-Forwarded-For`, of which the last entry, added by the
+proxy, is used), or else by its address. Behind a unix socket there is no
+address: without the header, requests have no client and only the endpoint
+limit applies. Set `ADMISSION_CONTROL=off` to disable.
+"""
+
+import itertools
+import json
+import math
+import os
+import threading
+import time
+
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+
+from . import UTILS_LOGGER
+from .constants import (ADMISSION_BASE_TOKENS, ADMISSION_CLIENT_TOKENS,
+                        ADMISSION_ENDPOINT_TOKENS, ADMISSION_EWMA_WEIGHT,
+                        ADMISSION_MAX_RETRY_AFTER, ADMISSION_PEEK_BYTES,
+                        ADMISSION_SECONDS_PER_TOKEN,
+                        ADMISSION_UPLOAD_BYTES_PER_TOKEN)
+from .thread_store import ThreadStore
+from .tracing import set_span_attributes
+
+ADMISSION_PATH_PREFIX = "/contract/"
+REJECTED_STATUS_CODE = 429
+# Characters per token of plain text (prompts, questions)
+CHARS_PER_TOKEN = 4
+
+
+def is_admission_enabled():
+    return os.environ.get("ADMISSION_CONTROL", "on").lower() not in ("off", "false", "0")
+
+
+class AdmissionTicket:
+    """An admitted request, held until it is served."""
+
+    def __init__(self, ticket_id, endpoint, client, cost, started_at):
+        self.ticket_id = ticket_id
+        self.endpoint = endpoint
+        self.client = client
+        self.cost = cost
+        self.started_at = started_at
+
+
+class AdmissionController:
+    def __init__(self, endpoint_tokens=None, client_tokens=None, seconds_per_token=None,
+                 max_retry_after=ADMISSION_MAX_RETRY_AFTER):
+        """
+        Initialize the controller, the limits default to the ADMISSION_* environment variables.
+
+        Args:
+            endpoint_tokens (int, optional): Estimated tokens allowed in flight per endpoint.
+            client_tokens (int, optional): Estimated tokens allowed in flight per client.
+            seconds_per_token (float, optional): Serving time per token until one is measured.
+            max_retry_after (int, optional): Upper bound of the Retry-After in seconds.
+        """
+        self.endpoint_limit = int(os.environ.get("ADMISSION_ENDPOINT_TOKENS", ADMISSION_ENDPOINT_TOKENS)) \
+            if endpoint_tokens is None else endpoint_tokens
+        self.client_limit = int(os.environ.get("ADMISSION_CLIENT_TOKENS", ADMISSION_CLIENT_TOKENS)) \
+            if client_tokens is None else client_tokens
+        self.default_seconds_per_token = ADMISSION_SECONDS_PER_TOKEN if seconds_per_token is None \
+            else seconds_per_token
+        self.max_retry_after = max_retry_after
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.tickets = {}
+        self.endpoint_load = {}
+        self.client_load = {}
+        # Measured serving time per token of every endpoint (moving average)
+        self.seconds_per_token = {}
+
+    def admit(self, endpoint, client, cost):
+        """
+        Admit a request if its endpoint and its client have capacity left.
+
+        Args:
+            endpoint (str): Route of the request.
+            client (str | None): Key of the client, None skips the client limit.
+            cost (int): Estimated tokens of the request.
+
+        Returns:
+            tuple: The ticket to release once served and None, or None and the Retry-After in seconds.
+        """
+        now = time.monotonic()
+        with self.lock:
+            limits = []
+            endpoint_load = self.endpoint_load.get(endpoint, 0)
+            if endpoint_load and endpoint_load + cost > self.endpoint_limit:
+                limits.append((lambda ticket: ticket.endpoint == endpoint, endpoint_load, self.endpoint_limit))
+            client_load = self.client_load.get(client, 0)
+            if client is not None and client_load and client_load + cost > self.client_limit:
+                limits.append((lambda ticket: ticket.client == client, client_load, self.client_limit))
+
+            if limits:
+                wait_seconds = max(self.drain_seconds(selector, load, limit, cost, now)
+                                   for selector, load, limit in limits)
+                return None, min(max(math.ceil(wait_seconds), 1), self.max_retry_after)
+
+            ticket = AdmissionTicket(next(self.ids), endpoint, client, cost, now)
+            self.tickets[ticket.ticket_id] = ticket
+            self.endpoint_load[endpoint] = endpoint_load + cost
+            if client is not None:
+                self.client_load[client] = client_load + cost
+            return ticket, None
+
+    def drain_seconds(self, selector, load, limit, cost, now):
+        """
+        Return the seconds until enough of the selected requests in flight are expected to finish
+        for `cost` to fit in `limit`.
+        """
+        finishes = sorted(
+            (ticket.started_at + ticket.cost * self.get_seconds_per_token(ticket.endpoint), ticket.cost)
+            for ticket in self.tickets.values() if selector(ticket))
+        for finishes_at, ticket_cost in finishes:
+            load -= ticket_cost
+            if load <= 0 or load + cost <= limit:
+                return finishes_at - now
+        return 0
+
+    def get_seconds_per_token(self, endpoint):
+        return self.seconds_per_token.get(endpoint, self.default_seconds_per_token)
+
+    def release(self, ticket, served=True):
+        """
+        Free the capacity held by `ticket`.
+
+        Args:
+            ticket (AdmissionTicket): Ticket of the request.
+            served (bool, optional): Whether the request succeeded, only then its duration is measured.
+        """
+        seconds = time.monotonic() - ticket.started_at
+        with self.lock:
+            if self.tickets.pop(ticket.ticket_id, None) is None:
+                return
+            for loads, key in ((self.endpoint_load, ticket.endpoint), (self.client_load, ticket.client)):
+                if key not in loads:
+                    continue
+                loads[key] -= ticket.cost
+                if loads[key] <= 0:
+                    del loads[key]
+            if served and ticket.cost:
+                previous = self.seconds_per_token.get(ticket.endpoint)
+                measured = seconds / ticket.cost
+                self.seconds_per_token[ticket.endpoint] = measured if previous is None else \
+                    previous + ADMISSION_EWMA_WEIGHT * (measured - previous)
+
+
+# Shared by every handler of the process (the test client builds one handler per client)
+ADMISSION_CONTROLLER = AdmissionController()
+
+
+def estimate_cost(request):
+    """
+    Estimate the tokens a contract request will use, without parsing large bodies.
+
+    Documents are estimated from the size of the body, follow-ups from the size of their thread.
+
+    Returns:
+        int: Estimated tokens.
+    """
+    try:
+        content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        content_length = 0
+
+    if content_length > ADMISSION_PEEK_BYTES:
+        return ADMISSION_BASE_TOKENS + content_length // ADMISSION_UPLOAD_BYTES_PER_TOKEN
+
+    cost = ADMISSION_BASE_TOKENS + content_length // CHARS_PER_TOKEN
+    try:
+        payload = json.loads(request.body) if content_length else {}
+        thread_id = payload.get("thread_id") if isinstance(payload, dict) else None
+        if thread_id:
+            cost += ThreadStore.get_estimated_tokens(ThreadStore.resolve(thread_id))
+    except Exception:
+        # Malformed bodies and unknown threads are left to the views.
+        pass
+    return cost
+
+
+def get_client_key(request):
+    """
+    Return the key of the client, None when it cannot be trusted or is unknown.
+
+    Only the header set by the reverse proxy (`ADMISSION_CLIENT_HEADER`) is read, a header the
+    client sets itself could be changed on every request to dodge the client limit.
+    """
+    header = os.environ.get("ADMISSION_CLIENT_HEADER")
+    if header:
+        # The proxy appends the address it saw, earlier entries come from the client.
+        client = request.headers.get(header, "").split(",")[-1].strip()
+        return client or None
+    return request.META.get("REMOTE_ADDR") or None
+
+
+class AdmissionControlMiddleware:
+    """Admits or rejects with 429 the POST requests of the contract routes."""
+
+    def __init__(self, get_response, controller=ADMISSION_CONTROLLER):
+        self.get_response = get_response
+        self.controller = controller
+
+    def __call__(self, request):
+        if not is_admission_enabled() or request.method != "POST" \
+                or not request.path_info.startswith(ADMISSION_PATH_PREFIX):
+            return self.get_response(request)
+        try:
+            endpoint = resolve(request.path_info).route
+        except Resolver404:
+            return self.get_response(request)
+
+        client = get_client_key(request)
+        cost = estimate_cost(request)
+        ticket, retry_after = self.controller.admit(endpoint, client, cost)
+        set_span_attributes(**{"admission.cost": cost, "admission.admitted": ticket is not None})
+        if ticket is None:
+            UTILS_LOGGER.warning(f"Rejected a request to {endpoint} of {client} estimated at {cost} tokens, "
+                                 f"retry after {retry_after}s")
+            return self.reject(retry_after)
+
+        served = False
+        try:
+            response = self.get_response(request)
+            served = 200 <= response.status_code < 300
+            return response
+        finally:
+            self.controller.release(ticket, served)
+
+    @staticmethod
+    def reject(retry_after):
+        # Same body as the CustomValidation errors of the views
+        response = JsonResponse({
+            'status': False,
+            'message': "Too many requests in progress, retry later",
+            'data': {'retry_after': retry_after},
+            'status_code': REJECTED_STATUS_CODE,
+        }, status=REJECTED_STATUS_CODE)
+        response["Retry-After"] = str(retry_after)
+        return response
@@ -0,0 +1,108 @@
+"""
+Token budget planning for the LLM calls.
+
+The planner knows the context window and output limit of the deployed model
+(`LLM_MODEL_NAME`, overridable with `LLM_CONTEXT_TOKENS` / `LLM_OUTPUT_TOKENS`)
+and measures the prompt overhead of a task template with the real tokenizer.
+Document chunks are then packed in order into as few calls as the context
+window allows, instead of one call per fixed size chunk.
+"""
+
+import os
+
+from .constants import (DEFAULT_LLM_MODEL, MODEL_TOKEN_LIMITS,
+                        PROMPT_SAFETY_TOKENS, TOKEN_ESTIMATE_MARGIN)
+from .resources import ResourceRegistry
+
+PAYLOAD_SEPARATOR = "\n\n"
+# Tokens taken by PAYLOAD_SEPARATOR between two packed chunks
+SEPARATOR_TOKENS = 1
+
+
+def pack_by_tokens(token_counts, budget, separator_tokens=0):
+    """
+    Group consecutive items into batches fitting `budget`. An item over the budget is a batch of its own.
+
+    Args:
+        token_counts (list[int]): Token count of every item, in order.
+        budget (int): Token budget of a batch.
+        separator_tokens (int, optional): Tokens added between two items of a batch.
+
+    Returns:
+        list[list[int]]: Indices of the items of every batch, in order.
+    """
+    batches, batch_tokens = [], 0
+    for index, token_count in enumerate(token_counts):
+        if batches and batch_tokens + separator_tokens + token_count <= budget:
+            batches[-1].append(index)
+            batch_tokens += separator_tokens + token_count
+        else:
+            batches.append([index])
+            batch_tokens = token_count
+    return batches
+
+
+class TokenBudgetPlanner:
+    def __init__(self, model_name=None, context_tokens=None, output_tokens=None, encoding=None):
+        """
+        Initialize the planner.
+
+        Args:
+            model_name (str, optional): Model behind the deployment. Defaults to env LLM_MODEL_NAME.
+            context_tokens (int, optional): Context window. Defaults to env LLM_CONTEXT_TOKENS or the model limit.
+            output_tokens (int, optional): Output limit. Defaults to env LLM_OUTPUT_TOKENS or the model limit.
+            encoding (tiktoken.Encoding, optional): Defaults to the shared registry encoding.
+        """
+        self.model_name = model_name or os.environ.get("LLM_MODEL_NAME", DEFAULT_LLM_MODEL)
+        limits = MODEL_TOKEN_LIMITS.get(self.model_name, MODEL_TOKEN_LIMITS[DEFAULT_LLM_MODEL])
+        self.context_tokens = int(context_tokens or os.environ.get("LLM_CONTEXT_TOKENS") or limits["context"])
+        self.output_tokens = int(output_tokens or os.environ.get("LLM_OUTPUT_TOKENS") or limits["output"])
+        self._encoding = encoding
+
+    @property
+    def encoding(self):
+        return self._encoding or ResourceRegistry.get_encoding()
+
+    def count_tokens(self, text):
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def output_budget(self, output_tokens):
+        return min(int(output_tokens), self.output_tokens)
+
+    def payload_budget(self, prompt_overhead, output_tokens):
+        """
+        Return the tokens left for the payload of a call.
+
+        Args:
+            prompt_overhead (str | int): The prompt rendered with an empty payload, or its token count.
+            output_tokens (int): Tokens reserved for the answer, capped at the model output limit.
+
+        Returns:
+            int: The payload budget, at least 1.
+        """
+        if isinstance(prompt_overhead, str):
+            prompt_overhead = self.count_tokens(prompt_overhead)
+        available = self.context_tokens - self.output_budget(output_tokens) - prompt_overhead - PROMPT_SAFETY_TOKENS
+        return max(int(available * (1 - TOKEN_ESTIMATE_MARGIN)), 1)
+
+    def fits(self, token_count, prompt_overhead, output_tokens):
+        return token_count <= self.payload_budget(prompt_overhead, output_tokens)
+
+    def pack(self, chunks, prompt_overhead, output_tokens):
+        """
+        Pack chunks in order into as few payloads as the context window allows.
+
+        Args:
+            chunks (list[TextChunk]): The chunks, small enough to be packed.
+            prompt_overhead (str | int): The prompt rendered with an empty payload, or its token count.
+            output_tokens (int): Tokens reserved for the answer of every call.
+
+        Returns:
+            list[str]: The payloads, one per call.
+        """
+        budget = self.payload_budget(prompt_overhead, output_tokens)
+        batches = pack_by_tokens([chunk.token_count for chunk in chunks], budget, SEPARATOR_TOKENS)
+        return [PAYLOAD_SEPARATOR.join(chunks[index].text for index in batch) for batch in batches]
+
+
+TOKEN_BUDGET_PLANNER = TokenBudgetPlanner()
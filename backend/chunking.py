@@ -0,0 +1,187 @@
+"""
+Token exact text chunking.
+
+The text is encoded with tiktoken exactly once. Sentence boundaries coming
+from punkt are mapped onto token indices, so chunks are packed right up to
+the token budget without cutting a sentence (a single sentence longer than
+the budget is the only thing that gets split). Tokens and offsets are kept
+in numpy arrays and every chunk only holds a view on them.
+"""
+
+import numpy as np
+
+from .resources import ResourceRegistry
+
+
+class TextChunk:
+    """A chunk of text along with its position in the source text."""
+
+    __slots__ = ("text", "start_char", "end_char", "tokens")
+
+    def __init__(self, text, start_char, end_char, tokens):
+        self.text = text
+        self.start_char = start_char
+        self.end_char = end_char
+        self.tokens = tokens
+
+    @property
+    def token_count(self):
+        return len(self.tokens)
+
+    def __repr__(self):
+        return f"TextChunk(start_char={self.start_char}, end_char={self.end_char}, tokens={self.token_count})"
+
+
+class EncodedText:
+    """Result of a single tokenizer pass over a text."""
+
+    __slots__ = ("text", "tokens", "offsets")
+
+    def __init__(self, text, tokens, offsets):
+        self.text = text
+        # uint32 token ids and the character offset at which each token starts
+        self.tokens = tokens
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.tokens)
+
+
+class TokenChunker:
+    def __init__(self, max_tokens, overlap_tokens=0, encoding=None, sentence_tokenizer=None):
+        """
+        Initialize the chunker.
+
+        Args:
+            max_tokens (int): Maximum number of tokens in a chunk.
+            overlap_tokens (int, optional): Number of tokens of trailing sentences repeated at the start
+                                            of the next chunk. Defaults to 0.
+            encoding (tiktoken.Encoding, optional): Defaults to the shared registry encoding.
+            sentence_tokenizer (optional): Punkt like tokenizer exposing `span_tokenize`.
+                                           Defaults to the shared registry tokenizer.
+        """
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError("overlap_tokens must be between 0 and max_tokens")
+
+        self.max_tokens = int(max_tokens)
+        self.overlap_tokens = int(overlap_tokens)
+        self.encoding = encoding or ResourceRegistry.get_encoding()
+        self.sentence_tokenizer = sentence_tokenizer or ResourceRegistry.get_sentence_tokenizer()
+
+    def encode(self, text):
+        """
+        Tokenize `text` once and compute the character offset of every token.
+
+        Args:
+            text (str): The text to encode.
+
+        Returns:
+            EncodedText: Token ids and token start offsets as numpy arrays.
+        """
+        token_list = self.encoding.encode(text, disallowed_special=())
+        tokens = np.asarray(token_list, dtype=np.uint32)
+
+        # The token bytes concatenate to the utf-8 text, so mapping each token's
+        # first byte to the character holding it gives its character offset.
+        byte_lengths = np.fromiter(
+            map(len, self.encoding.decode_tokens_bytes(token_list)), dtype=np.int64, count=len(token_list))
+        byte_starts = np.concatenate(([0], np.cumsum(byte_lengths)[:-1])) if len(token_list) else byte_lengths
+        text_bytes = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+        char_index_of_byte = np.cumsum((text_bytes & 0xC0) != 0x80) - 1
+        offsets = char_index_of_byte[byte_starts] if len(token_list) else byte_starts
+
+        return EncodedText(text, tokens, offsets.astype(np.int64))
+
+    def sentence_spans(self, text):
+        """
+        Return the (start, end) character span of every sentence in `text`.
+        """
+        return np.asarray(list(self.sentence_tokenizer.span_tokenize(text)), dtype=np.int64).reshape(-1, 2)
+
+    def sentence_boundaries(self, encoded, sentence_spans):
+        """
+        Map sentence start offsets onto the index of the token holding them.
+
+        Returns:
+            numpy.ndarray: Sorted unique token indices, always starting with 0 and ending with the token count.
+        """
+        token_count = len(encoded)
+        if len(sentence_spans):
+            starts = np.searchsorted(encoded.offsets, sentence_spans[:, 0], side="right") - 1
+        else:
+            starts = np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(([0], np.clip(starts, 0, token_count), [token_count])))
+
+    def _chunk_end(self, start, boundaries, token_count):
+        """
+        Return the end token index of the chunk starting at token `start`.
+
+        This is the last sentence boundary fitting in the budget, or a hard cut
+        when the sentence starting the chunk alone is larger than the budget.
+        """
+        limit = start + self.max_tokens
+        if limit >= token_count:
+            return token_count
+        boundary = int(boundaries[np.searchsorted(boundaries, limit, side="right") - 1])
+        return boundary if boundary > start else limit
+
+    def chunk_encoded(self, encoded, sentence_spans):
+        """
+        Pack already encoded text into chunks.
+
+        Args:
+            encoded (EncodedText): Output of `encode`.
+            sentence_spans (numpy.ndarray): Output of `sentence_spans`.
+
+        Returns:
+            list[TextChunk]: The chunks in document order.
+        """
+        text = encoded.text
+        token_count = len(encoded)
+        if token_count == 0:
+            return []
+
+        boundaries = self.sentence_boundaries(encoded, sentence_spans)
+        chunks = []
+        start = 0
+
+        while start < token_count:
+            end = self._chunk_end(start, boundaries, token_count)
+            start_char = int(encoded.offsets[start])
+            end_char = int(encoded.offsets[end]) if end < token_count else len(text)
+            chunk_text = text[start_char:end_char]
+            stripped_text = chunk_text.strip()
+            if stripped_text:
+                start_char += len(chunk_text) - len(chunk_text.lstrip())
+                chunks.append(TextChunk(stripped_text, start_char, start_char + len(stripped_text),
+                                        encoded.tokens[start:end]))
+
+            if end >= token_count:
+                break
+
+            next_start = end
+            if self.overlap_tokens:
+                # Restart at the first sentence inside the overlap window, unless
+                # doing so would not move the end of the next chunk forward.
+                overlap_start = int(boundaries[np.searchsorted(boundaries, end - self.overlap_tokens, side="left")])
+                if start < overlap_start < end and self._chunk_end(overlap_start, boundaries, token_count) > end:
+                    next_start = overlap_start
+            start = next_start
+
+        return chunks
+
+    def chunk(self, text):
+        """
+        Split `text` into sentence aligned chunks of at most `max_tokens` tokens.
+
+        Args:
+            text (str): The text to split.
+
+        Returns:
+            list[TextChunk]: The chunks in document order.
+        """
+        if not text:
+            return []
+        return self.chunk_encoded(self.encode(text), self.sentence_spans(text))
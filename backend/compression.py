@@ -0,0 +1,184 @@
+"""
+Compression of the API responses.
+
+The comparison and summary answers are long JSON texts that compress several
+times over. The encoding is negotiated with the `Accept-Encoding` header of
+the request: brotli (`br`, with the brotli package), zstd (with the zstandard
+package) or gzip. Responses under `COMPRESSION_MIN_SIZE` bytes are sent as is.
+Streaming responses (e.g. server-sent events) are compressed chunk by chunk
+and every chunk is flushed, so that the client gets each event as soon as it
+is produced.
+"""
+
+import re
+import zlib
+
+from django.utils.cache import patch_vary_headers
+
+from .constants import (BROTLI_QUALITY, COMPRESSION_MIN_SIZE, GZIP_LEVEL,
+                        ZSTD_LEVEL)
+from .metrics import timed_stage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ACCEPT_ENCODING_ITEM = re.compile(r"^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+)\s*)?$")
+
+
+class GzipEncoder:
+    def __init__(self):
+        # wbits 31: deflate in a gzip container
+        self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self):
+        self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class ZstdEncoder:
+    def __init__(self):
+        self.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+# Available encoders, in the order preferred by the server when the client accepts several equally
+ENCODERS = {}
+if brotli is not None:
+    ENCODERS["br"] = BrotliEncoder
+if zstandard is not None:
+    ENCODERS["zstd"] = ZstdEncoder
+ENCODERS["gzip"] = GzipEncoder
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Pick the encoding of a response from the `Accept-Encoding` header of the request.
+
+    Args:
+        accept_encoding (str): Header value, e.g. "gzip, deflate, br;q=0.9".
+
+    Returns:
+        str | None: The accepted encoding with the highest weight, None to send the response as is.
+    """
+    weights = {}
+    for item in accept_encoding.lower().split(","):
+        match = ACCEPT_ENCODING_ITEM.match(item)
+        if match is None:
+            continue
+        try:
+            weights[match.group(1)] = float(match.group(2) or 1)
+        except ValueError:
+            continue
+
+    default_weight = weights.get("*", 0)
+    best_encoding, best_weight = None, 0
+    for encoding in ENCODERS:
+        weight = weights.get(encoding, default_weight)
+        if weight > best_weight:
+            best_encoding, best_weight = encoding, weight
+    return best_encoding
+
+
+def compress_content(encoding, content):
+    encoder = ENCODERS[encoding]()
+    return encoder.compress(content) + encoder.finish()
+
+
+def compress_stream(encoding, chunks):
+    encoder = ENCODERS[encoding]()
+    for chunk in chunks:
+        data = encoder.compress(chunk) + encoder.flush()
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+async def compress_async_stream(encoding, chunks):
+    encoder = ENCODERS[encoding]()
+    async for chunk in chunks:
+        data = encoder.compress(chunk) + encoder.flush()
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compresses the responses with the best encoding accepted by the client.
+
+    Mirrors django.middleware.gzip.GZipMiddleware, with brotli and zstd on top of gzip.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.compress(request, response)
+
+    def compress(self, request, response):
+        if response.has_header("Content-Encoding"):
+            return response
+        if not response.streaming and len(response.content) < COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = negotiate_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compress_async_stream(encoding, response.streaming_content)
+            else:
+                response.streaming_content = compress_stream(encoding, response.streaming_content)
+            del response.headers["Content-Length"]
+        else:
+            with timed_stage("compress"):
+                compressed_content = compress_content(encoding, response.content)
+            # Already compressed content can grow, keep the original then.
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers["Content-Length"] = str(len(response.content))
+
+        # The compressed body differs from the original, a strong ETag would no longer match it.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
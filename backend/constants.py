@@ -6,3 +6,92 @@ MODULE_EXCEPTION_TO_EMAIL_MAPPING = {
 }
 
 DATA_FOLDER_PATH = f"{BASE_DIR}/data"
+
+# Heavy NLP resources shared through backend.resources.ResourceRegistry
+SPACY_MODEL_NAME = "en_core_web_sm"
+TOKENIZER_MODEL_NAME = "gpt-3.5-turbo"
+SENTENCE_TOKENIZER_LANGUAGE = "english"
+# Heavy modules imported on first use, or by the warm up
+LAZY_MODULES = ("fitz", "openai")
+
+# Boilerplate and near duplicate elimination, see backend.dedup
+BOILERPLATE_EDGE_LINES = 3
+BOILERPLATE_MIN_PAGE_RATIO = 0.5
+BOILERPLATE_MIN_PAGES = 3
+MINHASH_PERMUTATIONS = 64
+MINHASH_SHINGLE_WORDS = 5
+NEAR_DUPLICATE_THRESHOLD = 0.85
+
+# Smallest table rendered as CSV by backend.pdf_tables, smaller ones stay plain text
+TABLE_MIN_ROWS = 2
+TABLE_MIN_COLUMNS = 2
+# Ruled frames around prose (letterheads, forms) have long cells, they are kept as plain text
+TABLE_MAX_MEAN_CELL_CHARS = 120
+
+# Stand-in Assistants client of the load tests (LLM_CLIENT=stand-in), see backend.stand_in_llm.
+# Seconds a run takes, its random deviation and the duration of a status poll.
+STAND_IN_LLM_LATENCY = 2.0
+STAND_IN_LLM_JITTER = 0.5
+STAND_IN_LLM_POLL_SECONDS = 0.05
+
+# Histogram buckets of the request and stage latencies in seconds, see backend.metrics
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Hierarchical reduction of per chunk results, see backend.reduce
+REDUCE_MAX_LEVELS = 4
+
+# Context window and output limit of the models the deployments can run, see backend.budget
+MODEL_TOKEN_LIMITS = {
+    "gpt-35-turbo": {"context": 16385, "output": 4096},
+    "gpt-35-turbo-16k": {"context": 16384, "output": 4096},
+    "gpt-4": {"context": 8192, "output": 4096},
+    "gpt-4-32k": {"context": 32768, "output": 4096},
+    "gpt-4-turbo": {"context": 128000, "output": 4096},
+    "gpt-4o": {"context": 128000, "output": 4096},
+    "gpt-4o-mini": {"context": 128000, "output": 16384},
+}
+DEFAULT_LLM_MODEL = "gpt-35-turbo"
+# Assistant instructions and message framing, not part of the task prompts
+PROMPT_SAFETY_TOKENS = 1000
+# Share of the budget kept free for tokenizer differences with the deployed model
+TOKEN_ESTIMATE_MARGIN = 0.05
+
+# Follow-up threads estimated above this share of the context window are compacted into a new thread
+THREAD_COMPACTION_RATIO = 0.5
+# Asked in the thread being compacted, the summary then seeds the new thread
+THREAD_COMPACTION = """
+Condense our conversation so far into a summary that can replace it. Keep the key facts of the contract \
+    (parties, dates, amounts, obligations), the questions asked, the answers given and any document being drafted \
+    in its latest version. Respond with the summary only.
+"""
+THREAD_COMPACTION_CONTEXT = """
+This is a summary of our conversation so far about a contract. Continue the conversation based on it.
+
+{summary}
+"""
+
+# Response compression, see backend.compression. Smaller responses are sent as is.
+COMPRESSION_MIN_SIZE = 1024
+# Levels suited to compressing on the fly, the maximum ones cost more CPU than they save in bandwidth
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+# Admission control of the contract routes, see backend.admission. Limits are per worker process.
+# Estimated tokens in flight allowed per endpoint and per client, a request alone is always admitted
+ADMISSION_ENDPOINT_TOKENS = 120000
+ADMISSION_CLIENT_TOKENS = 60000
+# Prompts and answer of a request, on top of its document or thread
+ADMISSION_BASE_TOKENS = 2000
+# Bytes of base64 PDF per token of extracted text, measured on the contracts of shared_contracts/
+ADMISSION_UPLOAD_BYTES_PER_TOKEN = 150
+# Bodies up to this size are read to find the thread of a follow-up
+ADMISSION_PEEK_BYTES = 4096
+# Serving time per estimated token until measured, and the weight of every new measure
+ADMISSION_SECONDS_PER_TOKEN = 0.001
+ADMISSION_EWMA_WEIGHT = 0.2
+# Upper bound of Retry-After, the gunicorn timeout
+ADMISSION_MAX_RETRY_AFTER = 300
+
+# Days the artifacts of a thread are kept after their last write, see backend.thread_store
+THREAD_RETENTION_DAYS = 30
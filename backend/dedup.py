@@ -0,0 +1,128 @@
+"""
+Boilerplate and near duplicate elimination.
+
+Contracts repeat headers, footers and legends on every page and often repeat
+whole standard clauses. Repeated edge lines are stripped from the pages before
+the document profile is built, and chunks whose MinHash signature is close to
+an already kept chunk are dropped before they reach the LLM.
+"""
+
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from . import UTILS_LOGGER
+from .constants import (BOILERPLATE_EDGE_LINES, BOILERPLATE_MIN_PAGE_RATIO,
+                        BOILERPLATE_MIN_PAGES, MINHASH_PERMUTATIONS,
+                        MINHASH_SHINGLE_WORDS, NEAR_DUPLICATE_THRESHOLD)
+
+DIGITS_PATTERN = re.compile(r"\d+")
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def normalize_line(line):
+    # Page numbers and dates change from page to page, the legend around them does not.
+    return DIGITS_PATTERN.sub("#", " ".join(line.split()).lower())
+
+
+def strip_repeated_page_lines(pages, edge_lines=BOILERPLATE_EDGE_LINES, min_page_ratio=BOILERPLATE_MIN_PAGE_RATIO,
+                              min_pages=BOILERPLATE_MIN_PAGES):
+    """
+    Remove header and footer lines repeated across pages.
+
+    A line is boilerplate when, once digits are masked, it shows up among the
+    first or last `edge_lines` non blank lines of at least `min_page_ratio` of the pages.
+
+    Args:
+        pages (list[str]): Text of every page.
+
+    Returns:
+        tuple[list[str], list[str]]: The cleaned pages and the removed lines.
+    """
+    if len(pages) < min_pages:
+        return list(pages), []
+
+    page_lines = [page.splitlines(keepends=True) for page in pages]
+    edge_indices = []
+    line_page_count = Counter()
+    for lines in page_lines:
+        filled = [index for index, line in enumerate(lines) if line.strip()]
+        edges = set(filled[:edge_lines] + filled[-edge_lines:])
+        edge_indices.append(edges)
+        line_page_count.update({normalize_line(lines[index]) for index in edges})
+
+    min_count = max(2, int(np.ceil(len(pages) * min_page_ratio)))
+    boilerplate = {line for line, count in line_page_count.items() if count >= min_count}
+    if not boilerplate:
+        return list(pages), []
+
+    cleaned_pages, removed_lines = [], []
+    for lines, edges in zip(page_lines, edge_indices):
+        kept = []
+        for index, line in enumerate(lines):
+            if index in edges and normalize_line(line) in boilerplate:
+                removed_lines.append(line)
+            else:
+                kept.append(line)
+        cleaned_pages.append("".join(kept))
+    return cleaned_pages, removed_lines
+
+
+class NearDuplicateFilter:
+    def __init__(self, permutations=MINHASH_PERMUTATIONS, shingle_words=MINHASH_SHINGLE_WORDS,
+                 threshold=NEAR_DUPLICATE_THRESHOLD, seed=1):
+        """
+        Initialize the filter.
+
+        Args:
+            permutations (int, optional): Number of MinHash permutations.
+            shingle_words (int, optional): Number of words per shingle.
+            threshold (float, optional): Estimated Jaccard similarity from which a chunk is a duplicate.
+            seed (int, optional): Seed of the permutation coefficients.
+        """
+        random_state = np.random.default_rng(seed)
+        self.a = random_state.integers(1, MERSENNE_PRIME, size=(permutations, 1), dtype=np.uint64)
+        self.b = random_state.integers(0, MERSENNE_PRIME, size=(permutations, 1), dtype=np.uint64)
+        self.shingle_words = shingle_words
+        self.threshold = threshold
+
+    def signature(self, text):
+        """
+        Return the MinHash signature of the word shingles of `text`.
+        """
+        words = text.lower().split()
+        width = min(self.shingle_words, max(len(words), 1))
+        shingles = {" ".join(words[index:index + width]) for index in range(max(len(words) - width + 1, 1))}
+        hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) & MERSENNE_PRIME for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        return ((self.a * hashes + self.b) % MERSENNE_PRIME).min(axis=1)
+
+    def filter(self, chunks):
+        """
+        Drop the chunks that are near duplicates of an earlier chunk.
+
+        Args:
+            chunks (list[TextChunk]): The chunks in document order.
+
+        Returns:
+            tuple[list[TextChunk], int]: The kept chunks and the number of tokens saved.
+        """
+        kept, tokens_saved = [], 0
+        signatures = np.empty((len(chunks), len(self.a)), dtype=np.uint64)
+        for chunk in chunks:
+            signature = self.signature(chunk.text)
+            if kept and (signatures[:len(kept)] == signature).mean(axis=1).max() >= self.threshold:
+                tokens_saved += chunk.token_count
+                continue
+            signatures[len(kept)] = signature
+            kept.append(chunk)
+
+        if tokens_saved:
+            UTILS_LOGGER.info(
+                f"Dropped {len(chunks) - len(kept)} near duplicate chunks, saving {tokens_saved} tokens")
+        return kept, tokens_saved
+
+
+NEAR_DUPLICATE_FILTER = NearDuplicateFilter()
@@ -0,0 +1,137 @@
+"""
+One pass profile of an extracted document.
+
+The profile is built once when the PDF text is extracted and handed to the
+engines, so strategy selection and chunking read precomputed values instead
+of re-scanning and re-tokenizing the text.
+"""
+
+import re
+
+import numpy as np
+
+from base.constants import MAX_TOKEN
+
+from .chunking import TokenChunker
+
+# Small stop word lists, enough to tell the languages our contracts come in apart.
+LANGUAGE_STOP_WORDS = {
+    "en": {"the", "and", "of", "to", "in", "shall", "is", "be", "for", "or", "with", "by", "this", "that"},
+    "fr": {"le", "la", "les", "et", "des", "du", "de", "est", "pour", "dans", "par", "une", "sur", "que"},
+    "de": {"der", "die", "das", "und", "ist", "von", "zu", "mit", "den", "des", "nicht", "ein", "eine", "für"},
+    "es": {"el", "la", "los", "las", "y", "de", "del", "que", "en", "por", "para", "con", "una", "se"},
+    "it": {"il", "lo", "la", "gli", "le", "e", "di", "del", "che", "per", "con", "una", "sono", "della"},
+    "pt": {"o", "os", "as", "e", "de", "do", "da", "que", "em", "para", "com", "uma", "não", "dos"},
+    "nl": {"de", "het", "een", "en", "van", "is", "dat", "op", "te", "voor", "met", "niet", "zijn", "worden"},
+}
+LANGUAGE_SAMPLE_WORDS = 2000
+WORD_PATTERN = re.compile(r"[^\W\d_]+")
+
+
+def detect_language(words):
+    """
+    Guess the language of a text from the stop words it contains.
+
+    Args:
+        words (list[str]): Lower cased words sampled from the text.
+
+    Returns:
+        str: ISO 639-1 code of the detected language, or "unknown".
+    """
+    if not words:
+        return "unknown"
+    scores = {language: sum(word in stop_words for word in words)
+              for language, stop_words in LANGUAGE_STOP_WORDS.items()}
+    language, score = max(scores.items(), key=lambda item: item[1])
+    return language if score else "unknown"
+
+
+class DocumentProfile:
+    def __init__(self, text, page_spans, word_count, language, encoded, sentence_spans):
+        self.text = text
+        # (start, end) character span of every page / sentence in `text`
+        self.page_spans = page_spans
+        self.sentence_spans = sentence_spans
+        self.word_count = word_count
+        self.language = language
+        self.encoded = encoded
+        # Tokens of repeated headers / footers stripped before profiling
+        self.boilerplate_tokens_saved = 0
+        self._chunks = {}
+
+    @property
+    def token_count(self):
+        return len(self.encoded)
+
+    @property
+    def page_count(self):
+        return len(self.page_spans)
+
+    @classmethod
+    def from_pages(cls, pages):
+        """
+        Build the profile of a document from the text of its pages.
+
+        Args:
+            pages (list[str]): Text of every page, in order.
+
+        Returns:
+            DocumentProfile: The document profile.
+        """
+        page_lengths = np.fromiter(map(len, pages), dtype=np.int64, count=len(pages))
+        page_ends = np.cumsum(page_lengths)
+        page_spans = np.stack((page_ends - page_lengths, page_ends), axis=1) if len(pages) \
+            else np.empty((0, 2), dtype=np.int64)
+        text = "".join(pages)
+
+        chunker = TokenChunker(MAX_TOKEN)
+        sample = WORD_PATTERN.findall(text[:LANGUAGE_SAMPLE_WORDS * 8].lower())[:LANGUAGE_SAMPLE_WORDS]
+
+        return cls(
+            text=text,
+            page_spans=page_spans,
+            word_count=len(text.split()),
+            language=detect_language(sample),
+            encoded=chunker.encode(text),
+            sentence_spans=chunker.sentence_spans(text),
+        )
+
+    @classmethod
+    def from_text(cls, text):
+        """
+        Build the profile of a text that has no page structure.
+        """
+        return cls.from_pages([text] if text else [])
+
+    def page_of(self, char_offset):
+        """
+        Return the zero based page index holding `char_offset`.
+        """
+        return int(np.searchsorted(self.page_spans[:, 1], char_offset, side="right"))
+
+    def chunks(self, max_tokens=MAX_TOKEN, overlap_tokens=0):
+        """
+        Return the sentence aligned chunks of the document, reusing the profile's tokens.
+
+        Args:
+            max_tokens (int, optional): Token budget of a chunk. Defaults to MAX_TOKEN.
+            overlap_tokens (int, optional): Tokens of trailing sentences repeated in the next chunk.
+
+        Returns:
+            list[TextChunk]: The chunks in document order.
+        """
+        key = (max_tokens, overlap_tokens)
+        if key not in self._chunks:
+            self._chunks[key] = TokenChunker(max_tokens, overlap_tokens).chunk_encoded(
+                self.encoded, self.sentence_spans)
+        return self._chunks[key]
+
+    def to_dict(self):
+        return {
+            "word_count": self.word_count,
+            "token_count": self.token_count,
+            "page_count": self.page_count,
+            "sentence_count": len(self.sentence_spans),
+            "language": self.language,
+            "boilerplate_tokens_saved": self.boilerplate_tokens_saved,
+        }
@@ -2,15 +2,25 @@
 This utility is used to configure the logging for the application.
 This contains different loggers for different modules and an email handler
 to send emails when an error occurs.
+
+Loggers only put their records on a queue. One background `QueueListener`
+per process formats them and writes them to the rotating log file of their
+logger, so request threads never wait on file writes. Set `LOG_FORMAT=json`
+to write one JSON object per line instead of plain text.
 """
 
+import atexit
 import datetime
+import json
 # Logging Utilities
 import logging
 import logging.handlers
 # General Utilities
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 # from django_ses import SESBackend
 from pytz import timezone
@@ -23,6 +33,8 @@ LOG_FILE = os.path.join(
     'logs',
     'default-backend.log',
 )
+LOG_TIMEZONE = 'Asia/Kolkata'
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
 
 
 def log_file_exist(file_path):
@@ -42,13 +54,139 @@ def log_file_exist(file_path):
         return False
 
 
+class CachedTimezoneConverter:
+    """
+    `time.struct_time` converter for formatters, looking the UTC offset up once per hour
+    instead of doing a pytz conversion for every record.
+    """
+
+    def __init__(self, tz_name):
+        self.tz = timezone(tz_name)
+        # (hour since epoch, offset in seconds)
+        self._cache = (None, 0)
+
+    def utc_offset(self, seconds):
+        hour = int(seconds // 3600)
+        cached_hour, offset = self._cache
+        if cached_hour != hour:
+            offset = datetime.datetime.fromtimestamp(hour * 3600, self.tz).utcoffset().total_seconds()
+            self._cache = (hour, offset)
+        return offset
+
+    def __call__(self, seconds=None):
+        seconds = time.time() if seconds is None else seconds
+        return time.gmtime(seconds + self.utc_offset(seconds))
+
+
+TIMEZONE_CONVERTER = CachedTimezoneConverter(LOG_TIMEZONE)
+
+
 def adjust_TZ(*args):
     """
     This function is used to convert the timestamp to 'Asia/Kolkata' timezone.
     """
-    timestamp = datetime.datetime.now(datetime.timezone.utc)
-    timestamp = timestamp.astimezone(timezone('Asia/Kolkata'))
-    return timestamp.timetuple()
+    return TIMEZONE_CONVERTER(*args[:1])
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line."""
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'logger': record.name,
+            'level': record.levelname,
+            'message': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName,
+        }
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+def get_formatter():
+    if LOG_FORMAT == 'json':
+        formatter = JSONFormatter()
+    else:
+        # create the formatter with 'Asia/Kolkata' timezone
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            datefmt='%m/%d/%Y %I:%M:%S %p',
+        )
+    # Add time converter for 'Asia/Kolkata' timezone
+    formatter.converter = adjust_TZ
+    return formatter
+
+
+class LoggerFileRouter(logging.Handler):
+    """Sends every record to the file handler of the logger that emitted it."""
+
+    def __init__(self):
+        super().__init__()
+        self.routes = {}
+
+    def add_route(self, logger_name, handler):
+        self.routes[logger_name] = handler
+
+    def handle(self, record):
+        handler = self.routes.get(record.name)
+        if handler is not None and record.levelno >= handler.level:
+            handler.handle(record)
+        return True
+
+
+class LogPipeline:
+    """
+    The queue shared by every logger of the process and its background writer.
+
+    The listener thread does not survive a fork (gunicorn --preload), it is
+    restarted in the child on a fresh queue.
+    """
+
+    def __init__(self):
+        self.router = LoggerFileRouter()
+        self.queue_handler = QueueHandler(queue.SimpleQueue())
+        self.listener = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.listener is None:
+                self.listener = QueueListener(self.queue_handler.queue, self.router, respect_handler_level=False)
+                self.listener.start()
+
+    def stop(self):
+        with self.lock:
+            if self.listener is not None:
+                self.listener.stop()
+                self.listener = None
+
+    def before_fork(self):
+        # Hold the file handlers so the listener is not forked in the middle of a write.
+        for handler in self.router.routes.values():
+            handler.acquire()
+
+    def after_fork_in_parent(self):
+        for handler in self.router.routes.values():
+            handler.release()
+
+    def reinit_after_fork(self):
+        for handler in self.router.routes.values():
+            handler.createLock()
+        self.lock = threading.Lock()
+        self.listener = None
+        self.queue_handler.queue = queue.SimpleQueue()
+        self.start()
+
+
+LOG_PIPELINE = LogPipeline()
+atexit.register(LOG_PIPELINE.stop)
+os.register_at_fork(
+    before=LOG_PIPELINE.before_fork,
+    after_in_parent=LOG_PIPELINE.after_fork_in_parent,
+    after_in_child=LOG_PIPELINE.reinit_after_fork,
+)
 
 
 def get_logger(name, file=LOG_FILE, level=logging.INFO):
@@ -68,6 +206,9 @@ def get_logger(name, file=LOG_FILE, level=logging.INFO):
     # set the logger level
     logger.setLevel(level)
 
+    if LOG_PIPELINE.queue_handler in logger.handlers:
+        return logger
+
     file = os.path.join(BASE_DIR, 'logs', file)
 
     log_file = log_file_exist(file)
@@ -75,15 +216,6 @@ def get_logger(name, file=LOG_FILE, level=logging.INFO):
     if not log_file:
         print('Log file not created')
 
-    # create the formatter with 'Asia/Kolkata' timezone
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%m/%d/%Y %I:%M:%S %p',
-    )
-
-    # Add time converter for 'Asia/Kolkata' timezone
-    formatter.converter = adjust_TZ
-
     rotation_handler = RotatingFileHandler(
         file,
         maxBytes=100 * 1024 * 1024,  # 100 MB
@@ -91,7 +223,9 @@ def get_logger(name, file=LOG_FILE, level=logging.INFO):
         mode='a',
     )
 
-    rotation_handler.setFormatter(formatter)
-    logger.addHandler(rotation_handler)
+    rotation_handler.setFormatter(get_formatter())
+    LOG_PIPELINE.router.add_route(name, rotation_handler)
+    logger.addHandler(LOG_PIPELINE.queue_handler)
+    LOG_PIPELINE.start()
 
     return logger
@@ -0,0 +1,165 @@
+"""
+Per stage latency instrumentation of the API requests.
+
+`timed_stage` measures one stage of the request being served (validation,
+PDF decoding, chunking, every Assistant call, rendering). The middleware
+reports the stages of every request in a `Server-Timing` response header and,
+when prometheus_client is installed, observes them in histograms tagged by
+endpoint and strategy, exported on `/metrics`. Under gunicorn, point
+`PROMETHEUS_MULTIPROC_DIR` to an empty directory shared by the workers so that
+`/metrics` aggregates all of them.
+"""
+
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+
+from django.http import HttpResponse
+
+from . import UTILS_LOGGER
+from .constants import LATENCY_BUCKETS
+from .tracing import trace_span
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+# Endpoint of the stages measured outside of a request (benchmarks, commands)
+NO_ENDPOINT = "none"
+UNMATCHED_ENDPOINT = "unmatched"
+DEFAULT_STRATEGY = "default"
+# Strategy of the follow-up questions on an existing thread
+FOLLOW_UP_STRATEGY = "FollowUp"
+
+_current_request = contextvars.ContextVar("request_timings", default=None)
+
+if prometheus_client is not None:
+    STAGE_SECONDS = prometheus_client.Histogram(
+        "contract_stage_seconds", "Latency of a stage of a request",
+        ["endpoint", "strategy", "stage"], buckets=LATENCY_BUCKETS)
+    REQUEST_SECONDS = prometheus_client.Histogram(
+        "contract_request_seconds", "Latency of a request",
+        ["endpoint", "strategy", "status"], buckets=LATENCY_BUCKETS)
+    REQUESTS_IN_PROGRESS = prometheus_client.Gauge(
+        "contract_requests_in_progress", "Requests being served", multiprocess_mode="livesum")
+
+
+class RequestTimings:
+    def __init__(self):
+        self.endpoint = UNMATCHED_ENDPOINT
+        self.strategy = DEFAULT_STRATEGY
+        self.stages = []
+
+    def add(self, stage, seconds):
+        self.stages.append((stage, seconds))
+
+    def server_timing(self, total_seconds):
+        """
+        Render the stages as a `Server-Timing` header value, repeated stages are summed.
+        """
+        totals = {}
+        for stage, seconds in self.stages:
+            stage_seconds, count = totals.get(stage, (0.0, 0))
+            totals[stage] = (stage_seconds + seconds, count + 1)
+
+        metrics = [f'{stage};dur={seconds * 1000:.1f}' + (f';desc="{count} calls"' if count > 1 else "")
+                   for stage, (seconds, count) in totals.items()]
+        metrics.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def observe(self, status_code, total_seconds):
+        if prometheus_client is None:
+            return
+        for stage, seconds in self.stages:
+            STAGE_SECONDS.labels(self.endpoint, self.strategy, stage).observe(seconds)
+        REQUEST_SECONDS.labels(self.endpoint, self.strategy, str(status_code)).observe(total_seconds)
+
+
+@contextmanager
+def timed_stage(stage):
+    """
+    Measure the wrapped block as `stage` of the request being served, in a span of the same name.
+
+    Usage:
+    >>> with timed_stage("chunking"):
+    ...     chunks = chunker.chunk(text)
+    """
+    start_time = time.perf_counter()
+    try:
+        with trace_span(stage):
+            yield
+    finally:
+        seconds = time.perf_counter() - start_time
+        timings = _current_request.get()
+        if timings is not None:
+            timings.add(stage, seconds)
+        elif prometheus_client is not None:
+            STAGE_SECONDS.labels(NO_ENDPOINT, DEFAULT_STRATEGY, stage).observe(seconds)
+
+
+def tag_strategy(strategy):
+    """
+    Tag the request being served with the strategy handling it (e.g. LargeContractSummarization).
+    """
+    timings = _current_request.get()
+    if timings is not None:
+        timings.strategy = strategy
+
+
+def propagate_context(function):
+    """
+    Wrap `function` to run in the context of the caller, so stages measured in worker threads count for its request.
+    """
+    context = contextvars.copy_context()
+
+    def wrapper(*args, **kwargs):
+        # A context can only be entered by one thread at a time.
+        return context.copy().run(function, *args, **kwargs)
+
+    return wrapper
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current_request.set(timings)
+        if prometheus_client is not None:
+            REQUESTS_IN_PROGRESS.inc()
+        start_time = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+            if prometheus_client is not None:
+                REQUESTS_IN_PROGRESS.dec()
+
+        total_seconds = time.perf_counter() - start_time
+        resolver_match = getattr(request, "resolver_match", None)
+        if resolver_match is not None:
+            timings.endpoint = resolver_match.route or "/"
+        response["Server-Timing"] = timings.server_timing(total_seconds)
+        try:
+            timings.observe(response.status_code, total_seconds)
+        except Exception as e:
+            UTILS_LOGGER.exception(f"Failed to record request metrics. Reason:{str(e)}")
+        return response
+
+
+def metrics_view(request):
+    """
+    Expose the metrics in the Prometheus text format.
+    """
+    if prometheus_client is None:
+        return HttpResponse("prometheus_client is not installed\n", status=501, content_type="text/plain")
+
+    registry = prometheus_client.REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(prometheus_client.generate_latest(registry), content_type=prometheus_client.CONTENT_TYPE_LATEST)
@@ -0,0 +1,135 @@
+"""
+Table aware text extraction of PDF pages.
+
+`page.get_text()` flattens pricing schedules and rate cards into one cell per
+line, losing the rows. Tables found by PyMuPDF `find_tables` are written as CSV
+blocks instead, in place of the text blocks they cover, so the engines get one
+line per row. A table whose CSV block is not shorter than its plain text is
+left as plain text.
+"""
+
+import csv
+import io
+import re
+
+from . import UTILS_LOGGER
+from .constants import (TABLE_MAX_MEAN_CELL_CHARS, TABLE_MIN_COLUMNS,
+                        TABLE_MIN_ROWS)
+
+TABLE_START = "[TABLE]\n"
+TABLE_END = "[/TABLE]\n"
+# Amounts, quantities and percentages: a row holding only one of them is a total, never a wrapped line
+NUMERIC_CELL_PATTERN = re.compile(r"[-+(]?[$€£₹¥]?\s?\d[\d,.\s]*%?\)?(?:\s?[A-Z]{3})?")
+
+
+def clean_cell(cell):
+    # Merged cells (None) are kept apart from empty cells until the wrapped rows are merged.
+    return None if cell is None else " ".join(cell.split())
+
+
+def merge_wrapped_rows(rows):
+    """
+    Glue back the wrapped lines of a cell, which come out as rows holding that single cell.
+
+    A row is only a wrapped line when its cell continues a filled cell of the previous row and is not a
+    number, and the row has no merged cell. Lone totals and subtotals stay rows of their own.
+    """
+    merged = []
+    for row in rows:
+        filled = [index for index, cell in enumerate(row) if cell]
+        if not filled:
+            continue
+        index = filled[0]
+        previous = merged[-1] if merged else []
+        if len(filled) == 1 and index > 0 and None not in row and index < len(previous) and previous[index] \
+                and not NUMERIC_CELL_PATTERN.fullmatch(row[index]):
+            previous[index] = f"{previous[index]} {row[index]}"
+        else:
+            merged.append(row)
+    return [[cell or "" for cell in row] for row in merged]
+
+
+def table_to_csv(rows):
+    """
+    Render the rows of a table as CSV, dropping empty rows and columns.
+
+    Args:
+        rows (list[list]): Cells of every row, None for merged cells.
+
+    Returns:
+        str: The CSV text, empty when the table is too small or is a frame around prose.
+    """
+    rows = merge_wrapped_rows([[clean_cell(cell) for cell in row] for row in rows if any(row)])
+    filled_columns = [index for index in range(max(map(len, rows), default=0))
+                      if any(index < len(row) and row[index] for row in rows)]
+    if len(rows) < TABLE_MIN_ROWS or len(filled_columns) < TABLE_MIN_COLUMNS:
+        return ""
+    cell_lengths = [len(cell) for row in rows for cell in row if cell]
+    if sum(cell_lengths) / len(cell_lengths) > TABLE_MAX_MEAN_CELL_CHARS:
+        return ""
+
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator="\n")
+    for row in rows:
+        cells = [row[index] if index < len(row) else "" for index in filled_columns]
+        while cells and not cells[-1]:
+            cells.pop()
+        writer.writerow(cells)
+    return output.getvalue()
+
+
+def contains(bbox, block):
+    # A text block belongs to a table when its center lies in the table.
+    center_x, center_y = (block[0] + block[2]) / 2, (block[1] + block[3]) / 2
+    return bbox[0] <= center_x <= bbox[2] and bbox[1] <= center_y <= bbox[3]
+
+
+def extract_page_text(page):
+    """
+    Return the text of a page with its tables rendered as CSV blocks.
+
+    Falls back to `page.get_text()` when table detection is unavailable or fails.
+
+    Args:
+        page (fitz.Page): The page.
+
+    Returns:
+        str: Text of the page in reading order.
+    """
+    try:
+        tables = []
+        for table in page.find_tables().tables:
+            table_csv = table_to_csv(table.extract())
+            if table_csv:
+                tables.append((tuple(table.bbox), table_csv))
+    except Exception as e:
+        UTILS_LOGGER.warning(f"Table detection failed on page {page.number}. Reason:{str(e)}")
+        tables = []
+
+    if not tables:
+        return page.get_text()
+
+    blocks = page.get_text("blocks")
+    block_texts = [block[4] if block[4].endswith("\n") else f"{block[4]}\n" for block in blocks]
+    table_of_block = [next((index for index, (bbox, _) in enumerate(tables) if contains(bbox, block)), None)
+                      for block in blocks]
+    # A CSV block longer than the text it replaces is not worth it, the plain text is kept.
+    table_blocks = [f"{TABLE_START}{table_csv}{TABLE_END}" for _, table_csv in tables]
+    for index, table_block in enumerate(table_blocks):
+        plain_text = "".join(text for text, table_index in zip(block_texts, table_of_block) if table_index == index)
+        if plain_text and len(table_block) >= len(plain_text):
+            table_blocks[index] = None
+    if not any(table_blocks):
+        return page.get_text()
+
+    parts, written_tables = [], set()
+    for text, table_index in zip(block_texts, table_of_block):
+        if table_index is None or table_blocks[table_index] is None:
+            parts.append(text)
+        elif table_index not in written_tables:
+            parts.append(table_blocks[table_index])
+            written_tables.add(table_index)
+
+    parts.extend(table_block for index, table_block in enumerate(table_blocks)
+                 if table_block and index not in written_tables)
+    return "".join(parts)
@@ -0,0 +1,79 @@
+"""
+Hierarchical reduction of per chunk LLM outputs.
+
+Engines that process a document chunk by chunk end up with one partial result
+per chunk. Instead of concatenating them, the partial results are packed in
+order into batches fitting a token budget and every batch is merged by one LLM
+call, level after level, until the result fits the output budget. The merges of
+a level are independent and run concurrently.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from . import UTILS_LOGGER
+from .budget import pack_by_tokens
+from .constants import REDUCE_MAX_LEVELS
+from .metrics import propagate_context
+from .resources import ResourceRegistry
+from .tracing import trace_span
+
+PART_SEPARATOR = "\n\n"
+
+
+class HierarchicalReducer:
+    def __init__(self, merge, batch_tokens, output_tokens, max_workers=1, max_levels=REDUCE_MAX_LEVELS,
+                 encoding=None):
+        """
+        Initialize the reducer.
+
+        Args:
+            merge (callable): Called with a list of consecutive partial results, returns their merged text.
+            batch_tokens (int): Token budget of the partial results merged by one call.
+            output_tokens (int): Token budget of the final result.
+            max_workers (int, optional): Merges running concurrently. Defaults to 1.
+            max_levels (int, optional): Reduction levels after which the result is returned as is.
+            encoding (tiktoken.Encoding, optional): Defaults to the shared registry encoding.
+        """
+        if batch_tokens <= 0 or output_tokens <= 0:
+            raise ValueError("Token budgets must be positive")
+        self.merge = merge
+        self.batch_tokens = int(batch_tokens)
+        self.output_tokens = int(output_tokens)
+        self.max_workers = max(1, int(max_workers))
+        self.max_levels = max_levels
+        self.encoding = encoding or ResourceRegistry.get_encoding()
+
+    def count_tokens(self, text):
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def reduce(self, parts):
+        """
+        Reduce the partial results into one result fitting `output_tokens`.
+
+        Args:
+            parts (list[str]): The partial results in document order.
+
+        Returns:
+            str: The reduced result.
+        """
+        parts = [part.strip() for part in parts if part and part.strip()]
+        token_counts = [self.count_tokens(part) for part in parts]
+
+        for level in range(1, self.max_levels + 1):
+            if sum(token_counts) <= self.output_tokens:
+                break
+            batches = pack_by_tokens(token_counts, self.batch_tokens)
+            UTILS_LOGGER.info(
+                f"Reduce level {level}: merging {len(parts)} parts ({sum(token_counts)} tokens) "
+                f"in {len(batches)} calls")
+            with trace_span("reduce_level", level=level, parts=len(parts), input_tokens=sum(token_counts)), \
+                    ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+                parts = [part.strip() for part in executor.map(
+                    propagate_context(lambda batch: self.merge([parts[index] for index in batch])), batches)]
+            token_counts = [self.count_tokens(part) for part in parts]
+        else:
+            if sum(token_counts) > self.output_tokens:
+                UTILS_LOGGER.warning(
+                    f"Reduced result still holds {sum(token_counts)} tokens after {self.max_levels} levels")
+
+        return PART_SEPARATOR.join(parts)
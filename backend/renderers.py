@@ -0,0 +1,69 @@
+"""
+Response renderers of the API.
+"""
+
+import math
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .metrics import timed_stage
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer measuring the rendering as the `render` stage of the request."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed_stage("render"):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+def has_non_finite_float(data):
+    """
+    Return whether `data` holds a NaN or infinite float, which orjson silently writes as null.
+    """
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, dict):
+        return any(has_non_finite_float(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(has_non_finite_float(item) for item in data)
+    return False
+
+
+class ORJSONRenderer(TimedJSONRenderer):
+    """
+    JSONRenderer encoding with orjson, several times faster on the long LLM answers.
+
+    Datetimes and the types orjson does not know (Decimal, lazy strings, ...) go through the DRF
+    encoder so the output matches the stock renderer, except for floats in exponent notation which
+    orjson writes the shortest way (1e20 for 1e+20, the same value for any JSON parser). NaN and
+    infinite floats are rejected under STRICT_JSON like the stock renderer does. Indented, non compact
+    or ASCII only output, or a missing orjson, falls back to the stock renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.ensure_ascii or not self.compact or \
+                self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+
+        with timed_stage("render"):
+            ret = orjson.dumps(data, default=JSONEncoder().default,
+                               option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+            # Non finite floats are written as null, only then is the data searched for them.
+            non_finite = b'null' in ret and has_non_finite_float(data)
+            # Like the stock renderer, escape the line separators that are invalid in javascript strings.
+            ret = ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+        if non_finite:
+            if self.strict:
+                raise ValueError("Out of range float values are not JSON compliant")
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret
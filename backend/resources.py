@@ -0,0 +1,180 @@
+"""
+Process wide registry for the heavy NLP resources used by the document
+processing pipeline (spaCy pipelines, tiktoken encodings and the punkt
+sentence tokenizer) and the heavy third party modules (fitz, openai), which
+are imported on first use instead of at application import.
+
+Every resource is loaded at most once per process. Calling
+`ResourceRegistry.warm_up()` from a module imported by the gunicorn master
+(see `backend/wsgi.py` and `--preload`) loads them before the workers are
+forked so that the workers share the pages copy-on-write.
+"""
+
+import importlib
+import os
+import resource
+import threading
+import time
+
+from . import UTILS_LOGGER
+from .constants import (LAZY_MODULES, SENTENCE_TOKENIZER_LANGUAGE,
+                        SPACY_MODEL_NAME, TOKENIZER_MODEL_NAME)
+
+
+def get_process_rss():
+    """
+    Return the current resident set size of the process in bytes.
+
+    Falls back to the peak resident set size when /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ResourceRegistry:
+    _resources = {}
+    _stats = {}
+    _lock = threading.RLock()
+
+    @classmethod
+    def _get_or_load(cls, key, loader):
+        """
+        Return the resource stored under `key`, loading it with `loader` on first use.
+
+        Args:
+            key (str): Unique name of the resource.
+            loader (callable): Zero argument callable building the resource.
+
+        Returns:
+            object: The loaded resource.
+        """
+        loaded_resource = cls._resources.get(key)
+        if loaded_resource is not None:
+            return loaded_resource
+
+        with cls._lock:
+            if key not in cls._resources:
+                rss_before = get_process_rss()
+                start_time = time.perf_counter()
+                cls._resources[key] = loader()
+                cls._stats[key] = {
+                    "load_seconds": round(time.perf_counter() - start_time, 4),
+                    "rss_delta_bytes": max(get_process_rss() - rss_before, 0),
+                    "loaded_in_pid": os.getpid(),
+                }
+                UTILS_LOGGER.info(
+                    f"Loaded resource {key} in {cls._stats[key]['load_seconds']}s")
+            return cls._resources[key]
+
+    @classmethod
+    def get_spacy_model(cls, model_name=SPACY_MODEL_NAME):
+        """
+        Return the shared spaCy pipeline for `model_name`.
+        """
+        def loader():
+            import spacy
+            return spacy.load(model_name)
+
+        return cls._get_or_load(f"spacy:{model_name}", loader)
+
+    @classmethod
+    def get_encoding(cls, model_name=TOKENIZER_MODEL_NAME):
+        """
+        Return the shared tiktoken encoding used by `model_name`.
+        """
+        def loader():
+            import tiktoken
+            return tiktoken.encoding_for_model(model_name)
+
+        return cls._get_or_load(f"tiktoken:{model_name}", loader)
+
+    @classmethod
+    def get_sentence_tokenizer(cls, language=SENTENCE_TOKENIZER_LANGUAGE):
+        """
+        Return the shared punkt sentence tokenizer for `language`.
+        """
+        def loader():
+            import nltk
+            return nltk.data.load(f"tokenizers/punkt/{language}.pickle")
+
+        return cls._get_or_load(f"punkt:{language}", loader)
+
+    @classmethod
+    def get_module(cls, module_name):
+        """
+        Return the module `module_name`, importing it on first use.
+        """
+        return cls._get_or_load(f"module:{module_name}", lambda: importlib.import_module(module_name))
+
+    @classmethod
+    def warm_up(cls):
+        """
+        Load every default resource so later requests never pay the load cost.
+
+        A resource failing to load is logged and skipped, it will be retried
+        lazily on first use.
+
+        Returns:
+            dict: The memory stats after warm up.
+        """
+        loaders = [(loader.__name__, loader)
+                   for loader in (cls.get_sentence_tokenizer, cls.get_encoding, cls.get_spacy_model)]
+        loaders += [(f"import {module_name}", lambda module_name=module_name: cls.get_module(module_name))
+                    for module_name in LAZY_MODULES]
+        for name, loader in loaders:
+            try:
+                loader()
+            except Exception as e:
+                UTILS_LOGGER.exception(
+                    f"Failed to warm up resource using {name}. Reason:{str(e)}")
+        stats = cls.memory_stats()
+        UTILS_LOGGER.info(f"Resource warm up finished: {stats}")
+        return stats
+
+    @classmethod
+    def memory_stats(cls):
+        """
+        Return load time and memory information about the loaded resources.
+
+        Returns:
+            dict: Process RSS figures along with per resource load stats.
+        """
+        return {
+            "pid": os.getpid(),
+            "rss_bytes": get_process_rss(),
+            "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+            "resources": {key: dict(value) for key, value in cls._stats.items()},
+        }
+
+    @classmethod
+    def startup_report(cls, started_at, warmed_up=False):
+        """
+        Log how long the application took to become ready and what it holds in memory.
+
+        Args:
+            started_at (float): `time.perf_counter()` value taken when the startup began.
+            warmed_up (bool, optional): Whether the resources were loaded during the startup.
+
+        Returns:
+            dict: The report.
+        """
+        report = {
+            "startup_seconds": round(time.perf_counter() - started_at, 4),
+            "warmed_up": warmed_up,
+            **cls.memory_stats(),
+        }
+        UTILS_LOGGER.info(f"Application ready: {report}")
+        return report
+
+    @classmethod
+    def clear(cls):
+        """
+        Drop every loaded resource, mainly useful for benchmarks.
+        """
+        with cls._lock:
+            cls._resources.clear()
+            cls._stats.clear()
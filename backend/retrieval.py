@@ -0,0 +1,162 @@
+"""
+Local BM25 retrieval over the passages of a contract.
+
+The index is stored term major (a CSC like layout of `indptr`, `indices` and
+`data` numpy arrays) so that scoring a query only touches the postings of the
+query terms. Indexes are persisted per Assistant thread through ThreadStore,
+which lets follow-up questions carry only the most relevant passages.
+"""
+
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from .thread_store import ThreadStore
+
+TERM_PATTERN = re.compile(r"[a-z0-9]+")
+INDEX_ARRAYS_FILENAME = "retrieval_index.npz"
+INDEX_META_FILENAME = "retrieval_index.json"
+
+
+def tokenize_terms(text):
+    return TERM_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    def __init__(self, passages, vocabulary, indptr, indices, data, doc_lengths, k1=1.5, b=0.75):
+        self.passages = passages
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+
+        document_count = len(passages)
+        document_frequency = np.diff(indptr)
+        self.idf = np.log1p((document_count - document_frequency + 0.5) / (document_frequency + 0.5))
+        self.average_length = float(doc_lengths.mean()) if document_count else 0.0
+
+    @classmethod
+    def build(cls, passages):
+        """
+        Build the index of a list of passages.
+
+        Args:
+            passages (list[str]): The passages to index.
+
+        Returns:
+            BM25Index: The built index.
+        """
+        vocabulary = {}
+        term_ids = []
+        doc_ids = []
+        doc_lengths = np.zeros(len(passages), dtype=np.int32)
+
+        for doc_id, passage in enumerate(passages):
+            terms = tokenize_terms(passage)
+            doc_lengths[doc_id] = len(terms)
+            term_ids.extend(vocabulary.setdefault(term, len(vocabulary)) for term in terms)
+            doc_ids.extend([doc_id] * len(terms))
+
+        # Count (term, document) pairs in one go, sorted by term then document.
+        document_count = max(len(passages), 1)
+        keys, counts = np.unique(
+            np.asarray(term_ids, dtype=np.int64) * document_count + np.asarray(doc_ids, dtype=np.int64),
+            return_counts=True)
+        posting_terms = keys // document_count
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(posting_terms, minlength=len(vocabulary)))))
+
+        return cls(
+            passages=list(passages),
+            vocabulary=vocabulary,
+            indptr=indptr.astype(np.int64),
+            indices=(keys % document_count).astype(np.int32),
+            data=counts.astype(np.float32),
+            doc_lengths=doc_lengths,
+        )
+
+    def scores(self, query):
+        """
+        Return the BM25 score of every passage for `query`.
+        """
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        if not len(self.passages):
+            return scores
+
+        length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(self.average_length, 1.0))
+        for term in set(tokenize_terms(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            docs = self.indices[start:end]
+            term_frequency = self.data[start:end]
+            scores[docs] += self.idf[term_id] * term_frequency * (self.k1 + 1) / (term_frequency + length_norm[docs])
+        return scores
+
+    def search(self, query, top_k):
+        """
+        Return the `top_k` most relevant passages for `query`, in document order.
+
+        Args:
+            query (str): The user query.
+            top_k (int): Maximum number of passages to return.
+
+        Returns:
+            list[tuple[int, str]]: (passage index, passage) pairs.
+        """
+        scores = self.scores(query)
+        if not scores.any():
+            return []
+        top_k = min(top_k, int(np.count_nonzero(scores)))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        return [(int(index), self.passages[index]) for index in np.sort(best)]
+
+    def save(self, thread_id):
+        """
+        Persist the index in the ThreadStore folder of `thread_id`.
+        """
+        np.savez_compressed(
+            ThreadStore.get_path(thread_id, INDEX_ARRAYS_FILENAME, create=True),
+            indptr=self.indptr, indices=self.indices, data=self.data, doc_lengths=self.doc_lengths)
+        ThreadStore.save_json(thread_id, INDEX_META_FILENAME, {
+            "passages": self.passages,
+            "vocabulary": self.vocabulary,
+            "k1": self.k1,
+            "b": self.b,
+        })
+
+    @classmethod
+    def load(cls, thread_id):
+        """
+        Load the index persisted for `thread_id`.
+
+        Returns:
+            BM25Index | None: The index, or None when the thread has no index.
+        """
+        arrays_path = ThreadStore.get_path(thread_id, INDEX_ARRAYS_FILENAME)
+        if not os.path.exists(arrays_path):
+            return None
+        return _load_index(thread_id, os.path.getmtime(arrays_path))
+
+
+@lru_cache(maxsize=32)
+def _load_index(thread_id, modified_time):
+    meta = ThreadStore.load_json(thread_id, INDEX_META_FILENAME)
+    if meta is None:
+        return None
+    with np.load(ThreadStore.get_path(thread_id, INDEX_ARRAYS_FILENAME)) as arrays:
+        return BM25Index(
+            passages=meta["passages"],
+            vocabulary=meta["vocabulary"],
+            indptr=arrays["indptr"],
+            indices=arrays["indices"],
+            data=arrays["data"],
+            doc_lengths=arrays["doc_lengths"],
+            k1=meta["k1"],
+            b=meta["b"],
+        )
@@ -59,7 +59,11 @@ INSTALLED_APPS = DJANGO_DEFAULT_APPS + THIRD_PARTY_APPS + PROJECT_APPS
 
 
 MIDDLEWARE = [
+    'upraised_backend.metrics.RequestMetricsMiddleware',
+    'upraised_backend.tracing.TracingMiddleware',
+    'upraised_backend.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'upraised_backend.admission.AdmissionControlMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -148,10 +152,17 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'EXCEPTION_HANDLER': 'upraised_backend.utils.custom_exception_handler',
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'upraised_backend.renderers.ORJSONRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'upraised_backend.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ),
 }
 
+CORS_EXPOSE_HEADERS = ['Server-Timing', 'Retry-After']
+
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:3000',
 ]
@@ -0,0 +1,160 @@
+"""
+In-process stand-in for the Azure OpenAI Assistants client, used by load tests.
+
+With `LLM_CLIENT=stand-in`, `AzureOpenAIAssistant` talks to this client
+instead of Azure: no network and no tokens are used. A run completes
+`STAND_IN_LLM_LATENCY` seconds (+/- `STAND_IN_LLM_JITTER`) after it is
+created, every status poll takes `STAND_IN_LLM_POLL_SECONDS` like an HTTP round
+trip, and the answer is a short canned text, or an empty JSON object when the
+prompt asks for JSON.
+
+The messages of a stand-in thread are kept in the ThreadStore folder of the
+thread, so a follow-up served by another gunicorn worker finds them, and
+are deleted by `sweep_threads` like the other artifacts.
+"""
+
+import os
+import random
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+from .constants import (STAND_IN_LLM_JITTER, STAND_IN_LLM_LATENCY,
+                        STAND_IN_LLM_POLL_SECONDS)
+from .thread_store import ThreadStore
+
+STAND_IN_LLM_CLIENT = "stand-in"
+STAND_IN_ANSWER = ("This is a stand-in answer. The agreement runs for twelve months, fees are payable within "
+                   "thirty days of invoice and either party may terminate with ninety days notice.")
+STAND_IN_JSON_ANSWER = "{}"
+STAND_IN_MESSAGES_FILENAME = "stand_in_messages.json"
+
+
+def is_stand_in_enabled():
+    return os.environ.get("LLM_CLIENT") == STAND_IN_LLM_CLIENT
+
+
+def make_message(role, content):
+    return SimpleNamespace(role=role, content=[SimpleNamespace(text=SimpleNamespace(value=content))])
+
+
+class StandInBackend:
+    """Threads of the stand-in clients, shared by the workers through the ThreadStore, and runs of the process."""
+
+    def __init__(self):
+        self.runs = {}
+        self.lock = threading.Lock()
+
+    def new_id(self, prefix):
+        return f"{prefix}_standin_{uuid.uuid4().hex}"
+
+    def create_thread(self, messages):
+        thread_id = self.new_id("thread")
+        ThreadStore.save_json(thread_id, STAND_IN_MESSAGES_FILENAME,
+                              [{"role": message["role"], "content": message["content"]} for message in messages])
+        return thread_id
+
+    def get_messages(self, thread_id):
+        """
+        Return the messages of a thread, oldest first.
+
+        Raises:
+            ValueError: If no stand-in client created the thread, e.g. it was swept or created by Azure.
+        """
+        messages = ThreadStore.load_json(thread_id, STAND_IN_MESSAGES_FILENAME)
+        if messages is None:
+            raise ValueError(f"Unknown stand-in thread {thread_id}")
+        return messages
+
+    def update_messages(self, thread_id, update):
+        """
+        Apply `update` to the messages of a thread under the lock of the thread.
+        """
+        self.get_messages(thread_id)
+        with ThreadStore.locked_state(thread_id):
+            messages = self.get_messages(thread_id)
+            update(messages)
+            ThreadStore.save_json(thread_id, STAND_IN_MESSAGES_FILENAME, messages)
+
+
+STAND_IN_BACKEND = StandInBackend()
+
+
+class StandInMessages:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def create(self, thread_id, role, content):
+        self.backend.update_messages(thread_id, lambda messages: messages.append({"role": role, "content": content}))
+
+    def list(self, thread_id):
+        # Newest first, like the Assistants API
+        return SimpleNamespace(data=[make_message(message["role"], message["content"])
+                                     for message in reversed(self.backend.get_messages(thread_id))])
+
+
+class StandInRuns:
+    def __init__(self, backend, latency, jitter, poll_seconds):
+        self.backend = backend
+        self.latency = latency
+        self.jitter = jitter
+        self.poll_seconds = poll_seconds
+
+    def create(self, thread_id, assistant_id=None):
+        run_id = self.backend.new_id("run")
+        duration = max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+        with self.backend.lock:
+            self.backend.runs[run_id] = {"thread_id": thread_id, "completes_at": time.monotonic() + duration}
+        return SimpleNamespace(id=run_id, status="queued")
+
+    def retrieve(self, run_id, thread_id):
+        with self.backend.lock:
+            run = self.backend.runs[run_id]
+        remaining = run["completes_at"] - time.monotonic()
+        time.sleep(max(0.0, min(self.poll_seconds, remaining)))
+        if time.monotonic() < run["completes_at"]:
+            return SimpleNamespace(id=run_id, status="in_progress")
+
+        with self.backend.lock:
+            completed = self.backend.runs.pop(run_id, None) is not None
+        if completed:
+            self.backend.update_messages(thread_id, self.answer)
+        return SimpleNamespace(id=run_id, status="completed")
+
+    @staticmethod
+    def answer(messages):
+        prompt = messages[-1]["content"] if messages else ""
+        messages.append({"role": "assistant",
+                         "content": STAND_IN_JSON_ANSWER if "json" in prompt.lower() else STAND_IN_ANSWER})
+
+
+class StandInThreads:
+    def __init__(self, backend, latency, jitter, poll_seconds):
+        self.backend = backend
+        self.messages = StandInMessages(backend)
+        self.runs = StandInRuns(backend, latency, jitter, poll_seconds)
+
+    def create(self, messages=()):
+        return SimpleNamespace(id=self.backend.create_thread(messages))
+
+
+class StandInAzureOpenAI:
+    def __init__(self, latency=None, jitter=None, poll_seconds=None, backend=STAND_IN_BACKEND):
+        """
+        Initialize the client, the timings default to the STAND_IN_LLM_* environment variables.
+
+        Args:
+            latency (float, optional): Seconds a run takes.
+            jitter (float, optional): Maximum random deviation of the latency in seconds.
+            poll_seconds (float, optional): Seconds a status poll takes.
+            backend (StandInBackend, optional): Where threads and runs are kept.
+        """
+        latency = float(os.environ.get("STAND_IN_LLM_LATENCY", STAND_IN_LLM_LATENCY)) if latency is None else latency
+        jitter = float(os.environ.get("STAND_IN_LLM_JITTER", STAND_IN_LLM_JITTER)) if jitter is None else jitter
+        poll_seconds = float(os.environ.get("STAND_IN_LLM_POLL_SECONDS", STAND_IN_LLM_POLL_SECONDS)) \
+            if poll_seconds is None else poll_seconds
+        self.beta = SimpleNamespace(
+            threads=StandInThreads(backend, latency, jitter, poll_seconds),
+            assistants=SimpleNamespace(create=lambda **kwargs: SimpleNamespace(id=backend.new_id("asst"))),
+        )
@@ -0,0 +1,175 @@
+"""
+Artifacts persisted per Azure Assistant thread.
+
+Everything the service needs to remember about a conversation besides the
+messages themselves (retrieval index, extracted facts, ...) is written in a
+folder named after the thread id under `DATA_FOLDER_PATH/threads`. Folders
+untouched for `THREAD_RETENTION_DAYS` are deleted by `sweep`
+(`python manage.py sweep_threads`).
+
+The state of a thread is updated under a process lock and, where available,
+an `fcntl` lock on a file of its folder, so the gunicorn workers sharing
+`DATA_FOLDER_PATH` do not lose each other's updates.
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, updates are then only serialized within the process
+    fcntl = None
+
+from .constants import DATA_FOLDER_PATH, THREAD_RETENTION_DAYS
+
+THREAD_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+THREAD_STATE_FILENAME = "state.json"
+THREAD_LOCK_FILENAME = "state.lock"
+# Longest chain of compactions followed when resolving a thread id
+MAX_ALIAS_HOPS = 16
+
+
+class ThreadStore:
+    _state_lock = threading.Lock()
+
+    @classmethod
+    def get_thread_folder(cls, thread_id, create=False):
+        """
+        Return the folder holding the artifacts of `thread_id`.
+
+        Args:
+            thread_id (str): The Azure Assistant thread id.
+            create (bool, optional): Create the folder when missing. Defaults to False.
+
+        Raises:
+            ValueError: If the thread id is not a plain identifier.
+        """
+        if not thread_id or not THREAD_ID_PATTERN.match(thread_id):
+            raise ValueError(f"Invalid thread id: {thread_id!r}")
+        folder_path = os.path.join(DATA_FOLDER_PATH, "threads", thread_id)
+        if create:
+            os.makedirs(folder_path, exist_ok=True)
+        return folder_path
+
+    @classmethod
+    def get_path(cls, thread_id, filename, create=False):
+        return os.path.join(cls.get_thread_folder(thread_id, create=create), filename)
+
+    @classmethod
+    def exists(cls, thread_id, filename):
+        return os.path.exists(cls.get_path(thread_id, filename))
+
+    @classmethod
+    def save_json(cls, thread_id, filename, data):
+        """
+        Atomically write `data` as JSON in the folder of `thread_id`.
+        """
+        path = cls.get_path(thread_id, filename, create=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as json_file:
+            json.dump(data, json_file)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load_json(cls, thread_id, filename, default=None):
+        """
+        Read a JSON artifact of `thread_id`, returning `default` when it does not exist.
+        """
+        try:
+            with open(cls.get_path(thread_id, filename), encoding="utf-8") as json_file:
+                return json.load(json_file)
+        except FileNotFoundError:
+            return default
+
+    @classmethod
+    @contextmanager
+    def locked_state(cls, thread_id):
+        """
+        Hold the locks guarding the read-modify-write of the state of `thread_id`.
+        """
+        with cls._state_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(cls.get_path(thread_id, THREAD_LOCK_FILENAME, create=True), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @classmethod
+    def update_state(cls, thread_id, **changes):
+        """
+        Update the state (token estimate, alias) of `thread_id` and return it.
+        """
+        with cls.locked_state(thread_id):
+            state = cls.load_json(thread_id, THREAD_STATE_FILENAME, default={})
+            state.update(changes)
+            cls.save_json(thread_id, THREAD_STATE_FILENAME, state)
+            return state
+
+    @classmethod
+    def add_tokens(cls, thread_id, tokens):
+        """
+        Add `tokens` to the estimated size of `thread_id` and return the new estimate.
+        """
+        with cls.locked_state(thread_id):
+            state = cls.load_json(thread_id, THREAD_STATE_FILENAME, default={})
+            state["estimated_tokens"] = state.get("estimated_tokens", 0) + int(tokens)
+            cls.save_json(thread_id, THREAD_STATE_FILENAME, state)
+            return state["estimated_tokens"]
+
+    @classmethod
+    def get_estimated_tokens(cls, thread_id):
+        return cls.load_json(thread_id, THREAD_STATE_FILENAME, default={}).get("estimated_tokens", 0)
+
+    @classmethod
+    def set_alias(cls, thread_id, target_thread_id):
+        """
+        Record that the conversation of `thread_id` continues in `target_thread_id`.
+        """
+        cls.get_thread_folder(target_thread_id)
+        cls.update_state(thread_id, alias=target_thread_id)
+
+    @classmethod
+    def resolve(cls, thread_id):
+        """
+        Return the thread the conversation of `thread_id` currently lives in.
+        """
+        for _ in range(MAX_ALIAS_HOPS):
+            alias = cls.load_json(thread_id, THREAD_STATE_FILENAME, default={}).get("alias")
+            if not alias:
+                break
+            thread_id = alias
+        return thread_id
+
+    @classmethod
+    def sweep(cls, retention_days=THREAD_RETENTION_DAYS, now=None):
+        """
+        Delete the folders of the threads whose artifacts were last written more than `retention_days` ago.
+
+        Returns:
+            list[str]: Ids of the deleted threads.
+        """
+        threads_folder = os.path.join(DATA_FOLDER_PATH, "threads")
+        if not os.path.isdir(threads_folder):
+            return []
+
+        cutoff = (now or time.time()) - retention_days * 86400
+        deleted = []
+        for entry in os.scandir(threads_folder):
+            if not entry.is_dir() or not THREAD_ID_PATTERN.match(entry.name):
+                continue
+            last_written = max([entry.stat().st_mtime] + [
+                artifact.stat().st_mtime for artifact in os.scandir(entry.path) if artifact.is_file()])
+            if last_written < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                deleted.append(entry.name)
+        return deleted
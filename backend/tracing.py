@@ -0,0 +1,188 @@
+"""
+OpenTelemetry tracing of the API requests.
+
+Spans are opened for the request, the engine, the strategy, every chunk sent
+to the LLM and every Assistant call, so a slow request can be broken down in
+a trace viewer. Tracing is off unless `OTEL_TRACES_EXPORTER` is set:
+
+- `otlp`: export to an OTLP/HTTP collector (`OTEL_EXPORTER_OTLP_ENDPOINT`,
+  http://localhost:4318 by default).
+- `file`: append one JSON span per line to `TRACE_FILE`
+  (logs/traces.jsonl by default).
+- `console`: print the spans.
+
+Without the opentelemetry packages every span is a no-op.
+"""
+
+import functools
+import os
+import threading
+from contextlib import contextmanager
+
+from backend.settings import BASE_DIR
+
+from . import UTILS_LOGGER
+
+try:
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import (BatchSpanProcessor,
+                                                ConsoleSpanExporter)
+except ImportError:
+    trace = None
+
+SERVICE_NAME = "contract-backend"
+TRACE_FILE = os.environ.get("TRACE_FILE", os.path.join(BASE_DIR, "logs", "traces.jsonl"))
+
+
+class NoOpSpan:
+    """Stands for a span when tracing is off."""
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+    def update_name(self, name):
+        pass
+
+    def is_recording(self):
+        return False
+
+
+NO_OP_SPAN = NoOpSpan()
+
+
+def clean_attributes(attributes):
+    # Span attributes cannot be None.
+    return {key: value for key, value in attributes.items() if value is not None}
+
+
+def build_exporter(exporter_name):
+    if exporter_name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import \
+            OTLPSpanExporter
+        return OTLPSpanExporter()
+    if exporter_name == "file":
+        os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+        return ConsoleSpanExporter(out=open(TRACE_FILE, "a", encoding="utf-8"),
+                                   formatter=lambda span: span.to_json(indent=None) + "\n")
+    if exporter_name == "console":
+        return ConsoleSpanExporter()
+    raise ValueError(f"Unknown trace exporter {exporter_name}")
+
+
+_tracer_lock = threading.Lock()
+_tracer = None
+_tracer_configured = False
+
+
+def get_tracer():
+    """
+    Return the tracer of the application, configuring the exporter on first use.
+
+    Returns:
+        opentelemetry.trace.Tracer | None: None when tracing is off.
+    """
+    global _tracer, _tracer_configured
+    if _tracer_configured:
+        return _tracer
+
+    with _tracer_lock:
+        if not _tracer_configured:
+            exporter_name = os.environ.get("OTEL_TRACES_EXPORTER", "").lower()
+            if exporter_name and exporter_name != "none":
+                if trace is None:
+                    UTILS_LOGGER.warning(
+                        f"OTEL_TRACES_EXPORTER is {exporter_name} but opentelemetry is not installed")
+                else:
+                    try:
+                        provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+                        provider.add_span_processor(BatchSpanProcessor(build_exporter(exporter_name)))
+                        # The tracer comes from this provider, leaving the global provider to the host.
+                        _tracer = provider.get_tracer(__name__)
+                    except Exception as e:
+                        UTILS_LOGGER.exception(f"Failed to configure tracing. Reason:{str(e)}")
+            _tracer_configured = True
+    return _tracer
+
+
+@contextmanager
+def trace_span(name, **attributes):
+    """
+    Run the wrapped block in a span, child of the current span.
+
+    Exceptions raised in the block are recorded on the span, so the original
+    error stays visible after it is turned into a CustomValidation.
+
+    Usage:
+    >>> with trace_span("chunk", chunk_index=index) as span:
+    ...     span.set_attribute("thread_id", thread_id)
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        yield NO_OP_SPAN
+        return
+
+    with tracer.start_as_current_span(name, attributes=clean_attributes(attributes)) as span:
+        yield span
+
+
+def traced(name=None):
+    """
+    Decorator running the function in a span named after its qualified name.
+    """
+    def decorator(function):
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with trace_span(span_name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def set_span_attributes(**attributes):
+    """
+    Set attributes on the current span, None values are skipped.
+    """
+    if get_tracer() is None:
+        return
+    span = trace.get_current_span()
+    if span.is_recording():
+        span.set_attributes(clean_attributes(attributes))
+
+
+def mark_span_failed(exception):
+    """
+    Record an exception that is handled (e.g. turned into a status False response) on the current span.
+    """
+    if get_tracer() is None:
+        return
+    span = trace.get_current_span()
+    if span.is_recording():
+        span.record_exception(exception)
+        span.set_status(trace.Status(trace.StatusCode.ERROR, str(exception)))
+
+
+class TracingMiddleware:
+    """Opens the root span of every request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        attributes = {"http.method": request.method, "http.target": request.path}
+        with trace_span(f"{request.method} {request.path}", **attributes) as span:
+            response = self.get_response(request)
+            resolver_match = getattr(request, "resolver_match", None)
+            if resolver_match is not None:
+                span.update_name(f"{request.method} /{resolver_match.route}")
+                span.set_attribute("http.route", resolver_match.route)
+            span.set_attribute("http.status_code", response.status_code)
+            return response
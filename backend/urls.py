@@ -19,7 +19,10 @@ from django.urls import include, path
 
 from base.urls import url_pattern as base_url
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics/', metrics_view),
     path('', include(base_url))
 ]
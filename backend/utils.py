@@ -1,22 +1,33 @@
 import base64
+import json
 import os
+import threading
+import time
+import uuid
 from datetime import datetime
 
-import fitz
-import spacy
-import tiktoken
 from django.utils.encoding import force_str
-from nltk.tokenize import sent_tokenize
-from openai import AzureOpenAI, OpenAI
 from rest_framework import status
 from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import exception_handler
 
-from base.constants import DEFAULT_ASSITANT_MODEL, MAX_TOKEN
+from base.constants import (CHUNK_OVERLAP_TOKENS, DEFAULT_ASSITANT_MODEL,
+                            MAX_TOKEN)
 
 from . import UTILS_LOGGER
-from .constants import DATA_FOLDER_PATH
+from .budget import TOKEN_BUDGET_PLANNER
+from .chunking import TokenChunker
+from .constants import (DATA_FOLDER_PATH, THREAD_COMPACTION,
+                        THREAD_COMPACTION_CONTEXT, THREAD_COMPACTION_RATIO)
+from .dedup import strip_repeated_page_lines
+from .document_profile import DocumentProfile
+from .metrics import timed_stage
+from .pdf_tables import extract_page_text
+from .resources import ResourceRegistry
+from .stand_in_llm import StandInAzureOpenAI, is_stand_in_enabled
+from .thread_store import ThreadStore
+from .tracing import mark_span_failed, set_span_attributes, traced
 
 
 class UtilityFunctions:
@@ -36,7 +47,8 @@ class UtilityFunctions:
         try:
             contract_folder_path = os.path.join(DATA_FOLDER_PATH, "contracts")
             os.makedirs(contract_folder_path, exist_ok=True)
-            curr_datetime = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+            # The random suffix keeps the uploads of the same second, served by concurrent threads, apart.
+            curr_datetime = f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_{uuid.uuid4().hex[:8]}"
             filename = f"{filename}_{curr_datetime}.pdf" if filename else f"{curr_datetime}.pdf"
             file_path = os.path.join(contract_folder_path, filename)
             return file_path
@@ -47,21 +59,25 @@ class UtilityFunctions:
     @classmethod
     def base64_to_pdf(cls, base64_string, output_path):
         try:
-            with open(output_path, "wb") as pdf_file:
+            with timed_stage("pdf_decode"), open(output_path, "wb") as pdf_file:
                 pdf_file.write(base64.b64decode(base64_string))
         except Exception as e:
             UTILS_LOGGER.exception(
                 f"Failed to encode pdf to base64. Reason:{str(e)}")
 
+    @classmethod
+    def extract_pages_from_pdf(cls, pdf_path):
+        try:
+            document = ResourceRegistry.get_module("fitz").open(pdf_path)
+            return [extract_page_text(document.load_page(page_num)) for page_num in range(document.page_count)]
+        except Exception as e:
+            UTILS_LOGGER.exception(
+                f"Failed to extract pages from pdf. Reason:{str(e)}")
+
     @classmethod
     def extract_text_from_pdf(cls, pdf_path):
         try:
-            text = ""
-            document = fitz.open(pdf_path)
-            for page_num in range(document.page_count):
-                page = document.load_page(page_num)
-                text += page.get_text()
-            return text
+            return "".join(cls.extract_pages_from_pdf(pdf_path))
         except Exception as e:
             UTILS_LOGGER.exception(
                 f"Failed to encode pdf to base64. Reason:{str(e)}")
@@ -69,7 +85,7 @@ class UtilityFunctions:
     @classmethod
     def identify_standards(cls, text):
         try:
-            nlp = spacy.load('en_core_web_sm')
+            nlp = ResourceRegistry.get_spacy_model()
             doc = nlp(text)
 
             keywords = ['standards', 'requirements',
@@ -82,28 +98,26 @@ class UtilityFunctions:
             UTILS_LOGGER.exception(
                 f"Failed to encode pdf to base64. Reason:{str(e)}")
 
+    @classmethod
+    def chunk_text(cls, text, max_tokens=MAX_TOKEN, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+        """
+        Split text into sentence aligned chunks of at most `max_tokens` model tokens.
+
+        Args:
+            text (str): The text to split.
+            max_tokens (int, optional): Token budget of a chunk. Defaults to MAX_TOKEN.
+            overlap_tokens (int, optional): Tokens of trailing sentences repeated in the next chunk.
+
+        Returns:
+            list[TextChunk]: Chunks with their character offsets and token arrays.
+        """
+        with timed_stage("chunking"):
+            return TokenChunker(max_tokens, overlap_tokens).chunk(text)
+
     @classmethod
     def split_text_into_chunks(cls, text, max_tokens=MAX_TOKEN):
         try:
-            sentences = sent_tokenize(text)
-            chunks = []
-            current_chunk = []
-            current_length = 0
-
-            for sentence in sentences:
-                sentence_length = len(sentence.split())
-                if current_length + sentence_length <= max_tokens:
-                    current_chunk.append(sentence)
-                    current_length += sentence_length
-                else:
-                    chunks.append(' '.join(current_chunk))
-                    current_chunk = [sentence]
-                    current_length = sentence_length
-
-            if current_chunk:
-                chunks.append(' '.join(current_chunk))
-
-            return chunks
+            return [chunk.text for chunk in cls.chunk_text(text, max_tokens)]
 
         except Exception as e:
             UTILS_LOGGER.exception(
@@ -114,7 +128,8 @@ class UtilityFunctions:
         try:
             pdf_path = UtilityFunctions.get_contract_path()
             UtilityFunctions.base64_to_pdf(base64_pdf_text, pdf_path)
-            pdf_text = UtilityFunctions.extract_text_from_pdf(pdf_path)
+            with timed_stage("pdf_content"):
+                pdf_text = UtilityFunctions.extract_text_from_pdf(pdf_path)
             return pdf_text
 
         except Exception as e:
@@ -122,30 +137,89 @@ class UtilityFunctions:
                 f"Failed to encode pdf to base64. Reason:{str(e)}")
 
     @classmethod
-    def split_text_into_chunks_using_model(cls, text, chunk_size):
+    def get_pdf_profile(cls, pdf_path):
+        """
+        Build the profile shared by the engines from a PDF on disk.
+
+        Args:
+            pdf_path (str): Path of the PDF.
+
+        Returns:
+            DocumentProfile: Text, counts, spans and language of the document.
+        """
         try:
-            # Initialize the tokenizer for the GPT model
-            enc = tiktoken.encoding_for_model(
-                "gpt-3.5-turbo")  # Adjust model name as needed
+            with timed_stage("pdf_content"):
+                pages, removed_lines = strip_repeated_page_lines(
+                    UtilityFunctions.extract_pages_from_pdf(pdf_path))
+                profile = DocumentProfile.from_pages(pages)
+            if removed_lines:
+                profile.boilerplate_tokens_saved = len(ResourceRegistry.get_encoding().encode(
+                    "".join(removed_lines), disallowed_special=()))
+                UTILS_LOGGER.info(
+                    f"Stripped {len(removed_lines)} header/footer lines, saving "
+                    f"{profile.boilerplate_tokens_saved} tokens")
+            return profile
+
+        except Exception as e:
+            UTILS_LOGGER.exception(
+                f"Failed to build document profile. Reason:{str(e)}")
+
+    @classmethod
+    def get_document_profile(cls, base64_pdf_text):
+        """
+        Store the uploaded PDF and build the profile shared by the engines.
 
-            # Tokenize the text
-            tokens = enc.encode(text)
+        Args:
+            base64_pdf_text (str): The base64 encoded PDF.
 
-            # Split tokens into chunks
-            chunks = [tokens[i:i + chunk_size]
-                      for i in range(0, len(tokens), chunk_size)]
+        Returns:
+            DocumentProfile: Text, counts, spans and language of the document.
+        """
+        try:
+            pdf_path = UtilityFunctions.get_contract_path()
+            UtilityFunctions.base64_to_pdf(base64_pdf_text, pdf_path)
+            return UtilityFunctions.get_pdf_profile(pdf_path)
 
-            # Decode tokens back to text
-            chunked_text = [enc.decode(chunk) for chunk in chunks]
+        except Exception as e:
+            UTILS_LOGGER.exception(
+                f"Failed to build document profile. Reason:{str(e)}")
 
-            return chunked_text
+    @classmethod
+    def split_text_into_chunks_using_model(cls, text, chunk_size):
+        try:
+            return [chunk.text for chunk in cls.chunk_text(text, chunk_size)]
         except Exception as e:
             UTILS_LOGGER.exception(
                 f"Failed to convert pdf text into its chuncked. Reason:{str(e)}")
 
+    @classmethod
+    def parse_json_response(cls, response, default=None):
+        """
+        Parse the JSON object or array embedded in a GPT response.
+
+        Markdown code fences and text around the JSON are ignored.
+
+        Args:
+            response (str): The GPT response.
+            default (optional): Returned when no valid JSON is found. Defaults to None.
+
+        Returns:
+            dict | list: The parsed JSON, or `default`.
+        """
+        starts = [index for index in (response.find("{"), response.find("[")) if index >= 0]
+        if not starts:
+            return default
+        start = min(starts)
+        end = response.rfind("}" if response[start] == "{" else "]")
+        try:
+            return json.loads(response[start:end + 1]) if end > start else default
+        except json.JSONDecodeError:
+            UTILS_LOGGER.warning("GPT response does not hold valid JSON")
+            return default
+
     @classmethod
     def get_gpt_response(cls, prompt):
-        client = OpenAI(api_key=os.environ.get('OPEN_AI_KEY'))
+        client = ResourceRegistry.get_module("openai").OpenAI(api_key=os.environ.get('OPEN_AI_KEY'))
         try:
             response = client.chat.completions.create(
                 model="gpt-3.5-turbo",
@@ -174,7 +248,13 @@ class UtilityFunctions:
 
 class AzureOpenAIAssistant:
     def __init__(self) -> None:
-        self.gpt_client = AzureOpenAI(
+        # Token estimates of the threads created by this client, only written for the threads kept for follow-ups
+        self.new_thread_tokens = {}
+        self.new_thread_lock = threading.Lock()
+        if is_stand_in_enabled():
+            self.gpt_client = StandInAzureOpenAI()
+            return
+        self.gpt_client = ResourceRegistry.get_module("openai").AzureOpenAI(
             api_key=os.getenv("AZURE_OPENAI_API_KEY"),
             api_version="2024-02-15-preview",
             azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
@@ -188,51 +268,192 @@ class AzureOpenAIAssistant:
         )
         return assistant.id
 
+    @traced()
     def first_conversation(self, user_query):
         try:
+            with timed_stage("assistant_create"):
+                thread = self.gpt_client.beta.threads.create(
+                    messages=[
+                        {
+                            'role': 'user',
+                            'content': user_query
+                        }
+                    ]
+                )
+            set_span_attributes(thread_id=thread.id)
+            response = self.run_chat_thread(thread_id=thread.id)
+            input_tokens, output_tokens = self.record_thread_tokens(thread.id, user_query, response, new_thread=True)
+            set_span_attributes(input_tokens=input_tokens, output_tokens=output_tokens)
+            return {"status": True, "thread_id": thread.id, "response": response}
+
+        except Exception as e:
+            UTILS_LOGGER.exception(
+                f"An error occured while initiating chat. Reason:{str(e)}")
+            mark_span_failed(e)
+            return {"status": False, "error_message": str(e)}
+
+    @traced()
+    def run_chat_thread(self, thread_id):
+        set_span_attributes(thread_id=thread_id)
+        with timed_stage("assistant_run"):
+            current_chat_thread_run = self.gpt_client.beta.threads.runs.create(
+                thread_id=thread_id,
+                assistant_id=os.environ.get('ASSISTANT_ID')
+            )
+        UTILS_LOGGER.info("Chat Running Started......")
+        start_time, polls, last_status = time.perf_counter(), 0, None
+        with timed_stage("assistant_poll"):
+            while current_chat_thread_run.status != "completed":
+                current_chat_thread_run = self.gpt_client.beta.threads.runs.retrieve(
+                    run_id=current_chat_thread_run.id, thread_id=thread_id)
+                polls += 1
+                # Only status changes are logged, the loop polls many times per second.
+                if current_chat_thread_run.status != last_status:
+                    last_status = current_chat_thread_run.status
+                    UTILS_LOGGER.info(f"run status:{last_status}")
+            else:
+                UTILS_LOGGER.info(f"Run Completed in {time.perf_counter() - start_time:.2f}s after {polls} polls")
+        set_span_attributes(run_id=current_chat_thread_run.id, poll_count=polls)
+
+        with timed_stage("assistant_fetch"):
+            messgae_response = self.gpt_client.beta.threads.messages.list(
+                thread_id=thread_id).data
+        return messgae_response[0].content[0].text.value
+
+    @traced()
+    def create_thread(self, content):
+        """
+        Create a thread holding `content` as its first user message, without running the assistant.
+
+        Returns:
+            str: The id of the new thread.
+        """
+        with timed_stage("assistant_create"):
             thread = self.gpt_client.beta.threads.create(
                 messages=[
                     {
                         'role': 'user',
-                        'content': user_query
+                        'content': content
                     }
                 ]
             )
-            return {"status": True, "thread_id": thread.id, "response": self.run_chat_thread(thread_id=thread.id)}
+        input_tokens = self.record_thread_tokens(thread.id, content, new_thread=True)[0]
+        set_span_attributes(thread_id=thread.id, input_tokens=input_tokens)
+        return thread.id
 
+    @traced()
+    def add_message(self, thread_id, content):
+        """
+        Append a user message to a thread without running the assistant.
+
+        Used to seed a thread with context (e.g. a locally rendered document)
+        that follow-up conversations should build on.
+        """
+        thread_id = ThreadStore.resolve(thread_id)
+        with timed_stage("assistant_create"):
+            self.gpt_client.beta.threads.messages.create(thread_id=thread_id,
+                                                         role='user',
+                                                         content=content)
+        input_tokens = self.record_thread_tokens(thread_id, content)[0]
+        set_span_attributes(thread_id=thread_id, input_tokens=input_tokens)
+
+    def record_thread_tokens(self, thread_id, *texts, new_thread=False):
+        """
+        Add the tokens of messages added to a thread to its estimated size.
+
+        The estimate of a thread created by this client stays in memory until `keep_thread`, so the
+        single use threads (chunks, merges, sections) leave nothing in the thread store.
+
+        Args:
+            thread_id (str): The thread the texts were added to.
+            new_thread (bool, optional): Whether the thread was just created by this client.
+
+        Returns:
+            list[int]: Token count of every text, 0 when it could not be counted.
+        """
+        token_counts = [0] * len(texts)
+        try:
+            token_counts = [TOKEN_BUDGET_PLANNER.count_tokens(text) if text else 0 for text in texts]
+            with self.new_thread_lock:
+                if new_thread or thread_id in self.new_thread_tokens:
+                    self.new_thread_tokens[thread_id] = self.new_thread_tokens.get(thread_id, 0) + sum(token_counts)
+                    return token_counts
+            ThreadStore.add_tokens(thread_id, sum(token_counts))
         except Exception as e:
             UTILS_LOGGER.exception(
-                f"An error occured while initiating chat. Reason:{str(e)}")
-            return {"status": False, "error_message": str(e)}
+                f"Failed to record the token estimate of thread {thread_id}. Reason:{str(e)}")
+        return token_counts
 
-    def run_chat_thread(self, thread_id):
-        current_chat_thread_run = self.gpt_client.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=os.environ.get('ASSISTANT_ID')
-        )
-        UTILS_LOGGER.info("Chat Running Started......")
-        while current_chat_thread_run.status != "completed":
-            current_chat_thread_run = self.gpt_client.beta.threads.runs.retrieve(
-                run_id=current_chat_thread_run.id, thread_id=thread_id)
-            UTILS_LOGGER.info(f"run status:{current_chat_thread_run.status}")
-        else:
-            UTILS_LOGGER.info("Run Completed")
+    def keep_thread(self, thread_id):
+        """
+        Persist the token estimate of a thread created by this client, the one returned for follow-ups.
 
-        messgae_response = self.gpt_client.beta.threads.messages.list(
-            thread_id=thread_id).data
-        return messgae_response[0].content[0].text.value
+        Returns:
+            str: The thread id.
+        """
+        with self.new_thread_lock:
+            tokens = self.new_thread_tokens.pop(thread_id, None)
+        if tokens is not None:
+            try:
+                ThreadStore.add_tokens(thread_id, tokens)
+            except Exception as e:
+                UTILS_LOGGER.exception(
+                    f"Failed to record the token estimate of thread {thread_id}. Reason:{str(e)}")
+        return thread_id
+
+    @traced()
+    def compact_thread(self, thread_id):
+        """
+        Condense a thread into a new thread seeded with the summary of the conversation.
+
+        The old thread id is aliased to the new one, so clients keep using the id they know.
 
+        Returns:
+            str: The id of the new thread.
+        """
+        with timed_stage("assistant_create"):
+            self.gpt_client.beta.threads.messages.create(thread_id=thread_id,
+                                                         role='user',
+                                                         content=THREAD_COMPACTION)
+        summary = self.run_chat_thread(thread_id=thread_id)
+        new_thread_id = self.keep_thread(self.create_thread(THREAD_COMPACTION_CONTEXT.format(summary=summary)))
+        ThreadStore.set_alias(thread_id, new_thread_id)
+        UTILS_LOGGER.info(f"Compacted thread {thread_id} into {new_thread_id}")
+        return new_thread_id
+
+    def get_active_thread(self, thread_id):
+        """
+        Resolve the thread a conversation lives in, compacting it first when it grew past the threshold.
+        """
+        active_thread_id = ThreadStore.resolve(thread_id)
+        try:
+            if ThreadStore.get_estimated_tokens(active_thread_id) > \
+                    TOKEN_BUDGET_PLANNER.context_tokens * THREAD_COMPACTION_RATIO:
+                active_thread_id = self.compact_thread(active_thread_id)
+        except Exception as e:
+            UTILS_LOGGER.exception(
+                f"Failed to compact thread {active_thread_id}, continuing in it. Reason:{str(e)}")
+        return active_thread_id
+
+    @traced()
     def next_conversion(self, user_prompt, thread_id):
         try:
+            active_thread_id = self.get_active_thread(thread_id)
+            set_span_attributes(thread_id=thread_id, active_thread_id=active_thread_id)
             # Add a new message to the existing thread
-            self.gpt_client.beta.threads.messages.create(thread_id=thread_id,
-                                                         role='user',
-                                                         content=user_prompt)
-            return {"status": True, "thread_id": thread_id, "response": self.run_chat_thread(thread_id=thread_id)}
+            with timed_stage("assistant_create"):
+                self.gpt_client.beta.threads.messages.create(thread_id=active_thread_id,
+                                                             role='user',
+                                                             content=user_prompt)
+            response = self.run_chat_thread(thread_id=active_thread_id)
+            input_tokens, output_tokens = self.record_thread_tokens(active_thread_id, user_prompt, response)
+            set_span_attributes(input_tokens=input_tokens, output_tokens=output_tokens)
+            return {"status": True, "thread_id": thread_id, "response": response}
 
         except Exception as e:
             UTILS_LOGGER.exception(
                 f"An error occured while initiating chat. Reason:{str(e)}")
+            mark_span_failed(e)
             return {"status": False, "error_message": str(e)}
 
 
@@ -8,9 +8,28 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
 """
 
 import os
+import time
 
 from django.core.wsgi import get_wsgi_application
 
+from backend.resources import ResourceRegistry
+
+STARTED_AT = time.perf_counter()
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'upraised_backend.settings')
 
 application = get_wsgi_application()
+
+# Load the NLP resources and heavy modules once in this process. When gunicorn
+# runs with --preload this module is imported by the master, so forked workers
+# share the loaded models copy-on-write.
+if os.environ.get('WARM_UP_RESOURCES'):
+    ResourceRegistry.warm_up()
+
+# Load (or extract once and persist) the standards of the master contracts.
+if os.environ.get('WARM_UP_MASTER_CONTRACTS'):
+    from base.master_contracts import MasterContractRegistry
+
+    MasterContractRegistry.warm_up()
+
+ResourceRegistry.startup_report(STARTED_AT, warmed_up=bool(os.environ.get('WARM_UP_RESOURCES')))
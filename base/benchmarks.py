@@ -0,0 +1,264 @@
+"""
+Micro benchmarks of the document processing hot paths.
+
+Every case runs on each PDF fixture of `shared_contracts/` and
+`data/hardcode_contracts/`, a file found in both folders is measured once.
+A case is timed over a few repetitions after one warm up run (which pays the
+lazy loading of the NLP resources), and its peak Python memory is measured in
+a separate run with tracemalloc. Results can be stored as a JSON baseline and
+later runs fail on regressions beyond a threshold. Run with `python manage.py benchmark`.
+"""
+
+import io
+import json
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+
+from django.core.files import File
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from base import BACKEND_LOGGER
+from base.constants import (BENCHMARK_NOISE_SECONDS,
+                            BENCHMARK_REGRESSION_THRESHOLD, BENCHMARK_REPEAT,
+                            DATA_FOLDER_PATH, MAX_TOKEN)
+from base.extraction import extract_contract_facts
+from base.master_contracts import MasterContractRegistry
+from base.serializers import PDFBase64File
+from base.utils import ContractSummarizationEngine
+from backend.parsers import ORJSONParser
+from backend.renderers import ORJSONRenderer
+from backend.settings import BASE_DIR
+from backend.utils import UtilityFunctions
+
+BENCHMARK_FIXTURE_FOLDERS = [
+    os.path.join(BASE_DIR, "shared_contracts"),
+    os.path.join(DATA_FOLDER_PATH, "hardcode_contracts"),
+]
+BENCHMARK_BASELINE_PATH = os.path.join(DATA_FOLDER_PATH, "benchmarks", "baseline.json")
+# Measures compared against the baseline
+BENCHMARK_MEASURES = ("seconds", "peak_memory_bytes")
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def measure(function, repeat=BENCHMARK_REPEAT):
+    """
+    Time `function` and measure its peak Python memory.
+
+    Args:
+        function (callable): Zero argument callable, a None result is a failure.
+        repeat (int, optional): Timed repetitions after the warm up run.
+
+    Returns:
+        dict: Median and min seconds of the repetitions and the peak traced memory.
+    """
+    if function() is None:
+        raise BenchmarkError("the benchmarked function returned no result")
+
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    try:
+        function()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": round(statistics.median(timings), 6),
+        "min_seconds": round(min(timings), 6),
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+class BenchmarkFixture:
+    """A PDF fixture, its derived inputs are computed once and outside of the timings."""
+
+    def __init__(self, pdf_path):
+        self.pdf_path = pdf_path
+        # File names repeat across the fixture folders
+        self.name = os.path.relpath(pdf_path, BASE_DIR)
+        self._inputs = {}
+
+    def get(self, key, builder):
+        if key not in self._inputs:
+            self._inputs[key] = builder()
+        return self._inputs[key]
+
+    @property
+    def text(self):
+        return self.get("text", lambda: UtilityFunctions.extract_text_from_pdf(self.pdf_path))
+
+    @property
+    def base64_text(self):
+        return self.get("base64_text", lambda: UtilityFunctions.pdf_to_base64(self.pdf_path))
+
+    @property
+    def profile(self):
+        return self.get("profile", lambda: UtilityFunctions.get_pdf_profile(self.pdf_path))
+
+    @property
+    def facts(self):
+        return self.get("facts", lambda: extract_contract_facts(self.profile))
+
+    @property
+    def request_body(self):
+        # A comparison request, the largest: the contract and a master contract
+        return self.get("request_body", lambda: json.dumps(
+            {"contract_pdf": self.base64_text, "master_contract_pdf": self.base64_text}).encode("utf-8"))
+
+    @property
+    def response_data(self):
+        # A CustomResponse holding a long answer
+        return self.get("response_data", lambda: {
+            "status": True, "message": "Response Generated Successfully",
+            "data": {"response": self.text, "thread_id": "thread_benchmark"}, "status_code": 200})
+
+    def encode_base64(self):
+        with open(self.pdf_path, "rb") as pdf_file:
+            return PDFBase64File().to_representation(File(pdf_file, name=self.pdf_path))
+
+
+BENCHMARK_CASES = {
+    "extract_text_from_pdf": lambda fixture: lambda: UtilityFunctions.extract_text_from_pdf(fixture.pdf_path),
+    "split_text_into_chunks": lambda fixture: lambda: UtilityFunctions.split_text_into_chunks(fixture.text),
+    "split_text_into_chunks_using_model": lambda fixture: lambda: UtilityFunctions.split_text_into_chunks_using_model(
+        fixture.text, MAX_TOKEN),
+    "identify_standards": lambda fixture: lambda: UtilityFunctions.identify_standards(fixture.text),
+    "pdf_base64_decode": lambda fixture: lambda: PDFBase64File().to_internal_value(fixture.base64_text),
+    "pdf_base64_encode": lambda fixture: fixture.encode_base64,
+    "determine_strategy": lambda fixture: lambda: ContractSummarizationEngine().determine_strategy(
+        fixture.profile, fixture.facts),
+    "request_parse_stock": lambda fixture: lambda: JSONParser().parse(io.BytesIO(fixture.request_body)),
+    "request_parse_orjson": lambda fixture: lambda: ORJSONParser().parse(io.BytesIO(fixture.request_body)),
+    "response_render_stock": lambda fixture: lambda: JSONRenderer().render(fixture.response_data),
+    "response_render_orjson": lambda fixture: lambda: ORJSONRenderer().render(fixture.response_data),
+}
+
+
+class BenchmarkSuite:
+    def __init__(self, repeat=BENCHMARK_REPEAT, cases=None, fixture_filter=None):
+        """
+        Initialize the suite.
+
+        Args:
+            repeat (int, optional): Timed repetitions of every case.
+            cases (list[str], optional): Names of the cases to run. Defaults to every case.
+            fixture_filter (str, optional): Only run the fixtures whose file name contains it.
+        """
+        unknown_cases = set(cases or []) - set(BENCHMARK_CASES)
+        if unknown_cases:
+            raise BenchmarkError(f"Unknown benchmark cases: {', '.join(sorted(unknown_cases))}")
+        self.repeat = repeat
+        self.cases = cases or list(BENCHMARK_CASES)
+        self.fixture_filter = fixture_filter
+
+    def fixtures(self):
+        """
+        Return the PDF fixtures to run, a file whose content was already found in a previous folder is skipped.
+        """
+        fixtures, file_hashes = [], set()
+        for folder in BENCHMARK_FIXTURE_FOLDERS:
+            if not os.path.isdir(folder):
+                continue
+            for filename in sorted(os.listdir(folder)):
+                if not filename.lower().endswith(".pdf") or (
+                        self.fixture_filter and self.fixture_filter not in filename):
+                    continue
+                pdf_path = os.path.join(folder, filename)
+                file_hash = MasterContractRegistry.get_file_hash(pdf_path)
+                if file_hash in file_hashes:
+                    continue
+                file_hashes.add(file_hash)
+                fixtures.append(BenchmarkFixture(pdf_path))
+        return fixtures
+
+    def run(self, progress=None):
+        """
+        Run every case on every fixture.
+
+        Args:
+            progress (callable, optional): Called with the key and result of every measured case.
+
+        Returns:
+            dict: Result of every case, keyed by "<case>:<fixture path relative to BASE_DIR>". Failed cases
+                hold an "error".
+        """
+        results = {}
+        for fixture in self.fixtures():
+            for case in self.cases:
+                key = f"{case}:{fixture.name}"
+                try:
+                    results[key] = measure(BENCHMARK_CASES[case](fixture), self.repeat)
+                except Exception as e:
+                    BACKEND_LOGGER.exception(f"Benchmark {key} failed: {str(e)}")
+                    results[key] = {"error": str(e)}
+                if progress:
+                    progress(key, results[key])
+        return results
+
+
+def load_baseline(path=BENCHMARK_BASELINE_PATH):
+    """
+    Return the results of a stored baseline, None when there is none.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as baseline_file:
+        return json.load(baseline_file)["results"]
+
+
+def save_baseline(results, path=BENCHMARK_BASELINE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    baseline = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {key: result for key, result in results.items() if "error" not in result},
+    }
+    with open(path, "w", encoding="utf-8") as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+
+
+def find_regressions(results, baseline, threshold=BENCHMARK_REGRESSION_THRESHOLD):
+    """
+    Compare results with a baseline.
+
+    Timing differences under BENCHMARK_NOISE_SECONDS are ignored.
+
+    Args:
+        results (dict): Results of `BenchmarkSuite.run`.
+        baseline (dict): Results of the baseline.
+        threshold (float, optional): Tolerated relative increase, e.g. 0.2 for 20%.
+
+    Returns:
+        list[str]: One message per regression.
+    """
+    regressions = []
+    for key, result in results.items():
+        baseline_result = baseline.get(key)
+        if baseline_result is None:
+            continue
+        if "error" in result:
+            regressions.append(f"{key}: failed ({result['error']})")
+            continue
+        for measure_name in BENCHMARK_MEASURES:
+            current, previous = result[measure_name], baseline_result.get(measure_name)
+            if previous is None or current <= previous * (1 + threshold):
+                continue
+            if measure_name == "seconds" and current - previous < BENCHMARK_NOISE_SECONDS:
+                continue
+            increase = f" (+{(current / previous - 1) * 100:.0f}%)" if previous else ""
+            regressions.append(f"{key}: {measure_name} {current} vs {previous} in the baseline{increase}")
+    return regressions
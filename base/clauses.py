@@ -0,0 +1,277 @@
+"""
+Structured contract clauses and their deterministic comparison.
+
+The LLM extracts JSON clause records (category, values, dates, amounts) from
+every chunk. Records are normalized and merged per category locally, then the
+contract and master clauses are aligned and diffed here, so the LLM is only
+asked to narrate a compact list of differences.
+"""
+
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from base.constants import CLAUSE_VALUE_MATCH_THRESHOLD
+from base.prompts import CONTRACT_PARAMETERS
+from backend.utils import UtilityFunctions
+
+CATEGORY_LOOKUP = {re.sub(r"[^a-z]", "", category.lower()): category for category in CONTRACT_PARAMETERS}
+VALUE_WORD_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+# A number with its group / decimal separators and an optional magnitude word
+AMOUNT_NUMBER_PATTERN = re.compile(
+    r"(?<![a-z\d.,])(?P<sign>-)?(?P<number>\d(?:[\d,.']|\s(?=\d{3}\b))*)"
+    r"(?:\s?(?P<scale>(?i:thousand|million|billion|mn|bn|k|lakhs?|crores?)))?(?![a-z])")
+AMOUNT_SCALES = {"thousand": 10 ** 3, "k": 10 ** 3, "lakh": 10 ** 5, "crore": 10 ** 7, "million": 10 ** 6,
+                 "mn": 10 ** 6, "billion": 10 ** 9, "bn": 10 ** 9}
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP", "₹": "INR", "¥": "JPY"}
+CURRENCY_CODE_PATTERN = re.compile(r"\b[A-Z]{3}\b")
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%B %d, %Y", "%b %d, %Y", "%d %B %Y", "%d %b %Y", "%Y/%m/%d")
+CLAUSE_FIELDS = ("values", "dates", "amounts")
+
+
+def canonical_category(category):
+    """
+    Map a category returned by the LLM onto one of CONTRACT_PARAMETERS, or None.
+    """
+    if not isinstance(category, str):
+        return None
+    return CATEGORY_LOOKUP.get(re.sub(r"[^a-z]", "", category.lower()))
+
+
+def normalize_date(date):
+    date = " ".join(str(date).split())
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(date, date_format).date().isoformat()
+        except ValueError:
+            continue
+    return date.lower()
+
+
+def is_digit_groups(groups):
+    """
+    Whether `groups` are the thousands groups of an integer (1,234,567 or the Indian 12,34,567).
+    """
+    if not all(group.isdigit() for group in groups) or not 1 <= len(groups[0]) <= 3 or len(groups[-1]) != 3:
+        return False
+    middle_lengths = {len(group) for group in groups[1:-1]}
+    return middle_lengths <= {3} or (middle_lengths == {2} and len(groups[0]) <= 2)
+
+
+def parse_decimal(number):
+    """
+    Read a number written with "," or "." as group or decimal separator (1,234.56 / 1.234,56 / 1 234,56).
+
+    Returns:
+        Decimal | None: The number, None when the separators do not tell its value.
+    """
+    number = re.sub(r"[' ]", "", number.strip(" .,'"))
+    separators = {character for character in number if character in ",."}
+    if not separators:
+        return Decimal(number)
+
+    if len(separators) == 2:
+        decimal_separator = number[max(number.rfind(","), number.rfind("."))]
+        integer, _, fraction = number.rpartition(decimal_separator)
+        groups = integer.split("," if decimal_separator == "." else ".")
+        if not fraction.isdigit() or not is_digit_groups(groups):
+            return None
+        return Decimal(f"{''.join(groups)}.{fraction}")
+
+    separator = separators.pop()
+    parts = number.split(separator)
+    if len(parts) > 2:
+        return Decimal("".join(parts)) if is_digit_groups(parts) else None
+    integer, fraction = parts
+    if len(fraction) != 3 or integer == "0":
+        return Decimal(f"{integer}.{fraction}")
+    # "1,500" / "1.500": amounts have at most 2 decimals, 3 digits after the only separator are a group.
+    return Decimal(integer + fraction) if len(integer) <= 3 else None
+
+
+def parse_amount_value(text):
+    """
+    Return the value of the only number of `text` along with its magnitude ("2 million", "10k"), or None.
+    """
+    matches = list(AMOUNT_NUMBER_PATTERN.finditer(text))
+    if len(matches) != 1:
+        return None
+    match = matches[0]
+    try:
+        value = parse_decimal(match.group("number"))
+    except InvalidOperation:
+        return None
+    if value is None:
+        return None
+    if match.group("scale"):
+        value *= AMOUNT_SCALES[match.group("scale").lower().rstrip("s")]
+    return -value if match.group("sign") else value
+
+
+def normalize_amount(amount):
+    """
+    Return an amount as a "<value> <currency>" string so that amounts compare by value.
+
+    Args:
+        amount (dict | str | int | float): {"value", "currency"} record or the amount as written.
+
+    Returns:
+        str | None: The normalized amount, None when its value cannot be read unambiguously.
+    """
+    if isinstance(amount, dict):
+        value, currency = amount.get("value"), amount.get("currency")
+    else:
+        value, currency = amount, None
+
+    text = " ".join(str(value).split())
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        number = Decimal(str(value)) if value == value and abs(value) != float("inf") else None
+    else:
+        number = parse_amount_value(text)
+    if number is None:
+        return None
+
+    if not currency:
+        code = CURRENCY_CODE_PATTERN.search(text)
+        currency = code.group() if code else next(
+            (code for symbol, code in CURRENCY_SYMBOLS.items() if symbol in text), None)
+    currency = str(currency).upper() if currency else ""
+    return f"{format(number.normalize(), 'f')} {currency}".strip()
+
+
+def describe_amount(amount):
+    """
+    Return an amount whose value cannot be read as text, to compare it as written.
+    """
+    if isinstance(amount, dict):
+        amount = " ".join(str(part) for part in (amount.get("value"), amount.get("currency")) if part)
+    return " ".join(str(amount).split())
+
+
+def parse_clause_records(response):
+    """
+    Parse the JSON clause records out of an LLM response.
+
+    Code fences and text around the JSON array are ignored. Records with an
+    unknown category are dropped.
+
+    Args:
+        response (str): The LLM response.
+
+    Returns:
+        list[dict]: Records with a canonical category and normalized fields.
+    """
+    records = UtilityFunctions.parse_json_response(response, default=[])
+    if isinstance(records, dict):
+        records = records.get("records") or records.get("clauses") or []
+
+    parsed = []
+    for record in records if isinstance(records, list) else []:
+        if not isinstance(record, dict):
+            continue
+        category = canonical_category(record.get("category"))
+        if category is None:
+            continue
+        fields = {field: record.get(field) or [] for field in CLAUSE_FIELDS}
+        fields = {field: items if isinstance(items, list) else [items] for field, items in fields.items()}
+        parsed.append({
+            "category": category,
+            "values": [" ".join(str(value).split()) for value in fields["values"] if str(value).strip()],
+            "dates": [normalize_date(date) for date in fields["dates"] if str(date).strip()],
+            "amounts": [normalize_amount(amount) or describe_amount(amount)
+                        for amount in fields["amounts"] if describe_amount(amount)],
+        })
+    return parsed
+
+
+def merge_clause_records(records):
+    """
+    Merge records of the same category, keeping the first occurrence of every item.
+
+    Args:
+        records (list[dict]): Parsed records of every chunk, in document order.
+
+    Returns:
+        dict: {category: {"values": [...], "dates": [...], "amounts": [...]}} in CONTRACT_PARAMETERS order.
+    """
+    merged = {}
+    for record in records:
+        clause = merged.setdefault(record["category"], {field: [] for field in CLAUSE_FIELDS})
+        for field in CLAUSE_FIELDS:
+            clause[field].extend(item for item in record[field] if item not in clause[field])
+    return {category: merged[category] for category in CONTRACT_PARAMETERS if category in merged}
+
+
+def value_words(value):
+    return frozenset(VALUE_WORD_PATTERN.findall(value.lower()))
+
+
+def align_values(contract_values, master_values, threshold=CLAUSE_VALUE_MATCH_THRESHOLD):
+    """
+    Greedily pair statements whose word sets overlap the most.
+
+    Returns:
+        tuple[list, list]: Contract values and master values left without a match.
+    """
+    contract_words = [value_words(value) for value in contract_values]
+    master_words = [value_words(value) for value in master_values]
+    candidates = sorted(
+        ((len(c_words & m_words) / max(len(c_words | m_words), 1), c_index, m_index)
+         for c_index, c_words in enumerate(contract_words)
+         for m_index, m_words in enumerate(master_words)),
+        key=lambda candidate: (-candidate[0], candidate[1], candidate[2]))
+
+    matched_contract, matched_master = set(), set()
+    for similarity, c_index, m_index in candidates:
+        if similarity < threshold:
+            break
+        if c_index not in matched_contract and m_index not in matched_master:
+            matched_contract.add(c_index)
+            matched_master.add(m_index)
+
+    return ([value for index, value in enumerate(contract_values) if index not in matched_contract],
+            [value for index, value in enumerate(master_values) if index not in matched_master])
+
+
+class ClauseComparator:
+    @classmethod
+    def compare(cls, contract_clauses, master_clauses):
+        """
+        Diff the merged clauses of a contract against the master contract.
+
+        Args:
+            contract_clauses (dict): Output of `merge_clause_records` for the contract.
+            master_clauses (dict): Output of `merge_clause_records` for the master contract.
+
+        Returns:
+            dict: {"matching": [categories], "differences": [{"category", "status", ...}]}.
+        """
+        matching, differences = [], []
+        for category in CONTRACT_PARAMETERS:
+            contract_clause = contract_clauses.get(category)
+            master_clause = master_clauses.get(category)
+            if contract_clause is None and master_clause is None:
+                continue
+            if master_clause is None:
+                differences.append({"category": category, "status": "missing_in_master", **contract_clause})
+                continue
+            if contract_clause is None:
+                differences.append({"category": category, "status": "missing_in_contract", **master_clause})
+                continue
+
+            difference = {"category": category, "status": "different"}
+            contract_values, master_values = align_values(contract_clause["values"], master_clause["values"])
+            if contract_values or master_values:
+                difference["values"] = {"contract": contract_values, "master": master_values}
+            for field in ("dates", "amounts"):
+                only_contract = [item for item in contract_clause[field] if item not in master_clause[field]]
+                only_master = [item for item in master_clause[field] if item not in contract_clause[field]]
+                if only_contract or only_master:
+                    difference[field] = {"contract": only_contract, "master": only_master}
+
+            if len(difference) > 2:
+                differences.append(difference)
+            else:
+                matching.append(category)
+
+        return {"matching": matching, "differences": differences}
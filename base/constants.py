@@ -1,7 +1,55 @@
 from backend.settings import BASE_DIR
 
-TEXT_LENGTH_THRESHOLD = 100000
-MAX_TOKEN = 1000
+# Model tokens per chunk that dedup and relevance filtering work on, kept chunks are then packed into
+# as few calls as the context window allows (see backend.budget)
+MAX_TOKEN = 1300
+CHUNK_OVERLAP_TOKENS = 0
 
 DATA_FOLDER_PATH = f"{BASE_DIR}/data"
 DEFAULT_ASSITANT_MODEL = "metricsnumero"
+
+# Retrieval augmented follow-ups of the conversational engine. The contract embedded in the first prompt and
+# the passages attached to a follow-up get a share of the payload budget (see backend.budget), the rest of
+# the context window is left to the conversation
+RETRIEVAL_PASSAGE_TOKENS = 400
+RETRIEVAL_OVERVIEW_SHARE = 0.25
+RETRIEVAL_PASSAGES_SHARE = 0.1
+CONVERSATION_OUTPUT_TOKENS = 1500
+
+# Minimum weighted financial hits per 100 words for spend analytics to send a chunk
+SPEND_RELEVANCE_THRESHOLD = 4.0
+# Minimum word overlap (Jaccard) for two clause statements to be considered the same term
+CLAUSE_VALUE_MATCH_THRESHOLD = 0.6
+
+# Section parallel contract authoring
+CONTRACT_MAX_SECTIONS = 15
+CONTRACT_SECTION_WORKERS = 4
+
+# Local extraction of amounts, dates, durations and payment terms, see base.extraction
+FACT_PASSAGE_TOKENS = 2000
+FACT_CONTEXT_LIMIT = 10
+# Longest follow-up question answered from the extracted facts
+FACT_ANSWER_MAX_WORDS = 20
+
+# Hierarchical reduction of per chunk results: final result size and concurrent merges
+REDUCE_OUTPUT_TOKENS = 1500
+REDUCE_WORKERS = 4
+
+# Tokens reserved for the answer of every call when packing the context window
+CHUNK_SUMMARY_OUTPUT_TOKENS = 1000
+CONTRACT_SUMMARY_OUTPUT_TOKENS = 1500
+REVENUE_LEAKAGE_OUTPUT_TOKENS = 1500
+CLAUSE_EXTRACTION_OUTPUT_TOKENS = 2000
+
+# Micro benchmarks, see base.benchmarks: timed repetitions, tolerated relative regression
+# and timing differences ignored as noise
+BENCHMARK_REPEAT = 5
+BENCHMARK_REGRESSION_THRESHOLD = 0.2
+BENCHMARK_NOISE_SECONDS = 0.005
+
+# Load tests, see base.loadtest: concurrent virtual users, run duration, share of the contract
+# requests sent as thread follow-ups and client timeout of a request
+LOADTEST_USERS = 8
+LOADTEST_DURATION_SECONDS = 60
+LOADTEST_FOLLOW_UP_RATIO = 0.5
+LOADTEST_REQUEST_TIMEOUT = 600
@@ -0,0 +1,143 @@
+"""
+Compiled contract template for template-fill authoring.
+
+CONTRACT_TEMPLATE is compiled once into a `string.Template` where every blank
+(`[Label]` or `______`) becomes a named field. The LLM only returns the field
+values and the custom clauses as JSON and the document is rendered locally,
+so the output tokens no longer scale with the size of the contract.
+"""
+
+import re
+from collections import Counter
+from string import Template
+
+from base.prompts import CONTRACT_TEMPLATE
+
+# Matched on the template once "$" is escaped as "$$" for string.Template.
+BLANK_PATTERN = re.compile(r"\[([^\]]+)\]|((?:\$\$)?)_{3,}")
+PARTY_PATTERN = re.compile(r"^Party (\d+)(?: \((\w+)\))?:?$")
+LABEL_PATTERN = re.compile(r"^([A-Za-z][A-Za-z ]*):")
+# Lines after which the scope of work is written and before which custom clauses are added.
+SCOPE_OF_WORK_ANCHOR = "agrees to provide the following services/products to"
+CUSTOM_CLAUSES_ANCHOR = "Signatures:"
+EXTRA_BLANK_LINES_PATTERN = re.compile(r"\n{3,}")
+# Blank labels that say nothing of their meaning on their own, named after the words following them
+GENERIC_FIELD_NAMES = {"amount", "number", "value", "blank"}
+QUALIFIER_WORD_PATTERN = re.compile(r"[a-z]+")
+QUALIFIER_STOP_WORDS = {"a", "an", "and", "by", "for", "of", "or", "s", "the", "this", "to", "with"}
+QUALIFIER_WORDS = 3
+# Runs of spaces inside a line, left by the backslash continuations of CONTRACT_TEMPLATE.
+REPEATED_SPACES_PATTERN = re.compile(r"(?<=\S) {2,}")
+
+
+def slugify(label):
+    return re.sub(r"[^a-z0-9]+", "_", label.lower()).strip("_")
+
+
+class CompiledContractTemplate:
+    def __init__(self, template_text=CONTRACT_TEMPLATE):
+        """
+        Compile a contract template.
+
+        Args:
+            template_text (str, optional): The template to compile. Defaults to CONTRACT_TEMPLATE.
+        """
+        # field name -> blank text it replaces, in document order
+        self.fields = {}
+        self.label_counts = Counter(slugify(label) for label, _ in BLANK_PATTERN.findall(template_text) if label)
+        self.template = Template(self._compile(template_text))
+
+    def _add_field(self, name, blank):
+        unique_name, suffix = name, 2
+        while unique_name in self.fields:
+            unique_name, suffix = f"{name}_{suffix}", suffix + 1
+        self.fields[unique_name] = blank
+        return unique_name
+
+    def _compile(self, template_text):
+        compiled_lines = []
+        context = ""
+        has_custom_clauses = False
+
+        for line in template_text.replace("$", "$$").splitlines():
+            line = REPEATED_SPACES_PATTERN.sub(" ", line)
+            stripped = line.strip()
+            party = PARTY_PATTERN.match(stripped)
+            if party:
+                context = f"party_{party.group(1)}_{party.group(2).lower()}_" if party.group(2) \
+                    else f"party_{party.group(1)}_"
+            elif not stripped:
+                context = ""
+
+            if stripped == CUSTOM_CLAUSES_ANCHOR:
+                compiled_lines.extend(["${custom_clauses}", ""])
+                has_custom_clauses = True
+
+            compiled_lines.append(BLANK_PATTERN.sub(lambda match: self._compile_blank(match, line, context), line))
+
+            if SCOPE_OF_WORK_ANCHOR in line:
+                compiled_lines.append("${scope_of_work}")
+
+        if not has_custom_clauses:
+            compiled_lines.extend(["", "${custom_clauses}"])
+        return "\n".join(compiled_lines)
+
+    def _compile_blank(self, match, line, context):
+        # A currency sign in front of a blank stays in the document, only the blank is a field.
+        currency = match.group(2) or ""
+        blank = match.group(0)[len(currency):]
+        if match.group(1):
+            name = slugify(match.group(1))
+            if name in GENERIC_FIELD_NAMES or self.label_counts[name] > 1:
+                name = self._qualify(name, line[match.end():])
+        else:
+            label = LABEL_PATTERN.match(line.strip())
+            name = slugify(label.group(1)) if label else ("fee" if currency else "blank")
+        return f"{currency}${{{self._add_field(context + name, blank)}}}"
+
+    @staticmethod
+    def _qualify(name, following_text):
+        """
+        Name a generic or repeated blank after the words following it, e.g. "[Amount] upon signing of this
+        Agreement" -> amount_upon_signing.
+        """
+        words = []
+        for word in QUALIFIER_WORD_PATTERN.findall(following_text.lower()):
+            if word in QUALIFIER_STOP_WORDS:
+                if words:
+                    break
+                continue
+            words.append(word)
+            if len(words) == QUALIFIER_WORDS:
+                break
+        return "_".join([name] + words)
+
+    def describe_fields(self):
+        """
+        Return the field names along with the blank they replace, one per line, for the prompt.
+        """
+        return "\n".join(f"- {name}: {blank}" for name, blank in self.fields.items())
+
+    def render(self, fields=None, scope_of_work="", custom_clauses=None):
+        """
+        Render the contract. Fields without a value keep their original blank.
+
+        Args:
+            fields (dict, optional): Value of every field.
+            scope_of_work (str, optional): Services/products provided.
+            custom_clauses (list, optional): {"title", "text"} clauses added before the signatures.
+
+        Returns:
+            str: The rendered contract.
+        """
+        fields = fields or {}
+        values = {name: str(fields.get(name) or blank) for name, blank in self.fields.items()}
+        values["scope_of_work"] = str(scope_of_work or "").strip()
+        values["custom_clauses"] = "\n\n".join(
+            f"{clause.get('title', '').strip()}: {clause.get('text', '').strip()}".strip(": ")
+            for clause in custom_clauses or [] if isinstance(clause, dict) and clause.get("text"))
+        # Drop the empty lines left by empty scope of work / custom clauses.
+        return EXTRA_BLANK_LINES_PATTERN.sub("\n\n", self.template.safe_substitute(values))
+
+
+COMPILED_CONTRACT_TEMPLATE = CompiledContractTemplate()
@@ -29,6 +29,8 @@ class ContractType(EnumChoice):
     # SAP = "SAP"
     # WARRANTY = "Warranty"
     CUSTOM = "Custom"
+    TEMPLATE = "Template"
+    SECTIONED = "Sectioned"
 
     def __str__(self):
         return f'{self.value}'
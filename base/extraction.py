@@ -0,0 +1,323 @@
+"""
+Deterministic extraction of the financial facts of a contract.
+
+Amounts, dates, durations and payment terms are pulled out locally: the
+passages of the document go through the shared spaCy pipeline in bulk with
+`nlp.pipe` (named MONEY / DATE entities and a compiled Matcher for durations)
+and a few compiled regular expressions. The engines hand the facts to the LLM
+as compact structured context, and simple follow-up questions about them are
+answered from the facts persisted with the thread, without an LLM round-trip.
+"""
+
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from base import BACKEND_LOGGER
+from base.clauses import CURRENCY_SYMBOLS, normalize_amount, normalize_date
+from base.constants import (FACT_ANSWER_MAX_WORDS, FACT_CONTEXT_LIMIT,
+                            FACT_PASSAGE_TOKENS)
+from base.prompts import FACT_ANSWER_CONTEXT
+from backend.resources import ResourceRegistry
+from backend.thread_store import ThreadStore
+
+FACTS_FILENAME = "facts.json"
+FACT_KINDS = ("amounts", "dates", "durations", "payment_terms")
+CONTEXT_CHARS = 240
+
+CURRENCY_WORDS = {"dollars": "USD", "euros": "EUR", "pounds": "GBP", "rupees": "INR"}
+CURRENCY_CODES = "USD|EUR|GBP|INR|JPY|CAD|AUD|CHF|CNY|SGD"
+NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+AMOUNT_PATTERN = re.compile(
+    rf"(?:(?P<symbol>[$€£₹¥])|\b(?P<code>{CURRENCY_CODES}))\s?(?P<value>{NUMBER})"
+    rf"(?:\s(?P<scale>thousand|million|billion))?"
+    rf"|\b(?P<suffix_value>{NUMBER})\s?(?P<suffix>{CURRENCY_CODES}|dollars|euros|pounds|rupees)\b",
+    re.IGNORECASE)
+MONTHS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+DATE_PATTERN = re.compile(
+    rf"\b(?:\d{{4}}-\d{{2}}-\d{{2}}|\d{{1,2}}/\d{{1,2}}/\d{{4}}"
+    rf"|{MONTHS}\s\d{{1,2}},?\s\d{{4}}|\d{{1,2}}\s{MONTHS}\s\d{{4}})\b",
+    re.IGNORECASE)
+PAYMENT_TERM_PATTERN = re.compile(
+    r"\bnet\s?\d{1,3}\b|\b(?:due|payable|paid|invoiced?)\b.{0,60}?\b(?:within|upon|on|prior to|in advance|"
+    r"in arrears|installments?|monthly|quarterly|annually)\b[^.;:\n]{0,80}"
+    r"|\bupon (?:signing|receipt|completion|delivery)\b",
+    re.IGNORECASE)
+WORD_NUMBERS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+    "fifteen": 15, "twenty": 20, "thirty": 30, "forty": 40, "forty-five": 45, "sixty": 60, "ninety": 90,
+}
+DURATION_UNIT_DAYS = {"day": 1, "week": 7, "month": 30, "year": 365}
+
+# Follow-up questions answered from the facts, checked in order.
+QUESTION_TOPICS = (
+    ("payment_terms", re.compile(r"\b(payment terms?|payment schedule|when\b.*\b(?:pay|paid|payable|due)|"
+                                 r"due date|invoic)", re.IGNORECASE)),
+    ("amounts", re.compile(r"\b(how much|amounts?|fees?|price|cost|value|total|compensation)\b", re.IGNORECASE)),
+    ("durations", re.compile(r"\b(how long|notice period|duration|how many (?:days|weeks|months|years))\b",
+                             re.IGNORECASE)),
+    ("dates", re.compile(r"\b(when|dates?|start|begin|commence|end|expire|expiry|effective|deadline)\b",
+                         re.IGNORECASE)),
+)
+# Questions that need reasoning over the contract, not a lookup.
+REASONING_PATTERN = re.compile(
+    r"\b(why|how does|explain|summar\w*|compare|risks?|should|could|would|what if|leak\w*|and)\b", re.IGNORECASE)
+QUERY_WORD_PATTERN = re.compile(r"[a-z]{4,}")
+# Words of a question that say nothing about its subject
+QUERY_STOP_WORDS = frozenset({
+    "what", "when", "where", "which", "there", "does", "this", "that", "these", "those", "with", "have", "from",
+    "about", "under", "will", "much", "many", "tell", "please", "contract", "agreement", "state", "states"})
+# "January 5 2024" -> "January 5, 2024", the format normalize_date understands
+DATE_YEAR_COMMA_PATTERN = re.compile(r"(\d)\s*,?\s+(\d{4})$")
+
+
+def parse_number(text):
+    text = text.lower().strip("()")
+    if text in WORD_NUMBERS:
+        return WORD_NUMBERS[text]
+    try:
+        return float(text.replace(",", ""))
+    except ValueError:
+        return None
+
+
+class ContractFacts:
+    def __init__(self, amounts=None, dates=None, durations=None, payment_terms=None):
+        """
+        Facts of a contract. Every fact is a {"text", "value", "page", "context"} dict.
+        """
+        self.amounts = amounts or []
+        self.dates = dates or []
+        self.durations = durations or []
+        self.payment_terms = payment_terms or []
+
+    def __bool__(self):
+        return any(getattr(self, kind) for kind in FACT_KINDS)
+
+    def to_dict(self):
+        return {kind: getattr(self, kind) for kind in FACT_KINDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{kind: data.get(kind) or [] for kind in FACT_KINDS})
+
+    def to_prompt_context(self, limit=FACT_CONTEXT_LIMIT):
+        """
+        Render the facts as a compact block for the prompts, at most `limit` facts of every kind.
+        """
+        lines = []
+        for kind in FACT_KINDS:
+            facts = getattr(self, kind)[:limit]
+            if facts:
+                lines.append(f"{kind.replace('_', ' ').title()}: " + "; ".join(
+                    f"{fact['text']} (page {fact['page']})" for fact in facts))
+        return "\n".join(lines) or "None"
+
+    def save(self, thread_id):
+        """
+        Persist the facts with the thread. A failure is only logged, follow-ups then go to the LLM.
+        """
+        if not thread_id:
+            return
+        try:
+            ThreadStore.save_json(thread_id, FACTS_FILENAME, self.to_dict())
+        except Exception as e:
+            BACKEND_LOGGER.exception(
+                f"Failed to persist contract facts of thread {thread_id}: {str(e)}")
+
+    @classmethod
+    def load(cls, thread_id):
+        """
+        Return the facts persisted for `thread_id`, or None.
+        """
+        try:
+            data = ThreadStore.load_json(thread_id, FACTS_FILENAME)
+        except ValueError:
+            return None
+        return cls.from_dict(data) if data else None
+
+    def answer(self, user_query):
+        """
+        Answer a simple lookup question (amounts, dates, durations, payment terms) from the facts.
+
+        Args:
+            user_query (str): The follow-up question of the user.
+
+        Returns:
+            str: The answer, or None when the question needs the LLM.
+        """
+        if len(user_query.split()) > FACT_ANSWER_MAX_WORDS or REASONING_PATTERN.search(user_query):
+            return None
+        topic = next((kind for kind, pattern in QUESTION_TOPICS if pattern.search(user_query)), None)
+        facts = getattr(self, topic) if topic else []
+        if not facts:
+            return None
+
+        # Keep the facts whose sentence mentions the subject of the question, e.g. "termination". When none
+        # does, listing every fact of the topic would not answer it.
+        query_words = set(QUERY_WORD_PATTERN.findall(user_query.lower())) - QUERY_STOP_WORDS
+        overlaps = [len(query_words & set(QUERY_WORD_PATTERN.findall(fact["context"].lower()))) for fact in facts]
+        best_overlap = max(overlaps)
+        if best_overlap == 0:
+            return None
+        facts = [fact for fact, overlap in zip(facts, overlaps) if overlap == best_overlap][:FACT_CONTEXT_LIMIT]
+
+        lines = [f"The contract states the following {topic.replace('_', ' ')}:"]
+        lines.extend(f"- {fact['text']} (page {fact['page']}): \"{fact['context']}\"" for fact in facts)
+        return "\n".join(lines)
+
+    @classmethod
+    def answer_from_thread(cls, thread_id, user_query, gpt_obj=None):
+        """
+        Answer a follow-up from the facts persisted for `thread_id`, or return None.
+
+        Args:
+            thread_id (str): The thread of the conversation.
+            user_query (str): The follow-up question of the user.
+            gpt_obj (AzureOpenAIAssistant, optional): When given, the question and its answer are added to
+                the thread, so the later follow-ups answered by the LLM know about them.
+        """
+        facts = cls.load(thread_id)
+        answer = facts.answer(user_query) if facts else None
+        if answer:
+            BACKEND_LOGGER.info(f"Answered follow-up of thread {thread_id} from the extracted facts")
+            if gpt_obj is not None:
+                try:
+                    gpt_obj.add_message(
+                        thread_id=thread_id, content=FACT_ANSWER_CONTEXT.format(user_query=user_query, answer=answer))
+                except Exception as e:
+                    BACKEND_LOGGER.exception(
+                        f"Failed to add the answer from the facts to thread {thread_id}: {str(e)}")
+        return answer
+
+
+class ContractFactExtractor:
+    def __init__(self, nlp=None):
+        """
+        Initialize the extractor.
+
+        Args:
+            nlp (spacy.Language, optional): Defaults to the shared registry pipeline.
+        """
+        from spacy.matcher import Matcher
+
+        self.nlp = nlp or ResourceRegistry.get_spacy_model()
+        # Only the entity recognizer is needed, the rest of the pipeline is skipped in `nlp.pipe`.
+        self.disabled_pipes = [name for name in self.nlp.pipe_names if name not in ("tok2vec", "ner")]
+        self.matcher = Matcher(self.nlp.vocab)
+        unit = {"LOWER": {"REGEX": r"^(day|week|month|year)s?$"}}
+        number = {"LIKE_NUM": True}
+        self.matcher.add("DURATION", [
+            # "30 days", "30 calendar days"
+            [number, {"LOWER": {"IN": ["business", "calendar", "working"]}, "OP": "?"}, unit],
+            # "thirty (30) days"
+            [number, {"ORTH": "("}, number, {"ORTH": ")"},
+             {"LOWER": {"IN": ["business", "calendar", "working"]}, "OP": "?"}, unit],
+        ], greedy="LONGEST")
+
+    def extract(self, profile):
+        """
+        Extract the facts of a document.
+
+        Args:
+            profile (DocumentProfile): Profile of the document.
+
+        Returns:
+            ContractFacts: The facts in document order, without duplicates.
+        """
+        chunks = profile.chunks(FACT_PASSAGE_TOKENS)
+        sentence_ends = profile.sentence_spans[:, 1] if len(profile.sentence_spans) else np.empty(0, dtype=np.int64)
+        found = {kind: {} for kind in FACT_KINDS}
+
+        def add(kind, key, text, start_char):
+            if key in found[kind]:
+                return
+            sentence = int(np.searchsorted(sentence_ends, start_char, side="right"))
+            if sentence < len(profile.sentence_spans):
+                sentence_start, sentence_end = profile.sentence_spans[sentence]
+            else:
+                sentence_start, sentence_end = start_char, start_char + len(text)
+            context = " ".join(profile.text[sentence_start:sentence_end].split())
+            found[kind][key] = {
+                "text": " ".join(text.split()),
+                "value": key,
+                "page": profile.page_of(start_char) + 1,
+                "context": context[:CONTEXT_CHARS] + ("..." if len(context) > CONTEXT_CHARS else ""),
+            }
+
+        texts = (chunk.text for chunk in chunks)
+        for chunk, doc in zip(chunks, self.nlp.pipe(texts, disable=self.disabled_pipes)):
+            offset = chunk.start_char
+            for match in AMOUNT_PATTERN.finditer(chunk.text):
+                amount = self.parse_amount(match)
+                if amount:
+                    add("amounts", amount, match.group(0), offset + match.start())
+            for match in DATE_PATTERN.finditer(chunk.text):
+                add("dates", normalize_date(DATE_YEAR_COMMA_PATTERN.sub(r"\1, \2", match.group(0))),
+                    match.group(0), offset + match.start())
+            for match in PAYMENT_TERM_PATTERN.finditer(chunk.text):
+                add("payment_terms", " ".join(match.group(0).lower().split()), match.group(0),
+                    offset + match.start())
+            for _, start, end in self.matcher(doc):
+                span = doc[start:end]
+                days = self.parse_duration(span)
+                if days:
+                    add("durations", f"{days:g} days", span.text, offset + span.start_char)
+            # Spelled out amounts and dates ("ten thousand dollars", "the first day of March") come from the NER.
+            for entity in doc.ents:
+                if entity.label_ == "DATE" and any(character.isdigit() for character in entity.text) \
+                        and not DATE_PATTERN.search(entity.text):
+                    add("dates", entity.text.lower(), entity.text, offset + entity.start_char)
+                elif entity.label_ == "MONEY" and not AMOUNT_PATTERN.search(entity.text):
+                    add("amounts", entity.text.lower(), entity.text, offset + entity.start_char)
+
+        facts = ContractFacts(**{kind: list(values.values()) for kind, values in found.items()})
+        BACKEND_LOGGER.info(
+            "Extracted contract facts: " + ", ".join(f"{len(getattr(facts, kind))} {kind}" for kind in FACT_KINDS))
+        return facts
+
+    @classmethod
+    def parse_amount(cls, match):
+        if match.group("suffix_value"):
+            value, suffix = match.group("suffix_value"), match.group("suffix").lower()
+            currency = CURRENCY_WORDS.get(suffix, suffix.upper())
+        else:
+            value = match.group("value")
+            currency = CURRENCY_SYMBOLS.get(match.group("symbol")) or match.group("code").upper()
+            if match.group("scale"):
+                value = f"{value} {match.group('scale')}"
+        return normalize_amount({"value": value, "currency": currency})
+
+    @classmethod
+    def parse_duration(cls, span):
+        numbers = [parse_number(token.text) for token in span if token.like_num]
+        numbers = [number for number in numbers if number]
+        unit = span[-1].lower_.rstrip("s")
+        if not numbers or unit not in DURATION_UNIT_DAYS:
+            return None
+        return numbers[-1] * DURATION_UNIT_DAYS[unit]
+
+
+@lru_cache(maxsize=1)
+def get_fact_extractor():
+    return ContractFactExtractor()
+
+
+def extract_contract_facts(profile):
+    """
+    Extract the facts of a document with the shared extractor.
+
+    Extraction only enriches the prompts, so a failure is logged and no facts are returned.
+
+    Args:
+        profile (DocumentProfile): Profile of the document.
+
+    Returns:
+        ContractFacts: The extracted facts.
+    """
+    try:
+        return get_fact_extractor().extract(profile)
+    except Exception as e:
+        BACKEND_LOGGER.exception(f"Failed to extract contract facts: {str(e)}")
+        return ContractFacts()
@@ -0,0 +1,308 @@
+"""
+End-to-end load generator of the API.
+
+Virtual users drive the `contract/*` routes and the health check with a
+weighted mix of first-turn requests (PDF uploads, contract generation) and
+`thread_id` follow-ups on the threads opened earlier in the run. Requests go
+either to a running server (`--url`, e.g. one gunicorn configuration) or to
+the application in-process through the Django test client. The server must
+run with `LLM_CLIENT=stand-in` so that the Assistant calls hit the stand-in
+client (see backend.stand_in_llm) instead of Azure.
+
+The report gives, per route and overall, the throughput, p50/p95/p99
+latency, error and rejection (429) rates, and the worker saturation: the
+mean number of requests in flight in the server (from the `Server-Timing`
+total of every response, by Little's law) over its capacity.
+Run with `python manage.py loadtest`.
+"""
+
+import gzip
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from base.constants import (LOADTEST_DURATION_SECONDS,
+                            LOADTEST_FOLLOW_UP_RATIO, LOADTEST_REQUEST_TIMEOUT,
+                            LOADTEST_USERS)
+from base.enums import ContractType
+from backend.settings import BASE_DIR
+from backend.utils import UtilityFunctions
+
+LOADTEST_ROUTES = {
+    "health": "/",
+    "summarization": "/contract/summarization/",
+    "authoring": "/contract/authoring/",
+    "comparison": "/contract/comparison/",
+    "spend-analytics": "/contract/spend-analytics/",
+    "conversational": "/contract/conversational/",
+}
+DEFAULT_LOADTEST_MIX = {
+    "health": 1,
+    "summarization": 2,
+    "authoring": 1,
+    "comparison": 1,
+    "spend-analytics": 1,
+    "conversational": 2,
+}
+DEFAULT_LOADTEST_FIXTURE = os.path.join(BASE_DIR, "shared_contracts", "PB Quote for JCI (081219).pdf")
+LOADTEST_AUTHORING_PROMPT = ("A twelve month software maintenance agreement between Acme Corp and Globex Ltd, "
+                             "monthly fee of USD 10,000 payable within 30 days.")
+# Needs reasoning, so conversational follow-ups reach the LLM instead of being answered from the extracted facts
+LOADTEST_FOLLOW_UP_QUERY = "Explain the termination obligations of both parties."
+SERVER_TIMING_TOTAL = re.compile(r"(?:^|,)\s*total;dur=([\d.]+)")
+REJECTED_STATUS_CODE = 429
+
+
+def parse_mix(mix):
+    """
+    Parse a route mix like "summarization=2,health=1".
+
+    Returns:
+        dict: Weight of every route.
+
+    Raises:
+        ValueError: If a route is unknown or a weight is not a positive number.
+    """
+    weights = {}
+    for item in filter(None, (part.strip() for part in mix.split(","))):
+        route, _, weight = item.partition("=")
+        if route not in LOADTEST_ROUTES:
+            raise ValueError(f"Unknown route {route}, expected one of {', '.join(LOADTEST_ROUTES)}")
+        weights[route] = float(weight or 1)
+        if weights[route] <= 0:
+            raise ValueError(f"The weight of {route} must be positive")
+    return weights
+
+
+def percentile(sorted_values, fraction):
+    # Nearest rank percentile
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class HttpTransport:
+    """Sends the requests to a running server, accepting gzip responses like a browser."""
+
+    def __init__(self, base_url, timeout=LOADTEST_REQUEST_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def send(self, path, payload):
+        """
+        Returns:
+            tuple: Status code, Server-Timing header and response body.
+        """
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method="POST" if data else "GET",
+                                         headers={"Content-Type": "application/json", "Accept-Encoding": "gzip"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.headers.get("Server-Timing"), self.read(response)
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers.get("Server-Timing"), self.read(error)
+
+    @staticmethod
+    def read(response):
+        body = response.read()
+        if response.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return body
+
+
+class InProcessTransport:
+    """Sends the requests to the application of this process through the Django test client."""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def send(self, path, payload):
+        from django.test import Client
+
+        if not hasattr(self.local, "client"):
+            self.local.client = Client()
+        if payload is None:
+            response = self.local.client.get(path)
+        else:
+            response = self.local.client.post(path, data=json.dumps(payload), content_type="application/json")
+        return response.status_code, response.get("Server-Timing"), response.content
+
+
+class LoadTestResults:
+    def __init__(self):
+        self.samples = {route: [] for route in LOADTEST_ROUTES}
+        self.lock = threading.Lock()
+        self.started_at = None
+        self.finished_at = None
+
+    def add(self, route, turn, latency, status_code, server_seconds, error=None):
+        with self.lock:
+            self.samples[route].append({"turn": turn, "latency": latency, "status_code": status_code,
+                                        "server_seconds": server_seconds, "error": error})
+
+    def summarize(self, samples, wall_seconds, capacity=None):
+        latencies = sorted(sample["latency"] for sample in samples)
+        errors = sum(1 for sample in samples if sample["error"] or not 200 <= sample["status_code"] < 300)
+        rejected = sum(1 for sample in samples if sample["status_code"] == REJECTED_STATUS_CODE)
+        server_busy_seconds = sum(sample["server_seconds"] or 0 for sample in samples)
+        summary = {
+            "requests": len(samples),
+            "follow_ups": sum(1 for sample in samples if sample["turn"] == "follow_up"),
+            "throughput_rps": round(len(samples) / wall_seconds, 3) if wall_seconds else 0,
+            "p50_seconds": percentile(latencies, 0.5),
+            "p95_seconds": percentile(latencies, 0.95),
+            "p99_seconds": percentile(latencies, 0.99),
+            "error_rate": round(errors / len(samples), 4) if samples else 0,
+            "rejected_rate": round(rejected / len(samples), 4) if samples else 0,
+            # Little's law: mean requests in flight in the server
+            "server_in_flight": round(server_busy_seconds / wall_seconds, 3) if wall_seconds else 0,
+        }
+        if capacity:
+            summary["saturation"] = round(summary["server_in_flight"] / capacity, 3)
+        return summary
+
+    def report(self, capacity=None):
+        """
+        Returns:
+            dict: Summary of every route with requests and of the whole run.
+        """
+        wall_seconds = (self.finished_at or time.monotonic()) - self.started_at
+        routes = {route: self.summarize(samples, wall_seconds, capacity)
+                  for route, samples in self.samples.items() if samples}
+        every_sample = [sample for samples in self.samples.values() for sample in samples]
+        return {
+            "wall_seconds": round(wall_seconds, 3),
+            "overall": self.summarize(every_sample, wall_seconds, capacity),
+            "routes": routes,
+        }
+
+
+class LoadGenerator:
+    def __init__(self, transport, mix=None, users=LOADTEST_USERS, duration=LOADTEST_DURATION_SECONDS,
+                 follow_up_ratio=LOADTEST_FOLLOW_UP_RATIO, fixture_path=DEFAULT_LOADTEST_FIXTURE,
+                 think_seconds=0.0, seed=0, follow_up_query=LOADTEST_FOLLOW_UP_QUERY):
+        """
+        Initialize the generator.
+
+        Args:
+            transport (HttpTransport | InProcessTransport): Where the requests go.
+            mix (dict, optional): Weight of every route. Defaults to DEFAULT_LOADTEST_MIX.
+            users (int, optional): Concurrent virtual users, each sending its next request when the previous ends.
+            duration (float, optional): Seconds the users keep sending requests.
+            follow_up_ratio (float, optional): Share of the contract requests sent as thread follow-ups.
+            fixture_path (str, optional): PDF uploaded by the first-turn requests.
+            think_seconds (float, optional): Pause of a user between two requests.
+            seed (int, optional): Seed of the route and turn choices, for reproducible runs.
+            follow_up_query (str, optional): User query of the follow-ups.
+        """
+        self.transport = transport
+        self.mix = mix or DEFAULT_LOADTEST_MIX
+        self.users = users
+        self.duration = duration
+        self.follow_up_ratio = follow_up_ratio
+        self.think_seconds = think_seconds
+        self.seed = seed
+        self.follow_up_query = follow_up_query
+        self.contract_pdf = UtilityFunctions.pdf_to_base64(fixture_path)
+        if not self.contract_pdf:
+            raise ValueError(f"Could not read the load test fixture {fixture_path}")
+        self.threads = {route: [] for route in LOADTEST_ROUTES}
+        self.threads_lock = threading.Lock()
+
+    def first_turn_payload(self, route):
+        if route == "health":
+            return None
+        if route == "authoring":
+            return {"contract_type": ContractType.CUSTOM.value, "user_prompt": LOADTEST_AUTHORING_PROMPT}
+        if route == "comparison":
+            return {"contract_pdf": self.contract_pdf, "master_contract_id": "sap"}
+        return {"contract_pdf": self.contract_pdf}
+
+    def next_request(self, rng):
+        """
+        Pick the route and turn of the next request.
+
+        Returns:
+            tuple: The route, "first" or "follow_up", and the payload.
+        """
+        route = rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        if route != "health" and rng.random() < self.follow_up_ratio:
+            with self.threads_lock:
+                thread_id = rng.choice(self.threads[route]) if self.threads[route] else None
+            if thread_id:
+                return route, "follow_up", {"thread_id": thread_id, "user_query": self.follow_up_query}
+        return route, "first", self.first_turn_payload(route)
+
+    def send(self, route, turn, payload, results):
+        """
+        Send one request and record it.
+
+        Returns:
+            float: Seconds the server asked to wait before retrying (429), else 0.
+        """
+        start_time = time.perf_counter()
+        status_code, server_timing, error, retry_after = 0, None, None, 0
+        try:
+            status_code, server_timing, body = self.transport.send(LOADTEST_ROUTES[route], payload)
+            if turn == "first" and 200 <= status_code < 300 and route != "health":
+                thread_id = (json.loads(body).get("data") or {}).get("thread_id")
+                if thread_id:
+                    with self.threads_lock:
+                        self.threads[route].append(thread_id)
+            elif status_code == REJECTED_STATUS_CODE:
+                retry_after = float((json.loads(body).get("data") or {}).get("retry_after") or 0)
+        except Exception as e:
+            error = str(e)
+        latency = time.perf_counter() - start_time
+
+        match = SERVER_TIMING_TOTAL.search(server_timing or "")
+        server_seconds = float(match.group(1)) / 1000 if match else None
+        results.add(route, turn, latency, status_code, server_seconds, error)
+        return retry_after
+
+    def user(self, index, deadline, results):
+        rng = random.Random(self.seed * 1000 + index)
+        while time.monotonic() < deadline:
+            # Like a well behaved client, a rejected user waits for the Retry-After of the server.
+            pause = max(self.send(*self.next_request(rng), results), self.think_seconds)
+            if pause:
+                time.sleep(min(pause, max(deadline - time.monotonic(), 0)))
+
+    def run(self):
+        """
+        Run the load test.
+
+        Returns:
+            LoadTestResults: Every request sent.
+        """
+        results = LoadTestResults()
+        results.started_at = time.monotonic()
+        deadline = results.started_at + self.duration
+        with ThreadPoolExecutor(max_workers=self.users) as executor:
+            list(executor.map(lambda index: self.user(index, deadline, results), range(self.users)))
+        results.finished_at = time.monotonic()
+        return results
+
+
+def check_slo(report, max_p95_seconds=None, max_error_rate=None):
+    """
+    Check the routes of a report against latency and error objectives.
+
+    Returns:
+        list[str]: One message per violated objective.
+    """
+    violations = []
+    for route, summary in report["routes"].items():
+        if max_p95_seconds is not None and summary["p95_seconds"] is not None \
+                and summary["p95_seconds"] > max_p95_seconds:
+            violations.append(f"{route}: p95 {summary['p95_seconds']:.3f}s above {max_p95_seconds}s")
+        if max_error_rate is not None and summary["error_rate"] > max_error_rate:
+            violations.append(f"{route}: error rate {summary['error_rate']:.2%} above {max_error_rate:.2%}")
+    return violations
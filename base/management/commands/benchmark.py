@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from base.benchmarks import (BENCHMARK_BASELINE_PATH, BENCHMARK_CASES,
+                             BenchmarkError, BenchmarkSuite, find_regressions,
+                             load_baseline, save_baseline)
+from base.constants import BENCHMARK_REGRESSION_THRESHOLD, BENCHMARK_REPEAT
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the document processing hot paths on the PDF fixtures and compare them with the stored "
+            "baseline.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--case", action="append", choices=sorted(BENCHMARK_CASES),
+                            help="Case to run, repeatable. Defaults to every case.")
+        parser.add_argument("--fixture", help="Only run the fixtures whose file name contains this text.")
+        parser.add_argument("--repeat", type=int, default=BENCHMARK_REPEAT, help="Timed repetitions of every case.")
+        parser.add_argument("--baseline", default=BENCHMARK_BASELINE_PATH, help="Path of the JSON baseline.")
+        parser.add_argument("--save-baseline", action="store_true",
+                            help="Store the results as the new baseline instead of comparing them.")
+        parser.add_argument("--threshold", type=float, default=BENCHMARK_REGRESSION_THRESHOLD,
+                            help="Tolerated relative regression, e.g. 0.2 for 20%%.")
+
+    def handle(self, *args, **options):
+        try:
+            suite = BenchmarkSuite(options["repeat"], options["case"], options["fixture"])
+        except BenchmarkError as e:
+            raise CommandError(str(e))
+
+        results = suite.run(progress=self.write_result)
+        if not results:
+            raise CommandError("No fixture matched.")
+
+        if options["save_baseline"]:
+            save_baseline(results, options["baseline"])
+            self.stdout.write(f"Baseline saved to {options['baseline']}")
+            return
+
+        baseline = load_baseline(options["baseline"])
+        if baseline is None:
+            self.stdout.write(f"No baseline at {options['baseline']}, run with --save-baseline to store one.")
+            return
+
+        regressions = find_regressions(results, baseline, options["threshold"])
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(regression)
+            raise CommandError(f"{len(regressions)} benchmark regressions beyond {options['threshold']:.0%}.")
+        self.stdout.write("No regression against the baseline.")
+
+    def write_result(self, key, result):
+        if "error" in result:
+            self.stdout.write(f"{key}: failed ({result['error']})")
+        else:
+            self.stdout.write(f"{key}: {result['seconds'] * 1000:.2f} ms "
+                              f"(min {result['min_seconds'] * 1000:.2f} ms), "
+                              f"peak {result['peak_memory_bytes'] / 1024:.0f} KiB")
@@ -0,0 +1,92 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.constants import (LOADTEST_DURATION_SECONDS,
+                            LOADTEST_FOLLOW_UP_RATIO, LOADTEST_REQUEST_TIMEOUT,
+                            LOADTEST_USERS)
+from base.loadtest import (DEFAULT_LOADTEST_FIXTURE, LOADTEST_FOLLOW_UP_QUERY,
+                           HttpTransport, InProcessTransport, LoadGenerator,
+                           check_slo, parse_mix)
+from backend.stand_in_llm import STAND_IN_LLM_CLIENT
+
+
+class Command(BaseCommand):
+    help = ("Drive the API with a mix of first-turn and follow-up requests against the stand-in LLM and report "
+            "throughput, latency percentiles, error rates and worker saturation.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", help="Base URL of a running server started with LLM_CLIENT=stand-in. "
+                                          "Defaults to the application of this process.")
+        parser.add_argument("--users", type=int, default=LOADTEST_USERS, help="Concurrent virtual users.")
+        parser.add_argument("--duration", type=float, default=LOADTEST_DURATION_SECONDS,
+                            help="Seconds the users keep sending requests.")
+        parser.add_argument("--mix", help='Route weights, e.g. "summarization=2,authoring=1,health=1".')
+        parser.add_argument("--follow-up-ratio", type=float, default=LOADTEST_FOLLOW_UP_RATIO,
+                            help="Share of the contract requests sent as thread follow-ups.")
+        parser.add_argument("--follow-up-query", default=LOADTEST_FOLLOW_UP_QUERY,
+                            help="User query of the follow-ups. Lookups of amounts or dates are answered without the "
+                                 "LLM on the conversational route.")
+        parser.add_argument("--fixture", default=DEFAULT_LOADTEST_FIXTURE, help="PDF uploaded by first turns.")
+        parser.add_argument("--think", type=float, default=0.0, help="Pause of a user between two requests.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the request choices.")
+        parser.add_argument("--timeout", type=float, default=LOADTEST_REQUEST_TIMEOUT,
+                            help="Client timeout of a request in seconds.")
+        parser.add_argument("--capacity", type=int,
+                            help="Requests the server can serve at once (workers x threads), for the saturation.")
+        parser.add_argument("--label", default="", help="Name of the tested configuration, e.g. gthread-3x8.")
+        parser.add_argument("--output", help="Append the JSON report to this file.")
+        parser.add_argument("--slo-p95", type=float, help="Fail when the p95 latency of a route exceeds it.")
+        parser.add_argument("--max-error-rate", type=float, help="Fail when the error rate of a route exceeds it.")
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options["mix"]) if options["mix"] else None
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options["url"]:
+            transport = HttpTransport(options["url"], options["timeout"])
+        else:
+            os.environ["LLM_CLIENT"] = STAND_IN_LLM_CLIENT
+            transport = InProcessTransport()
+
+        try:
+            generator = LoadGenerator(transport, mix, options["users"], options["duration"],
+                                      options["follow_up_ratio"], options["fixture"], options["think"],
+                                      options["seed"], options["follow_up_query"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"Running {options['users']} users for {options['duration']}s "
+                          f"against {options['url'] or 'the in-process application'}")
+        report = generator.run().report(options["capacity"])
+        report["label"] = options["label"]
+        self.write_report(report)
+
+        if options["output"]:
+            with open(options["output"], "a", encoding="utf-8") as output_file:
+                output_file.write(json.dumps(report) + "\n")
+
+        violations = check_slo(report, options["slo_p95"], options["max_error_rate"])
+        if violations:
+            for violation in violations:
+                self.stderr.write(violation)
+            raise CommandError(f"{len(violations)} service level objectives violated.")
+
+    def write_report(self, report):
+        self.stdout.write(f"{'route':<18}{'requests':>9}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}"
+                          f"{'errors':>8}{'429':>7}{'in flight':>10}{'saturation':>11}")
+        rows = list(report["routes"].items()) + [("overall", report["overall"])]
+        for route, summary in rows:
+            self.stdout.write(
+                f"{route:<18}{summary['requests']:>9}{summary['throughput_rps']:>8.2f}"
+                f"{self.seconds(summary['p50_seconds']):>9}{self.seconds(summary['p95_seconds']):>9}"
+                f"{self.seconds(summary['p99_seconds']):>9}{summary['error_rate']:>8.1%}"
+                f"{summary['rejected_rate']:>7.1%}{summary['server_in_flight']:>10.2f}"
+                f"{summary['saturation'] if 'saturation' in summary else '-':>11}")
+
+    @staticmethod
+    def seconds(value):
+        return "-" if value is None else f"{value:.2f}s"
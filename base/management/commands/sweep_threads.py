@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from backend.constants import THREAD_RETENTION_DAYS
+from backend.thread_store import ThreadStore
+
+
+class Command(BaseCommand):
+    help = "Delete the stored artifacts of the threads untouched for the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=float, default=THREAD_RETENTION_DAYS,
+                            help="Retention period in days since the last write of a thread.")
+
+    def handle(self, *args, **options):
+        deleted = ThreadStore.sweep(options["days"])
+        self.stdout.write(f"Deleted {len(deleted)} threads older than {options['days']:g} days.")
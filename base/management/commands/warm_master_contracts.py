@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from base.master_contracts import MasterContractRegistry
+
+
+class Command(BaseCommand):
+    help = "Extract and persist the standards of every registered master contract."
+
+    def handle(self, *args, **options):
+        status = MasterContractRegistry.warm_up()
+        for master_contract_id, ready in status.items():
+            self.stdout.write(f"{master_contract_id}: {'ready' if ready else 'failed'}")
+        if not all(status.values()):
+            raise CommandError("Some master contracts could not be warmed up.")
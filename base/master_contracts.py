@@ -0,0 +1,146 @@
+"""
+Registry of the master contracts used by the standard comparison.
+
+Master contracts live in `data/hardcode_contracts` and are referenced by their
+HardCodedContract member. Their extracted standards are computed once, kept in
+memory and persisted under `data/master_standards` keyed by the SHA-256 of the
+PDF, so replacing a master PDF invalidates its standards automatically.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+from base import BACKEND_LOGGER
+from base.constants import DATA_FOLDER_PATH, MAX_TOKEN
+from base.enums import HardCodedContract
+from backend.utils import CustomValidation, UtilityFunctions
+
+MASTER_CONTRACTS_FOLDER_PATH = os.path.join(DATA_FOLDER_PATH, "hardcode_contracts")
+MASTER_STANDARDS_FOLDER_PATH = os.path.join(DATA_FOLDER_PATH, "master_standards")
+# Bumped whenever the shape of the persisted standards changes
+MASTER_STANDARDS_FORMAT = 2
+
+
+class MasterContractRegistry:
+    _standards = {}
+    _locks = {}
+    _registry_lock = threading.Lock()
+
+    @classmethod
+    def get_master_path(cls, master_contract_id):
+        """
+        Return the PDF path of a master contract.
+
+        Raises:
+            CustomValidation: If the id is not a HardCodedContract member or its PDF is missing.
+        """
+        try:
+            filename = HardCodedContract.get_member_value(master_contract_id)
+        except KeyError:
+            raise CustomValidation(f"Unknown master contract: {master_contract_id}", status_code=400)
+
+        pdf_path = os.path.join(MASTER_CONTRACTS_FOLDER_PATH, filename)
+        if not os.path.exists(pdf_path):
+            raise CustomValidation(f"Master contract file is missing for: {master_contract_id}")
+        return pdf_path
+
+    @classmethod
+    def get_file_hash(cls, pdf_path):
+        sha256 = hashlib.sha256()
+        with open(pdf_path, "rb") as pdf_file:
+            for block in iter(lambda: pdf_file.read(1024 * 1024), b""):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    @classmethod
+    def _get_lock(cls, key):
+        with cls._registry_lock:
+            return cls._locks.setdefault(key, threading.Lock())
+
+    @classmethod
+    def _load_persisted(cls, file_hash):
+        try:
+            with open(os.path.join(MASTER_STANDARDS_FOLDER_PATH, f"{file_hash}.json"), encoding="utf-8") as file:
+                persisted = json.load(file)
+        except FileNotFoundError:
+            return None
+        if persisted.get("format") != MASTER_STANDARDS_FORMAT:
+            return None
+        return persisted["standards"]
+
+    @classmethod
+    def _persist(cls, file_hash, master_contract_id, pdf_path, standards):
+        os.makedirs(MASTER_STANDARDS_FOLDER_PATH, exist_ok=True)
+        path = os.path.join(MASTER_STANDARDS_FOLDER_PATH, f"{file_hash}.json")
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({
+                "format": MASTER_STANDARDS_FORMAT,
+                "master_contract_id": master_contract_id,
+                "filename": os.path.basename(pdf_path),
+                "sha256": file_hash,
+                "created_at": datetime.now().isoformat(),
+                "standards": standards,
+            }, file)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def extract_standards(cls, pdf_path):
+        """
+        Run the comparison engine extraction on a master contract, in a thread of its own.
+        """
+        from base.utils import ContractStandardComparisonEngine
+
+        profile = UtilityFunctions.get_pdf_profile(pdf_path)
+        return ContractStandardComparisonEngine().extract_contract_deatils(
+            profile.chunks(max_tokens=MAX_TOKEN))
+
+    @classmethod
+    def get_standards(cls, master_contract_id):
+        """
+        Return the extracted standards of a master contract, computing and persisting them on first use.
+
+        Args:
+            master_contract_id (str): Name of a HardCodedContract member.
+
+        Returns:
+            dict: The extracted clauses merged per category.
+        """
+        pdf_path = cls.get_master_path(master_contract_id)
+        file_hash = cls.get_file_hash(pdf_path)
+
+        standards = cls._standards.get(file_hash)
+        if standards is not None:
+            return standards
+
+        with cls._get_lock(file_hash):
+            if file_hash not in cls._standards:
+                standards = cls._load_persisted(file_hash)
+                if standards is None:
+                    BACKEND_LOGGER.info(f"Extracting standards of master contract {master_contract_id}")
+                    standards = cls.extract_standards(pdf_path)
+                    cls._persist(file_hash, master_contract_id, pdf_path, standards)
+                cls._standards[file_hash] = standards
+            return cls._standards[file_hash]
+
+    @classmethod
+    def warm_up(cls):
+        """
+        Load or compute the standards of every registered master contract.
+
+        Returns:
+            dict: Whether the standards of every master contract are available.
+        """
+        status = {}
+        for master_contract_id in HardCodedContract.name_list():
+            try:
+                cls.get_standards(master_contract_id)
+                status[master_contract_id] = True
+            except Exception as e:
+                BACKEND_LOGGER.exception(
+                    f"Failed to warm up master contract {master_contract_id}: {str(e)}")
+                status[master_contract_id] = False
+        return status
@@ -197,47 +197,213 @@ Mistakes during manual data entry processes, such as miskeying numbers or overlo
       underbilling or missed revenue."""
 
 
-CONTRACT_INFO_EXTRACTION = """
-As an intelligent assistant, your task is to extract detailed information related to the specified PARAMETERS from \
-    the provided CONTRACT TEXT. Ensure that your extraction is as comprehensive as possible for each parameter.
+CONTRACT_CONVERSATION_OVERVIEW = """
+Analyse the passed contract and be ready to answer user queries about it. The contract is too long to be shared at \
+    once, so only its opening passages are included below. The passages of the contract most relevant to each \
+        following user query will be attached to that query.
+
+CONTRACT PASSAGES:
+{passages}
+"""
+
+
+CONTRACT_RETRIEVAL_QUERY = """
+Answer the USER QUERY based on the contract. The CONTRACT PASSAGES below are the parts of the contract most relevant \
+    to the query.
+
+CONTRACT PASSAGES:
+{passages}
+
+USER QUERY:
+{user_query}
+"""
+
+
+CONTRACT_PARAMETERS = [
+    "Payment Amount", "Payment Schedule", "Incentives and Penalties", "Price Adjustment Clauses", "Scope of Work",
+    "Deliverables", "Quality Standards", "Contract Duration", "Termination Clauses", "Renewal Terms",
+    "Roles and Responsibilities", "Compliance Requirements", "Reporting and Monitoring", "Liability Clauses",
+    "Insurance Requirements", "Force Majeure", "Governing Law", "Arbitration and Mediation", "Litigation",
+    "Confidentiality Clauses", "Intellectual Property Rights", "Amendment Procedures", "Flexibility",
+    "Key Performance Indicators", "Service Level Agreements", "Subcontracting", "Third-Party Approvals",
+]
+
+
+CONTRACT_CLAUSE_EXTRACTION = """
+As an intelligent assistant, your task is to extract the clauses related to the specified PARAMETERS from the \
+    provided CONTRACT TEXT as structured records.
 
 CONTRACT TEXT:
 {contract_chuncked_text}
 
 PARAMETERS:
+{parameters}
+
+Important Instructions:
+
+- Respond with a JSON array only, without any explanation or markdown.
+- Each element must be an object of the form:
+  {{"category": "<one of the PARAMETERS>", "values": ["<short statement of a term>"], \
+"dates": ["<YYYY-MM-DD>"], "amounts": [{{"value": <number>, "currency": "<ISO 4217 code or null>"}}]}}
+- Keep every value a short, self contained statement of a single term of the contract.
+- Only include PARAMETERS that are present in the CONTRACT TEXT, use an empty list for missing dates or amounts.
+"""
+
+
+CLAUSE_DIFF_NARRATION = """
+A contract was compared clause by clause with the master contract standards. The DIFFERENCES below were \
+    computed from the clauses extracted from both; "contract" refers to the reviewed contract and "master" to the \
+        master contract. Explain the differences and their business impact clearly and concisely, category by \
+            category. Do not add differences that are not listed.
+
+MATCHING CATEGORIES:
+{matching_categories}
+
+DIFFERENCES:
+{differences}
+"""
+
+
+CLAUSE_COMPARISON_CONTEXT = """
+These are the clauses extracted from the reviewed contract and from the master contract, rely on them for the \
+    follow-up questions of the user about the comparison.
+
+CONTRACT CLAUSES:
+{contract_clauses}
+
+MASTER CLAUSES:
+{master_clauses}
+"""
+
+
+CONTRACT_TEMPLATE_FILL = """
+Based on the provided input: {user_prompt}, fill in a contract agreement.
+
+The contract document is rendered from a fixed template, you only provide the values of its FIELDS. Each field is \
+    listed with the blank it replaces in the template.
+
+FIELDS:
+{fields}
+
+Important Instructions:
+
+- Respond with a JSON object only, without any explanation or markdown, of the form:
+  {{"fields": {{"<field name>": "<value>"}}, "scope_of_work": "<services/products provided>", \
+"custom_clauses": [{{"title": "<clause title>", "text": "<clause text>"}}]}}
+- Leave out the fields the input gives no value for.
+- Use custom_clauses only for terms of the input that the template does not already cover.
+"""
+
+
+CONTRACT_DRAFT_CONTEXT = """
+This is the current contract draft. Apply the following requests of the user to this draft and answer with the \
+    updated contract.
+
+CONTRACT DRAFT:
+{contract}
+"""
+
+
+# Outline used when the planned outline can not be parsed, following CONTRACT_TEMPLATE
+DEFAULT_CONTRACT_SECTIONS = [
+    "Parties", "Scope of Work", "Term", "Payment", "Confidentiality", "Termination", "Indemnification",
+    "Governing Law", "Entire Agreement", "Amendments", "Signatures"
+]
+
+
+CONTRACT_SECTION_OUTLINE = """
+Based on the provided input: {user_prompt}, plan the outline of a contract agreement.
 
-1. Payment Amount
-2. Payment Schedule
-3. Incentives and Penalties
-4. Price Adjustment Clauses
-5. Scope of Work
-6. Deliverables
-7. Quality Standards
-8. Contract Duration
-9. Termination Clauses
-10. Renewal Terms
-11. Roles and Responsibilities
-12. Compliance Requirements
-13. Reporting and Monitoring
-14. Liability Clauses
-15. Insurance Requirements
-16. Force Majeure
-17. Governing Law
-18. Arbitration and Mediation
-19. Litigation
-20. Confidentiality Clauses
-21. Intellectual Property Rights
-22. Amendment Procedures
-23. Flexibility
-24. Key Performance Indicators
-25. Service Level Agreements
-26. Subcontracting
-27. Third-Party Approvals
+Use the following template as a structure example, adding or removing sections as the input requires:
+{contract_template}
 
 Important Instructions:
 
-- Only include details from the CONTRACT TEXT that are directly related to the PARAMETERS listed above.
-- Do not include any information unrelated to the PARAMETERS.
-- If a parameter's details are not present in the CONTRACT TEXT, do not include that parameter in generated response \
-    for that parameter.
+- Respond with a JSON object only, without any explanation or markdown, of the form:
+  {{"title": "<contract title>", "sections": [{{"title": "<section title>", "brief": "<what the section covers>"}}]}}
+- List the sections in the order they appear in the contract, with at most {max_sections} sections.
 """
+
+
+CONTRACT_SECTION_GENERATION = """
+Based on the provided input: {user_prompt}, a contract agreement titled "{contract_title}" is being written section \
+    by section.
+
+OUTLINE:
+{outline}
+
+Write only the section "{section_title}" of the contract. It covers: {section_brief}
+
+Important Instructions:
+
+- Start with the section title and do not write any other section of the outline.
+- Use [Placeholder] blanks for any value the input does not provide.
+- Respond with the section text only, without any explanation.
+"""
+
+
+CONTRACT_FACTS_CONTEXT = """
+KEY FACTS extracted from the contract (amounts, dates, durations and payment terms), rely on them for these \
+    details:
+{facts}
+"""
+
+
+TABLE_FORMAT_NOTE = """
+Tables of the contract are given as CSV between [TABLE] and [/TABLE], the first row holding the column headers.
+"""
+
+
+SUMMARY_REDUCE = """
+The following are summaries of consecutive parts of one contract, in order. Combine them into a single clear and \
+    concise summary of the contract of at most {max_words} words.
+
+Important Instructions:
+
+- Remove repetitions between the parts.
+- Keep the parties, important dates, payment details and contract details.
+- Respond with the summary only.
+
+PART SUMMARIES:
+{parts}
+"""
+
+
+REVENUE_LEAKAGE_REDUCE = """
+The following are the potential revenue leakages identified in consecutive parts of one contract, in order. Combine \
+    them into a single report of at most {max_words} words.
+
+Important Instructions:
+
+- Merge the leakages reported more than once and drop the parts reporting none.
+- Keep the amounts, dates and clauses every leakage refers to.
+- Respond with the report only.
+
+PARTIAL REPORTS:
+{parts}
+"""
+
+
+FACT_ANSWER_CONTEXT = """
+The user asked: {user_query}
+It was answered from the facts extracted from the contract:
+{answer}
+"""
+
+
+CONTRACT_RESULT_CONTEXT = """
+This is the {task} of a contract. Answer the following questions of the user based on it.
+
+{result}
+"""
+
+
+CHUNK_SUMMARY = "Provide a clear and concise summary of the following text: {chunk}"
+
+
+CONTRACT_SUMMARY = """Provide clear and concise summary of {contract_text} explaining the important dates, \
+    payment details and contract details"""
+
+
+REVENUE_LEAKAGE_CHUNK = """Identify the potential revenue leakages in the {chunk} by referring to \
+    the {revenue_leakage_points}"""
@@ -0,0 +1,149 @@
+"""
+Local financial relevance scoring of contract chunks.
+
+Spend analytics only needs the chunks talking about money. Chunks are scored
+against term weights derived from the REVENUE_LEAKAGE_POINTS categories plus
+currency, amount, penalty and payment term patterns, and only chunks whose
+weighted hit density reaches a threshold are sent to the LLM.
+"""
+
+import re
+
+import numpy as np
+
+from base.constants import SPEND_RELEVANCE_THRESHOLD
+from base.prompts import REVENUE_LEAKAGE_POINTS
+
+WORD_PATTERN = re.compile(r"[a-z]+")
+SUFFIXES = ("ations", "ation", "ables", "able", "ings", "ing", "ies", "ed", "es", "s", "e")
+
+# Words of the revenue leakage descriptions that carry no financial meaning.
+GENERIC_WORDS = {
+    "about", "access", "after", "apply", "applying", "beyond", "between", "business", "businesses", "causing",
+    "communication", "continuing", "contract", "customer", "data", "delays", "details", "during", "entered",
+    "entry", "error", "errors", "especially", "failure", "immediate", "incompatibility", "incomplete",
+    "incorrect", "incorrectly", "information", "integration", "intended", "lack", "leading", "manual",
+    "manually", "missed", "miskeying", "mistakes", "number", "numbers", "offering", "omission", "opportunities",
+    "oriented", "outdated", "overlooking", "period", "policy", "policies", "poor", "prevalent", "processes",
+    "records", "reduced", "rendered", "resulting", "sales", "salespeople", "service", "services", "silos",
+    "spreadsheet", "staff", "such", "systems", "their", "through", "time", "tracking", "unclear",
+    "unnecessary", "violations", "with",
+}
+# Contract vocabulary that signals financial content, on top of the leakage categories. The words are
+# stemmed when the vocabulary is built, variants `stem` does not bring together are listed separately.
+FINANCIAL_TERMS = {
+    "amount": 2.0, "bill": 2.0, "charge": 2.0, "compensate": 1.5, "compensation": 1.5, "cost": 2.0,
+    "credit": 1.5, "discount": 3.0, "expense": 1.5, "fee": 3.0, "installment": 2.0, "instalment": 2.0,
+    "interest": 1.5, "invoice": 3.0, "liquidated": 3.0, "pay": 2.0, "payment": 3.0, "penalty": 3.0,
+    "price": 3.0, "rate": 2.0, "rebate": 3.0, "refund": 2.5, "reimburse": 2.5, "reimbursement": 2.5,
+    "remuneration": 2.5, "tax": 1.5, "total": 1.0,
+}
+
+# (pattern, weight) pairs counted on the raw chunk text.
+FINANCIAL_PATTERNS = (
+    (re.compile(r"[$€£₹¥]\s?\d"), 4.0),
+    (re.compile(r"\b(?:USD|EUR|GBP|INR|JPY|AUD|CAD|CHF)\b"), 3.0),
+    (re.compile(r"\b\d{1,3}(?:,\d{3})+(?:\.\d+)?\b|\b\d+(?:\.\d+)?\s?(?:million|thousand|mn|bn|k)\b", re.I), 2.0),
+    (re.compile(r"\b\d+(?:\.\d+)?\s?(?:%|percent)", re.I), 2.0),
+    (re.compile(r"\b(?:penalt(?:y|ies)|liquidated damages|late (?:fee|payment|charge)s?|service credits?)\b", re.I),
+     3.0),
+    (re.compile(r"\b(?:net\s?\d{1,3}|within \d{1,3} (?:calendar |business )?days|upon (?:receipt|signing|"
+                r"completion)|in advance|per (?:hour|day|month|annum|year))\b", re.I), 3.0),
+)
+
+
+def stem(word):
+    """
+    Crude suffix stripping so that invoice / invoiced / invoicing share a stem.
+    """
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+class FinancialRelevanceScorer:
+    def __init__(self, term_weights, patterns=FINANCIAL_PATTERNS, threshold=SPEND_RELEVANCE_THRESHOLD):
+        """
+        Initialize the scorer.
+
+        Args:
+            term_weights (dict): Weight of every word stem.
+            patterns (tuple, optional): (compiled regex, weight) pairs. Defaults to FINANCIAL_PATTERNS.
+            threshold (float, optional): Minimum weighted hits per 100 words for a chunk to be kept.
+        """
+        self.vocabulary = {term: index for index, term in enumerate(term_weights)}
+        self.term_weights = np.fromiter(term_weights.values(), dtype=np.float64, count=len(term_weights))
+        self.patterns = [pattern for pattern, _ in patterns]
+        self.pattern_weights = np.asarray([weight for _, weight in patterns], dtype=np.float64)
+        self.threshold = threshold
+
+    @classmethod
+    def from_revenue_leakage_points(cls, leakage_points=REVENUE_LEAKAGE_POINTS, **kwargs):
+        """
+        Derive term weights from the leakage categories: heading words weigh more than description words.
+        """
+        term_weights = {}
+        blocks = leakage_points.strip().split(":\n")
+        for block_index, block in enumerate(blocks):
+            lines = [line for line in block.strip().splitlines() if line.strip()]
+            # Every block but the last ends with the heading of the next category.
+            heading = lines.pop() if lines and block_index < len(blocks) - 1 else ""
+            for weight, text in ((0.5, " ".join(lines)), (1.0, heading)):
+                for word in WORD_PATTERN.findall(text.lower()):
+                    term = stem(word)
+                    if len(word) > 3 and term not in GENERIC_WORDS and word not in GENERIC_WORDS:
+                        term_weights[term] = max(term_weights.get(term, 0.0), weight)
+
+        for word, weight in FINANCIAL_TERMS.items():
+            term = stem(word)
+            term_weights[term] = max(term_weights.get(term, 0.0), weight)
+        return cls(term_weights, **kwargs)
+
+    def score(self, chunks):
+        """
+        Score every chunk by its weighted financial term and pattern hits per 100 words.
+
+        Args:
+            chunks (list[str]): The chunk texts.
+
+        Returns:
+            numpy.ndarray: One score per chunk.
+        """
+        chunk_count = len(chunks)
+        if not chunk_count:
+            return np.zeros(0)
+
+        term_ids, chunk_ids = [], []
+        word_counts = np.zeros(chunk_count)
+        for chunk_index, chunk in enumerate(chunks):
+            words = WORD_PATTERN.findall(chunk.lower())
+            word_counts[chunk_index] = len(words)
+            ids = [self.vocabulary.get(stem(word), -1) for word in words]
+            ids = [term_id for term_id in ids if term_id >= 0]
+            term_ids.extend(ids)
+            chunk_ids.extend([chunk_index] * len(ids))
+
+        term_scores = np.bincount(np.asarray(chunk_ids, dtype=np.int64),
+                                  weights=self.term_weights[np.asarray(term_ids, dtype=np.int64)],
+                                  minlength=chunk_count)
+        pattern_hits = np.asarray([[len(pattern.findall(chunk)) for pattern in self.patterns] for chunk in chunks],
+                                  dtype=np.float64)
+        return (term_scores + pattern_hits @ self.pattern_weights) * 100 / np.maximum(word_counts, 1)
+
+    def select(self, chunks):
+        """
+        Return the indices of the chunks worth sending to the LLM, in document order.
+
+        The best scoring chunk is always kept so that a contract never ends up without analysis.
+        """
+        scores = self.score(chunks)
+        if not len(scores):
+            return []
+        selected = np.flatnonzero(scores >= self.threshold)
+        if not len(selected):
+            selected = np.asarray([int(np.argmax(scores))])
+        return selected.tolist()
+
+
+FINANCIAL_RELEVANCE_SCORER = FinancialRelevanceScorer.from_revenue_leakage_points()
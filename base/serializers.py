@@ -7,7 +7,7 @@ from drf_extra_fields.fields import Base64FileField
 from rest_framework import serializers
 
 from base import BACKEND_LOGGER
-from base.enums import ContractType
+from base.enums import ContractType, HardCodedContract
 
 
 class PDFBase64File(Base64FileField):
@@ -63,12 +63,15 @@ class ContractStandardComparisonSerializer(serializers.Serializer):
     user_query = serializers.CharField(required=False)
     contract_pdf = PDFBase64File(required=False)
     master_contract_pdf = PDFBase64File(required=False)
+    master_contract_id = serializers.ChoiceField(
+        choices=tuple(HardCodedContract.name_list()), required=False)
 
     def validate(self, data):
         thread_id = data.get('thread_id')
         user_query = data.get('user_query')
         contract_pdf = data.get('contract_pdf')
         master_contract_pdf = data.get('master_contract_pdf')
+        master_contract_id = data.get('master_contract_id')
 
         # Case 1: thread_id and user_query must be provided together
         if thread_id is not None and user_query is None:
@@ -79,10 +82,14 @@ class ContractStandardComparisonSerializer(serializers.Serializer):
             raise serializers.ValidationError(
                 "If user_query is provided, thread_id must also be provided.")
 
-        # Case 2: contract_pdf must be provided
-        if (not thread_id or not user_query) and (not contract_pdf or not master_contract_pdf):
+        # Case 2: contract_pdf and a master contract (pdf or registered id) must be provided
+        if (not thread_id or not user_query) and (not contract_pdf or not (master_contract_pdf or master_contract_id)):
+            raise serializers.ValidationError(
+                "Both thread_id and user_query is required when contract_pdf or master contract is not provided.")
+
+        if master_contract_pdf and master_contract_id:
             raise serializers.ValidationError(
-                "Both thread_id and user_query is required when contract_pdf or master_contract_pdf is not provided.")
+                "Provide either master_contract_pdf or master_contract_id, not both.")
 
         return data
 
@@ -108,13 +115,13 @@ class ContractAuthoringSerializer(serializers.Serializer):
             raise serializers.ValidationError(
                 "If user_query is provided, thread_id must also be provided.")
 
-        # Case 2: contract_type must be provided, and if it's Custom, user_prompt must be provided
+        # Case 2: contract_type must be provided, along with the user_prompt it is generated from
         if (thread_id is None or user_query is None) and contract_type is None:
             raise serializers.ValidationError("contract_type is required.")
 
-        elif contract_type == ContractType.CUSTOM.value and user_prompt is None:
+        elif contract_type in ContractType.value_list() and user_prompt is None:
             raise serializers.ValidationError(
-                "If contract_type is Custom, user_prompt must be provided.")
+                f"If contract_type is {contract_type}, user_prompt must be provided.")
 
         return data
 
@@ -1,3 +1,1091 @@
-from django.test import TestCase  # noqa F401
+import datetime
+import gzip
+import decimal
+import importlib
+import itertools
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import spacy
+import tiktoken
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from nltk.tokenize.punkt import PunktSentenceTokenizer
+
+from base.benchmarks import BenchmarkSuite, find_regressions
+from base.clauses import ClauseComparator, normalize_amount, parse_clause_records
+from base.contract_templates import CompiledContractTemplate
+from base.enums import HardCodedContract
+from base.extraction import ContractFactExtractor, ContractFacts
+from base.loadtest import (LOADTEST_FOLLOW_UP_QUERY, check_slo, parse_mix,
+                           percentile)
+from base.master_contracts import MasterContractRegistry
+from base.prompts import (CONTRACT_CONVERSATION_OVERVIEW,
+                          DEFAULT_CONTRACT_SECTIONS)
+from base.relevance import FINANCIAL_TERMS, FinancialRelevanceScorer, stem
+from base.utils import (ContractStandardComparisonEngine,
+                        SectionParallelContractAuthoring,
+                        SimpleContractConversationalEngine)
+from backend.admission import (CHARS_PER_TOKEN, AdmissionController,
+                               estimate_cost, get_client_key)
+from backend.budget import TokenBudgetPlanner, pack_by_tokens
+from backend.chunking import TextChunk, TokenChunker
+from backend.compression import (ENCODERS, CompressionMiddleware,
+                                 negotiate_encoding)
+from backend.constants import (ADMISSION_BASE_TOKENS, ADMISSION_PEEK_BYTES,
+                               ADMISSION_UPLOAD_BYTES_PER_TOKEN,
+                               SENTENCE_TOKENIZER_LANGUAGE, SPACY_MODEL_NAME,
+                               TOKENIZER_MODEL_NAME)
+from backend.dedup import NearDuplicateFilter, strip_repeated_page_lines
+from backend.document_profile import DocumentProfile, detect_language
+from backend.log_config import (CachedTimezoneConverter, JSONFormatter,
+                                LoggerFileRouter)
+from backend.metrics import (RequestMetricsMiddleware, RequestTimings,
+                             propagate_context, tag_strategy, timed_stage)
+from backend.pdf_tables import (TABLE_START, extract_page_text, merge_wrapped_rows,
+                                table_to_csv)
+from backend.reduce import HierarchicalReducer
+from backend.renderers import ORJSONRenderer
+from backend.resources import ResourceRegistry
+from backend.retrieval import BM25Index
+from backend.stand_in_llm import (STAND_IN_ANSWER, StandInAzureOpenAI,
+                                  StandInBackend)
+from backend.thread_store import ThreadStore
+from backend.tracing import (NO_OP_SPAN, TracingMiddleware, clean_attributes,
+                             get_tracer, trace_span, traced)
+from backend.utils import (AzureOpenAIAssistant, CustomValidation,
+                           UtilityFunctions)
+
+
+def byte_encoding():
+    """A tiktoken encoding built locally: single bytes plus a few multi byte merges, some cutting characters."""
+    ranks = {bytes([byte]): byte for byte in range(256)}
+    for rank, merge in enumerate([b" the", b"\xc3\xa9", b"\xe2\x82", b"ch\xc3", b"\xa0 "], start=256):
+        ranks[merge] = rank
+    return tiktoken.Encoding("bytes", pat_str=r""" ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+""",
+                             mergeable_ranks=ranks, special_tokens={})
+
+
+class TemporaryDataFolderMixin:
+    """Points the thread artifacts of the test at a temporary folder."""
+
+    def setUp(self):
+        super().setUp()
+        data_folder = tempfile.TemporaryDirectory()
+        self.addCleanup(data_folder.cleanup)
+        patcher = mock.patch("backend.thread_store.DATA_FOLDER_PATH", data_folder.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.data_folder = data_folder.name
+
+
+class LocalResourcesMixin:
+    """Registers resources built locally in place of the downloaded tokenizer and spaCy models."""
+
+    def setUp(self):
+        super().setUp()
+        nlp = spacy.blank("en")
+        nlp.add_pipe("sentencizer")
+        patcher = mock.patch.dict(ResourceRegistry._resources, {
+            f"tiktoken:{TOKENIZER_MODEL_NAME}": byte_encoding(),
+            f"punkt:{SENTENCE_TOKENIZER_LANGUAGE}": PunktSentenceTokenizer(),
+            f"spacy:{SPACY_MODEL_NAME}": nlp,
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class RecordingAssistant:
+    """Answers the Assistant calls of the engines with `answer(prompt)` and records them."""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.prompts = []
+        self.messages = []
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def first_conversation(self, user_query):
+        with self.lock:
+            self.prompts.append(user_query)
+            thread_id = f"thread_{next(self.ids)}"
+        return {"status": True, "response": self.answer(user_query), "thread_id": thread_id}
+
+    def add_message(self, thread_id, content):
+        self.messages.append((thread_id, content))
+
+    def keep_thread(self, thread_id):
+        return thread_id
+
+
+class ResourceRegistryTests(SimpleTestCase):
+    key = "test:resource"
+
+    def tearDown(self):
+        ResourceRegistry._resources.pop(self.key, None)
+        ResourceRegistry._stats.pop(self.key, None)
+
+    def test_resource_is_loaded_once(self):
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return object()
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(ResourceRegistry._get_or_load(self.key, loader)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(loads), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertIn(self.key, ResourceRegistry.memory_stats()["resources"])
+
+    def test_failed_load_is_retried(self):
+        def failing_loader():
+            raise OSError("missing model")
+
+        with self.assertRaises(OSError):
+            ResourceRegistry._get_or_load(self.key, failing_loader)
+        self.assertEqual(ResourceRegistry._get_or_load(self.key, lambda: "loaded"), "loaded")
+
+    def test_get_module(self):
+        self.assertIs(ResourceRegistry.get_module("json"), ResourceRegistry.get_module("json"))
+
+
+class TokenChunkerTests(SimpleTestCase):
+    text = "The café charges 5 € per hour. Ünïcödé names are kept… The fee is due the day after the delivery."
+
+    def setUp(self):
+        self.chunker = TokenChunker(max_tokens=16, overlap_tokens=4, encoding=byte_encoding(),
+                                    sentence_tokenizer=PunktSentenceTokenizer())
+
+    def test_offsets_map_token_bytes_onto_characters(self):
+        encoded = self.chunker.encode(self.text)
+        token_bytes = self.chunker.encoding.decode_tokens_bytes(encoded.tokens.tolist())
+        byte_start = 0
+        for offset, token in zip(encoded.offsets, token_bytes):
+            # The character at the offset holds the first byte of the token.
+            self.assertLessEqual(len(self.text[:offset].encode("utf-8")), byte_start)
+            self.assertLess(byte_start, len(self.text[:offset + 1].encode("utf-8")))
+            byte_start += len(token)
+        self.assertEqual(byte_start, len(self.text.encode("utf-8")))
+
+    def test_chunks_hold_their_source_span(self):
+        chunks = self.chunker.chunk(self.text)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertEqual(chunk.text, self.text[chunk.start_char:chunk.end_char])
+            self.assertLessEqual(chunk.token_count, self.chunker.max_tokens)
+        self.assertEqual(chunks[0].start_char, 0)
+        self.assertEqual(chunks[-1].end_char, len(self.text))
+
+    def test_empty_text(self):
+        self.assertEqual(self.chunker.chunk(""), [])
+
+
+class DocumentProfileTests(SimpleTestCase):
+    def test_detect_language(self):
+        self.assertEqual(detect_language("the supplier shall deliver the goods to the buyer".split()), "en")
+        self.assertEqual(detect_language("le fournisseur livre les biens dans les délais".split()), "fr")
+        self.assertEqual(detect_language("der lieferant liefert die ware und die rechnung".split()), "de")
+        self.assertEqual(detect_language(["invoice", "usd"]), "unknown")
+        self.assertEqual(detect_language([]), "unknown")
+
+    def test_page_spans(self):
+        pages = ["First page. ", "Second page. ", "Third page."]
+        chunker = TokenChunker(16, encoding=byte_encoding(), sentence_tokenizer=PunktSentenceTokenizer())
+        text = "".join(pages)
+        profile = DocumentProfile(text, np.array([[0, 12], [12, 25], [25, 36]]), len(text.split()), "en",
+                                  chunker.encode(text), chunker.sentence_spans(text))
+
+        self.assertEqual(profile.page_count, 3)
+        self.assertEqual([profile.page_of(offset) for offset in (0, 11, 12, 30)], [0, 0, 1, 2])
+        self.assertEqual(profile.to_dict()["sentence_count"], 3)
+        self.assertEqual(profile.token_count, len(text.encode("utf-8")))
+
+
+class BM25IndexTests(TemporaryDataFolderMixin, SimpleTestCase):
+    passages = [
+        "The supplier delivers the goods within 30 days.",
+        "A late fee of 500 USD applies to every late payment.",
+        "This agreement is governed by the laws of New York.",
+        "Payment is due within 45 days of the invoice.",
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.index = BM25Index.build(self.passages)
+
+    def test_search_ranks_the_matching_passage_first(self):
+        scores = self.index.scores("late fee")
+        self.assertEqual(int(np.argmax(scores)), 1)
+        self.assertEqual(self.index.search("late fee", top_k=1), [(1, self.passages[1])])
+
+    def test_search_returns_passages_in_document_order(self):
+        results = self.index.search("payment within days", top_k=3)
+        indices = [index for index, _ in results]
+        self.assertEqual(indices, sorted(indices))
+        self.assertIn(3, indices)
+
+    def test_unknown_terms_match_nothing(self):
+        self.assertEqual(self.index.search("arbitration", top_k=2), [])
+        self.assertEqual(BM25Index.build([]).search("fee", top_k=2), [])
+
+    def test_save_and_load(self):
+        self.index.save("thread_1")
+        loaded = BM25Index.load("thread_1")
+        self.assertEqual(loaded.passages, self.passages)
+        self.assertTrue(np.allclose(loaded.scores("late fee"), self.index.scores("late fee")))
+        self.assertIsNone(BM25Index.load("thread_2"))
+
+
+class FinancialRelevanceScorerTests(SimpleTestCase):
+    def setUp(self):
+        self.scorer = FinancialRelevanceScorer.from_revenue_leakage_points()
+
+    def test_stem(self):
+        self.assertEqual({stem(word) for word in ("invoice", "invoices", "invoiced", "invoicing")}, {"invoic"})
+        self.assertEqual(stem("penalties"), "penalty")
+        self.assertEqual(stem("fees"), "fee")
+
+    def test_every_financial_term_is_in_the_vocabulary(self):
+        inflected = ("charges", "charged", "rates", "rebates", "installments", "instalments", "compensated",
+                     "reimbursed", "reimbursements", "invoicing", "payable", "pricing", "expenses", "taxes")
+        for word in list(FINANCIAL_TERMS) + list(inflected):
+            self.assertIn(stem(word), self.scorer.vocabulary, word)
+
+    def test_inflected_financial_words_score(self):
+        financial = "The charges, rates and rebates are reviewed by both parties every quarter."
+        other = "The supplier delivers the goods to the warehouse of the buyer every quarter."
+        scores = self.scorer.score([other, financial])
+        self.assertGreater(scores[1], scores[0])
+        self.assertEqual(self.scorer.select([other, financial]), [1])
+
+    def test_patterns_score(self):
+        scores = self.scorer.score(["A late fee of USD 1,500 applies within 30 days.", "Notices are sent by mail."])
+        self.assertGreater(scores[0], scores[1])
+        self.assertEqual(len(self.scorer.score([])), 0)
+
+
+class NearDuplicateFilterTests(SimpleTestCase):
+    clause = ("The receiving party shall keep confidential all information disclosed by the disclosing party "
+              "and shall not disclose it to any third party without prior written consent.")
+
+    @staticmethod
+    def make_chunk(text, token_count):
+        return TextChunk(text, 0, len(text), np.zeros(token_count, dtype=np.uint32))
+
+    def test_near_duplicates_are_dropped(self):
+        duplicate_filter = NearDuplicateFilter()
+        chunks = [
+            self.make_chunk(self.clause, 30),
+            self.make_chunk("Payment is due within 45 days of the invoice date by bank transfer.", 15),
+            self.make_chunk(self.clause + " Page 3", 29),
+        ]
+        kept, tokens_saved = duplicate_filter.filter(chunks)
+        self.assertEqual(kept, chunks[:2])
+        self.assertEqual(tokens_saved, 29)
+
+    def test_signature_is_deterministic(self):
+        self.assertTrue((NearDuplicateFilter(seed=3).signature(self.clause)
+                         == NearDuplicateFilter(seed=3).signature(self.clause)).all())
+
+
+class StripRepeatedPageLinesTests(SimpleTestCase):
+    def test_repeated_edge_lines_are_removed(self):
+        bodies = ["The supplier delivers the goods.\n", "The buyer pays the invoice.\n",
+                  "Disputes go to arbitration.\n", "Either party may terminate.\n"]
+        pages = [f"ACME Corp - Confidential\n{body}Page {page} of 4\n" for page, body in enumerate(bodies, 1)]
+        cleaned, removed = strip_repeated_page_lines(pages)
+        self.assertEqual(cleaned, bodies)
+        self.assertEqual(removed[:2], ["ACME Corp - Confidential\n", "Page 1 of 4\n"])
+
+    def test_short_documents_are_kept(self):
+        pages = ["Header\nText one.\n", "Header\nText two.\n"]
+        self.assertEqual(strip_repeated_page_lines(pages), (pages, []))
+
+
+class MasterContractRegistryTests(SimpleTestCase):
+    standards = {"Payment Amount": {"values": ["Fixed fee"], "dates": [], "amounts": ["5000 USD"]}}
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        contracts_folder = os.path.join(folder.name, "hardcode_contracts")
+        os.makedirs(contracts_folder)
+        with open(os.path.join(contracts_folder, HardCodedContract.SAP.value), "wb") as pdf_file:
+            pdf_file.write(b"%PDF-1.4 master")
+        for patcher in (
+                mock.patch("base.master_contracts.MASTER_CONTRACTS_FOLDER_PATH", contracts_folder),
+                mock.patch("base.master_contracts.MASTER_STANDARDS_FOLDER_PATH",
+                           os.path.join(folder.name, "master_standards")),
+                mock.patch.dict(MasterContractRegistry._standards, clear=True),
+                mock.patch.object(MasterContractRegistry, "extract_standards", return_value=self.standards)):
+            self.extract_standards = patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_standards_are_extracted_once(self):
+        self.assertEqual(MasterContractRegistry.get_standards("sap"), self.standards)
+        # Every master sharing the PDF reuses its standards.
+        self.assertEqual(MasterContractRegistry.get_standards("sow"), self.standards)
+        self.assertEqual(self.extract_standards.call_count, 1)
+
+    def test_persisted_standards_are_reused(self):
+        MasterContractRegistry.get_standards("sap")
+        MasterContractRegistry._standards.clear()
+        self.assertEqual(MasterContractRegistry.get_standards("sap"), self.standards)
+        self.assertEqual(self.extract_standards.call_count, 1)
+
+    def test_unknown_master_contract(self):
+        with self.assertRaises(CustomValidation) as context:
+            MasterContractRegistry.get_master_path("nda")
+        self.assertEqual(context.exception.status_code, 400)
+
+
+class ClauseComparatorTests(SimpleTestCase):
+    @staticmethod
+    def clause(values=(), dates=(), amounts=()):
+        return {"values": list(values), "dates": list(dates), "amounts": list(amounts)}
+
+    def test_compare(self):
+        contract_clauses = {
+            "Payment Amount": self.clause(["The total fee is payable in full"], amounts=["5000 USD"]),
+            "Governing Law": self.clause(["Governed by the laws of New York"]),
+            "Force Majeure": self.clause(["Neither party is liable for delays beyond its control"]),
+        }
+        master_clauses = {
+            "Payment Amount": self.clause(["The total fee is payable in full"], amounts=["4000 USD"]),
+            "Governing Law": self.clause(["The laws of New York govern"]),
+            "Confidentiality Clauses": self.clause(["Information is kept confidential"]),
+        }
+        result = ClauseComparator.compare(contract_clauses, master_clauses)
+
+        self.assertEqual(result["matching"], ["Governing Law"])
+        differences = {difference["category"]: difference for difference in result["differences"]}
+        self.assertEqual(differences["Payment Amount"]["status"], "different")
+        self.assertEqual(differences["Payment Amount"]["amounts"], {"contract": ["5000 USD"], "master": ["4000 USD"]})
+        self.assertNotIn("values", differences["Payment Amount"])
+        self.assertEqual(differences["Force Majeure"]["status"], "missing_in_master")
+        self.assertEqual(differences["Confidentiality Clauses"]["status"], "missing_in_contract")
+
+    def test_amounts_compare_by_value(self):
+        contract_clauses = {"Payment Amount": self.clause(amounts=[normalize_amount("USD 2 million")])}
+        same = {"Payment Amount": self.clause(amounts=[normalize_amount({"value": 2000000, "currency": "usd"})])}
+        smaller = {"Payment Amount": self.clause(amounts=[normalize_amount("USD 2 thousand")])}
+        self.assertEqual(ClauseComparator.compare(contract_clauses, same)["matching"], ["Payment Amount"])
+        self.assertEqual(ClauseComparator.compare(contract_clauses, smaller)["matching"], [])
+
+
+class NormalizeAmountTests(SimpleTestCase):
+    def test_magnitudes(self):
+        self.assertEqual(normalize_amount("USD 2 million"), "2000000 USD")
+        self.assertEqual(normalize_amount("10k"), "10000")
+        self.assertEqual(normalize_amount("USD 2.5bn"), "2500000000 USD")
+        self.assertEqual(normalize_amount("₹5 lakh"), "500000 INR")
+
+    def test_separators(self):
+        self.assertEqual(normalize_amount("EUR 1.000"), "1000 EUR")
+        self.assertEqual(normalize_amount("1.234,56"), "1234.56")
+        self.assertEqual(normalize_amount("$1,234.56"), "1234.56 USD")
+        self.assertEqual(normalize_amount("1 500 000 EUR"), "1500000 EUR")
+        self.assertEqual(normalize_amount({"value": "1,00,000", "currency": "inr"}), "100000 INR")
+        self.assertEqual(normalize_amount({"value": 12.5, "currency": None}), "12.5")
+
+    def test_ambiguous_amounts(self):
+        for amount in ("1000.000", "2-3 million", "TBD", "1e16", {"value": None, "currency": "USD"}):
+            self.assertIsNone(normalize_amount(amount), amount)
+
+    def test_unreadable_amounts_are_kept_as_text(self):
+        records = parse_clause_records(
+            '[{"category": "payment amount", "amounts": ["To be agreed", {"value": "5k", "currency": "usd"}]}]')
+        self.assertEqual(records[0]["category"], "Payment Amount")
+        self.assertEqual(records[0]["amounts"], ["To be agreed", "5000 USD"])
+
+
+class CompiledContractTemplateTests(SimpleTestCase):
+    template_text = """
+AGREEMENT made as of [Date] between:
+
+Party 1:
+Name: ______________
+Party 2 (Client):
+Name: ______________
+
+Scope of Work:
+Party 1 agrees to provide the following services/products to Party 2:
+
+Payment:
+a. The total fee is $__________, payable as follows:
+[Amount] upon signing of this Agreement.
+[Amount] upon delivery   of the services.
+Notice: Either party may terminate with [Number] days' written notice.
+
+Signatures:
+"""
+
+    def setUp(self):
+        self.template = CompiledContractTemplate(self.template_text)
+
+    def test_field_names_describe_their_blank(self):
+        self.assertEqual(list(self.template.fields), [
+            "date", "party_1_name", "party_2_client_name", "fee", "amount_upon_signing", "amount_upon_delivery",
+            "number_days_written_notice"])
+
+    def test_render(self):
+        contract = self.template.render(
+            fields={"party_1_name": "Acme Corp", "fee": "5,000", "amount_upon_signing": "$2,500"},
+            scope_of_work="Website development.",
+            custom_clauses=[{"title": "Warranty", "text": "Defects are fixed for 90 days."}, "ignored"])
+
+        self.assertIn("Name: Acme Corp\n", contract)
+        self.assertIn("The total fee is $5,000, payable", contract)
+        self.assertIn("$2,500 upon signing", contract)
+        # Fields without a value keep their blank.
+        self.assertIn("[Amount] upon delivery of the services.", contract)
+        self.assertIn("to Party 2:\nWebsite development.\n", contract)
+        self.assertIn("Warranty: Defects are fixed for 90 days.\n\nSignatures:", contract)
+        self.assertNotIn("  ", contract)
+        self.assertNotIn("\n\n\n", contract)
+
+
+class SectionParallelContractAuthoringTests(SimpleTestCase):
+    outline = ('{"title": "Service Agreement", "sections": [{"title": "Parties", "brief": "Who signs"}, '
+               '{"title": "Payment", "brief": "Fees"}, {"title": "Termination"}]}')
+
+    @staticmethod
+    def write_section(prompt):
+        title = re.search(r'Write only the section "([^"]+)"', prompt).group(1)
+        # The first sections finish last.
+        time.sleep({"Parties": 0.05, "Payment": 0.02}.get(title, 0))
+        return f"{title}\n{title} text.\n"
+
+    def test_sections_are_assembled_in_outline_order(self):
+        assistant = RecordingAssistant(
+            lambda prompt: self.outline if "plan the outline" in prompt else self.write_section(prompt))
+        contract, thread_id = SectionParallelContractAuthoring(max_workers=3).generate_contract(
+            assistant, user_prompt="A web design contract")
+
+        self.assertEqual(contract, "SERVICE AGREEMENT\n\nParties\nParties text.\n\nPayment\nPayment text.\n\n"
+                                   "Termination\nTermination text.")
+        self.assertEqual(len(assistant.prompts), 4)
+        # A section without a brief is described by its title.
+        self.assertTrue(any("It covers: Termination" in prompt for prompt in assistant.prompts))
+        # The draft is kept in the thread of the outline for the follow-ups.
+        self.assertEqual(thread_id, "thread_1")
+        self.assertEqual(assistant.messages[0][0], "thread_1")
+        self.assertIn(contract, assistant.messages[0][1])
+
+    def test_unparsable_outline_uses_the_default_sections(self):
+        assistant = RecordingAssistant(
+            lambda prompt: "No outline" if "plan the outline" in prompt else self.write_section(prompt))
+        contract, _ = SectionParallelContractAuthoring().generate_contract(assistant, user_prompt="A contract")
+
+        self.assertTrue(contract.startswith("CONTRACT AGREEMENT\n\n"))
+        self.assertEqual(len(assistant.prompts), len(DEFAULT_CONTRACT_SECTIONS) + 1)
+
+
+class ContractFactsTests(LocalResourcesMixin, TemporaryDataFolderMixin, SimpleTestCase):
+    text = ("This Agreement starts on January 5, 2024 and runs for twelve (12) months. The total fee is "
+            "USD 120,000. Invoices are payable within 30 days of receipt. A late fee of $500 applies to every "
+            "late payment. Either party may terminate with 60 days written notice.")
+
+    def setUp(self):
+        super().setUp()
+        self.facts = ContractFactExtractor().extract(DocumentProfile.from_text(self.text))
+
+    def test_extract(self):
+        self.assertEqual([fact["value"] for fact in self.facts.amounts], ["120000 USD", "500 USD"])
+        self.assertEqual([fact["value"] for fact in self.facts.dates], ["2024-01-05"])
+        self.assertIn("within 30 days", " ".join(fact["text"] for fact in self.facts.payment_terms))
+        self.assertEqual({fact["value"] for fact in self.facts.durations}, {"360 days", "30 days", "60 days"})
+
+    def test_answer(self):
+        answer = self.facts.answer("Is there a late fee?")
+        self.assertIn("$500", answer)
+        self.assertNotIn("120,000", answer)
+        # No fact is about the subject of the question, or the question needs reasoning.
+        self.assertIsNone(self.facts.answer("What is the price of the software licenses?"))
+        self.assertIsNone(self.facts.answer("Why is the late fee so high?"))
+
+    def test_answer_from_thread(self):
+        self.facts.save("thread_1")
+        assistant = RecordingAssistant(None)
+        answer = ContractFacts.answer_from_thread("thread_1", "Is there a late fee?", assistant)
+
+        self.assertIn("$500", answer)
+        self.assertEqual(assistant.messages[0][0], "thread_1")
+        self.assertIn("Is there a late fee?", assistant.messages[0][1])
+        self.assertIsNone(ContractFacts.answer_from_thread("thread_2", "Is there a late fee?", assistant))
+
+
+class PdfTablesTests(SimpleTestCase):
+    def test_wrapped_cells_are_merged(self):
+        rows = [["Service", "Description", "Fee"], ["Support", "Monthly maintenance of the", "$1,000"],
+                ["", "SAP systems", ""]]
+        self.assertEqual(merge_wrapped_rows(rows), [
+            ["Service", "Description", "Fee"], ["Support", "Monthly maintenance of the SAP systems", "$1,000"]])
+
+    def test_totals_and_merged_cells_stay_rows(self):
+        rows = [["Item", "Qty", "Amount"], ["Licenses", "10", "$5,000"], ["", "", "$5,000"],
+                [None, "Subtotal", None], ["", "", "USD 1,250.50"]]
+        self.assertEqual(merge_wrapped_rows(rows), [
+            ["Item", "Qty", "Amount"], ["Licenses", "10", "$5,000"], ["", "", "$5,000"], ["", "Subtotal", ""],
+            ["", "", "USD 1,250.50"]])
+        # A single cell below an empty one does not continue it.
+        self.assertEqual(merge_wrapped_rows([["Item", "", "Amount"], ["", "Note", ""]]),
+                         [["Item", "", "Amount"], ["", "Note", ""]])
+
+    def test_table_to_csv(self):
+        rows = [["Level", None, "Response", ""], ["P1", None, "1 hour", ""], [None, None, None, None],
+                ["P2", None, "4, or 8 hours", ""]]
+        self.assertEqual(table_to_csv(rows), 'Level,Response\nP1,1 hour\nP2,"4, or 8 hours"\n')
+        self.assertEqual(table_to_csv([["Only", "row"]]), "")
+        self.assertEqual(table_to_csv([["A" * 200, "B" * 200], ["C" * 200, "D" * 200]]), "")
+
+    @staticmethod
+    def make_page(rows, blocks):
+        table = mock.Mock(bbox=(0, 0, 100, 100), extract=mock.Mock(return_value=rows))
+        page = mock.Mock(number=0)
+        page.find_tables.return_value.tables = [table]
+        page.get_text.side_effect = lambda option="text": blocks if option == "blocks" else "".join(
+            block[4] for block in blocks)
+        return page
+
+    def test_tables_replace_their_text_when_shorter(self):
+        rows = [["Level", "Response"], ["P1", "1 hour"], ["P2", "4 hours"]]
+        blocks = [(0, 150, 100, 160, "Service levels\n"),
+                  (0, 10, 50, 20, "Priority level of the incident\n"), (60, 10, 100, 20, "Response time\n"),
+                  (0, 30, 50, 40, "Priority 1 (P1)\n"), (60, 30, 100, 40, "Within 1 hour\n"),
+                  (0, 50, 50, 60, "Priority 2 (P2)\n"), (60, 50, 100, 60, "Within 4 hours\n")]
+        self.assertEqual(extract_page_text(self.make_page(rows, blocks)),
+                         "Service levels\n[TABLE]\nLevel,Response\nP1,1 hour\nP2,4 hours\n[/TABLE]\n")
+
+    def test_tables_longer_than_their_text_stay_plain_text(self):
+        rows = [["Qty", "Fee"], ["1", "$5"]]
+        blocks = [(0, 10, 100, 20, "Qty Fee\n"), (0, 30, 100, 40, "1 $5\n")]
+        text = extract_page_text(self.make_page(rows, blocks))
+        self.assertEqual(text, "Qty Fee\n1 $5\n")
+        self.assertNotIn(TABLE_START, text)
+
+
+class HierarchicalReducerTests(SimpleTestCase):
+    def test_parts_are_merged_level_by_level_in_order(self):
+        batches = []
+
+        def merge(batch):
+            batches.append(batch)
+            # Later batches finish first.
+            time.sleep(0.01 * (3 - len(batches) % 3))
+            return "".join(part[0] for part in batch) + "."
+
+        parts = [f"{letter}{'x' * 9}" for letter in "abcdefgh"]
+        reducer = HierarchicalReducer(merge, batch_tokens=20, output_tokens=8, max_workers=4, encoding=byte_encoding())
+        # Level 1 merges pairs of 10 byte parts, level 2 merges the 3 byte results.
+        self.assertEqual(reducer.reduce(parts), "aceg.")
+        self.assertEqual(len(batches), 5)
+
+    def test_result_fitting_the_budget_is_kept(self):
+        merge = mock.Mock()
+        reducer = HierarchicalReducer(merge, batch_tokens=20, output_tokens=100, encoding=byte_encoding())
+        self.assertEqual(reducer.reduce(["First part. ", "", "Second part."]), "First part.\n\nSecond part.")
+        merge.assert_not_called()
+
+    def test_reduction_stops_after_max_levels(self):
+        reducer = HierarchicalReducer(lambda batch: " ".join(batch), batch_tokens=10, output_tokens=5, max_levels=2,
+                                      encoding=byte_encoding())
+        self.assertEqual(reducer.reduce(["abcdef", "ghijkl"]), "abcdef\n\nghijkl")
+
+
+class PackByTokensTests(SimpleTestCase):
+    def test_packs_consecutive_items(self):
+        self.assertEqual(pack_by_tokens([3, 3, 3], budget=7, separator_tokens=1), [[0, 1], [2]])
+        self.assertEqual(pack_by_tokens([3, 3, 3], budget=9), [[0, 1, 2]])
+
+    def test_oversized_item_is_a_batch_of_its_own(self):
+        self.assertEqual(pack_by_tokens([2, 12, 2, 2], budget=5), [[0], [1], [2, 3]])
+
+    def test_no_items(self):
+        self.assertEqual(pack_by_tokens([], budget=5), [])
+
+
+class TokenBudgetPlannerTests(SimpleTestCase):
+    def setUp(self):
+        self.planner = TokenBudgetPlanner(context_tokens=4000, output_tokens=1000, encoding=byte_encoding())
+
+    def test_payload_budget(self):
+        # Context minus answer, prompt and safety tokens, less the estimate margin.
+        self.assertEqual(self.planner.payload_budget(100, 500), 2280)
+        # The answer is capped at the output limit of the model.
+        self.assertEqual(self.planner.payload_budget(0, 5000), 1900)
+        self.assertEqual(self.planner.payload_budget("x" * 100, 500), 2280)
+        self.assertEqual(self.planner.payload_budget(10000, 500), 1)
+
+    def test_pack(self):
+        chunks = [TextChunk("a" * 1000, 0, 1000, list(range(1000))) for _ in range(3)]
+        payloads = self.planner.pack(chunks, 0, 500)
+        self.assertEqual([len(payload) for payload in payloads], [2002, 1000])
+
+
+class ContractStandardComparisonTests(SimpleTestCase):
+    contract = {
+        "Payment Amount": ClauseComparatorTests.clause(["The total fee is payable in full"], amounts=["5000 USD"]),
+        "Governing Law": ClauseComparatorTests.clause(["Governed by the laws of New York"]),
+    }
+    master = {
+        "Payment Amount": ClauseComparatorTests.clause(["The total fee is payable in full"], amounts=["4000 USD"]),
+        "Governing Law": ClauseComparatorTests.clause(["The laws of New York govern"]),
+    }
+
+    def test_narration_prompt_holds_only_the_differences(self):
+        assistant = RecordingAssistant(lambda prompt: "Narration")
+        with mock.patch("base.utils.AzureOpenAIAssistant", return_value=assistant):
+            engine = ContractStandardComparisonEngine()
+        narration, comparison = engine.compare_standards(self.contract, self.master)
+
+        self.assertEqual(narration, "Narration")
+        self.assertEqual(comparison["matching"], ["Governing Law"])
+        self.assertEqual(len(assistant.prompts), 1)
+        self.assertIn("4000 USD", assistant.prompts[0])
+        self.assertNotIn("Governed by the laws of New York", assistant.prompts[0])
+        # The clause sets are added to the narration thread for the follow-ups.
+        self.assertEqual(assistant.messages[0][0], "thread_1")
+        self.assertIn("Governed by the laws of New York", assistant.messages[0][1])
+        self.assertIn("The laws of New York govern", assistant.messages[0][1])
+
+
+class SimpleContractConversationalEngineTests(TemporaryDataFolderMixin, SimpleTestCase):
+    passages = [f"[Page {page}] The late fee {page} applies to every late payment." for page in range(1, 7)]
+
+    def setUp(self):
+        super().setUp()
+        with mock.patch("base.utils.AzureOpenAIAssistant"):
+            self.engine = SimpleContractConversationalEngine()
+
+    def planner(self, context_tokens):
+        patcher = mock.patch("base.utils.TOKEN_BUDGET_PLANNER", TokenBudgetPlanner(
+            context_tokens=context_tokens, output_tokens=500, encoding=byte_encoding()))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_first_prompt_embeds_the_contract_fitting_the_budget(self):
+        passages = [(len(passage), passage) for passage in self.passages]
+        profile = mock.Mock(token_count=sum(token_count for token_count, _ in passages),
+                            text=" ".join(self.passages))
+
+        self.planner(100000)
+        self.assertIn(profile.text, self.engine.build_first_prompt(profile, passages))
+
+        self.planner(2500)
+        budget = self.engine.passage_budget(CONTRACT_CONVERSATION_OVERVIEW.format(passages=""), 0.25)
+        prompt = self.engine.build_first_prompt(profile, passages)
+        self.assertNotIn(profile.text, prompt)
+        self.assertEqual(prompt.count("The late fee"), budget // len(self.passages[0]))
+
+    def test_follow_up_attaches_the_passages_fitting_the_budget(self):
+        BM25Index.build(self.passages).save("thread_1")
+
+        self.planner(100000)
+        self.assertEqual(self.engine.build_follow_up_prompt("late fee", "thread_1").count("The late fee"), 6)
+
+        self.planner(6000)
+        self.assertEqual(self.engine.build_follow_up_prompt("late fee", "thread_1").count("The late fee"), 1)
+        self.assertEqual(self.engine.build_follow_up_prompt("late fee", "thread_2"), "late fee")
+
+
+class ThreadStoreTests(TemporaryDataFolderMixin, SimpleTestCase):
+    def test_invalid_thread_id(self):
+        for thread_id in ("", "../thread", "thread/1"):
+            with self.assertRaises(ValueError):
+                ThreadStore.get_thread_folder(thread_id)
+
+    def test_resolve_follows_the_aliases(self):
+        self.assertEqual(ThreadStore.resolve("thread_1"), "thread_1")
+        ThreadStore.set_alias("thread_1", "thread_2")
+        ThreadStore.set_alias("thread_2", "thread_3")
+        self.assertEqual(ThreadStore.resolve("thread_1"), "thread_3")
+        self.assertEqual(ThreadStore.resolve("thread_3"), "thread_3")
+
+    def test_resolve_stops_on_alias_cycles(self):
+        ThreadStore.set_alias("thread_1", "thread_2")
+        ThreadStore.set_alias("thread_2", "thread_1")
+        self.assertIn(ThreadStore.resolve("thread_1"), ("thread_1", "thread_2"))
+
+    def test_concurrent_token_updates_are_kept(self):
+        def add_tokens():
+            for _ in range(20):
+                ThreadStore.add_tokens("thread_1", 5)
+
+        workers = [threading.Thread(target=add_tokens) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(ThreadStore.get_estimated_tokens("thread_1"), 400)
+        self.assertEqual(ThreadStore.update_state("thread_1", alias="thread_2")["estimated_tokens"], 400)
+
+    def test_sweep_deletes_the_expired_threads(self):
+        ThreadStore.add_tokens("thread_1", 5)
+        self.assertEqual(ThreadStore.sweep(retention_days=1), [])
+        self.assertEqual(ThreadStore.sweep(retention_days=1, now=time.time() + 2 * 86400), ["thread_1"])
+        self.assertFalse(os.path.exists(ThreadStore.get_thread_folder("thread_1")))
+
+    def test_keep_thread_writes_the_estimate_of_new_threads(self):
+        with mock.patch("backend.utils.ResourceRegistry.get_module"), \
+                mock.patch("backend.utils.TOKEN_BUDGET_PLANNER", TokenBudgetPlanner(encoding=byte_encoding())):
+            assistant = AzureOpenAIAssistant()
+            assistant.record_thread_tokens("thread_1", "abc", "de", new_thread=True)
+            self.assertFalse(os.path.exists(ThreadStore.get_thread_folder("thread_1")))
+
+            self.assertEqual(assistant.keep_thread("thread_1"), "thread_1")
+            self.assertEqual(ThreadStore.get_estimated_tokens("thread_1"), 5)
+            assistant.record_thread_tokens("thread_1", "fgh")
+            self.assertEqual(ThreadStore.get_estimated_tokens("thread_1"), 8)
+
+
+class LogConfigTests(SimpleTestCase):
+    @staticmethod
+    def record(name, level=logging.INFO, message="Payment processed"):
+        return logging.LogRecord(name, level, __file__, 1, message, None, None)
+
+    def test_cached_timezone_converter_matches_pytz(self):
+        converter = CachedTimezoneConverter("America/New_York")
+        # Either side of the daylight saving change, twice in the same hour.
+        for seconds in (1710054000, 1710054000 + 1800, 1710061200, 1710061200 + 60):
+            expected = datetime.datetime.fromtimestamp(seconds, converter.tz).timetuple()[:6]
+            self.assertEqual(converter(seconds)[:6], expected)
+
+    def test_json_formatter(self):
+        data = json.loads(JSONFormatter().format(self.record("base", logging.WARNING)))
+        self.assertEqual((data["logger"], data["level"], data["message"]), ("base", "WARNING", "Payment processed"))
+        self.assertNotIn("exc_info", data)
+
+    def test_router_sends_records_to_the_handler_of_their_logger(self):
+        router, handler = LoggerFileRouter(), mock.Mock(level=logging.INFO)
+        router.add_route("base", handler)
+        router.handle(self.record("base"))
+        router.handle(self.record("base", logging.DEBUG))
+        router.handle(self.record("backend"))
+        self.assertEqual(handler.handle.call_count, 1)
+
+
+class LazyModuleTests(SimpleTestCase):
+    key = "module:colorsys"
+
+    def tearDown(self):
+        ResourceRegistry._resources.pop(self.key, None)
+        ResourceRegistry._stats.pop(self.key, None)
+
+    def test_module_is_imported_on_first_use(self):
+        with mock.patch("backend.resources.importlib.import_module", wraps=importlib.import_module) as import_module:
+            module = ResourceRegistry.get_module("colorsys")
+            self.assertIs(ResourceRegistry.get_module("colorsys"), module)
+        import_module.assert_called_once_with("colorsys")
+        self.assertIn(self.key, ResourceRegistry.memory_stats()["resources"])
+
+    def test_startup_report(self):
+        report = ResourceRegistry.startup_report(time.perf_counter() - 1, warmed_up=True)
+        self.assertGreaterEqual(report["startup_seconds"], 1)
+        self.assertTrue(report["warmed_up"])
+        self.assertIn("resources", report)
+
+
+class ContractPathTests(SimpleTestCase):
+    def test_uploads_of_the_same_second_get_their_own_file(self):
+        with tempfile.TemporaryDirectory() as data_folder, mock.patch("backend.utils.DATA_FOLDER_PATH", data_folder):
+            paths = {UtilityFunctions.get_contract_path("contract") for _ in range(20)}
+        self.assertEqual(len(paths), 20)
+        self.assertTrue(all(os.path.basename(path).startswith("contract_") for path in paths))
+
+
+class RequestMetricsTests(SimpleTestCase):
+    def test_server_timing_sums_repeated_stages(self):
+        timings = RequestTimings()
+        timings.add("assistant_run", 0.5)
+        timings.add("chunking", 0.01)
+        timings.add("assistant_run", 0.25)
+        self.assertEqual(timings.server_timing(1.0),
+                         'assistant_run;dur=750.0;desc="2 calls", chunking;dur=10.0, total;dur=1000.0')
+
+    def test_middleware_reports_the_stages_of_the_request(self):
+        def call_assistant():
+            with timed_stage("assistant_run"):
+                pass
+
+        def view(request):
+            tag_strategy("LargeContractSummarization")
+            with timed_stage("chunking"):
+                pass
+            # Stages measured in worker threads count for the request.
+            worker = threading.Thread(target=propagate_context(call_assistant))
+            worker.start()
+            worker.join()
+            return HttpResponse("ok")
+
+        with mock.patch.object(RequestTimings, "observe", autospec=True) as observe:
+            response = RequestMetricsMiddleware(view)(RequestFactory().get("/"))
+
+        stages = [metric.split(";")[0] for metric in response["Server-Timing"].split(", ")]
+        self.assertEqual(stages, ["chunking", "assistant_run", "total"])
+        timings, status_code, _ = observe.call_args[0]
+        self.assertEqual((timings.strategy, status_code), ("LargeContractSummarization", 200))
+
+
+class TracingTests(SimpleTestCase):
+    def setUp(self):
+        # Tracing off, as without OTEL_TRACES_EXPORTER or the opentelemetry packages.
+        patcher = mock.patch.multiple("backend.tracing", _tracer=None, _tracer_configured=False, trace=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_spans_are_no_ops_when_tracing_is_off(self):
+        @traced()
+        def summarize(text):
+            return text.upper()
+
+        with mock.patch.dict(os.environ, {"OTEL_TRACES_EXPORTER": "console"}), \
+                mock.patch("backend.tracing.UTILS_LOGGER") as logger:
+            self.assertIsNone(get_tracer())
+        logger.warning.assert_called_once()
+
+        with trace_span("chunk", chunk_index=1) as span:
+            self.assertIs(span, NO_OP_SPAN)
+        self.assertEqual(summarize("fee"), "FEE")
+        self.assertEqual(summarize.__name__, "summarize")
+
+    def test_middleware_passes_the_response_through(self):
+        response = TracingMiddleware(lambda request: HttpResponse("ok"))(RequestFactory().get("/"))
+        self.assertEqual(response.content, b"ok")
+
+    def test_clean_attributes(self):
+        self.assertEqual(clean_attributes({"thread_id": "thread_1", "tokens": None}), {"thread_id": "thread_1"})
+
+
+class BenchmarkSuiteTests(SimpleTestCase):
+    def test_fixtures_found_in_both_folders_are_run_once(self):
+        with tempfile.TemporaryDirectory() as base_dir:
+            folders = [os.path.join(base_dir, "shared_contracts"), os.path.join(base_dir, "data", "contracts")]
+            for folder, contents in zip(folders, ({"a.pdf": b"A", "b.pdf": b"B"}, {"a.pdf": b"A", "c.pdf": b"B2"})):
+                os.makedirs(folder)
+                for filename, content in contents.items():
+                    with open(os.path.join(folder, filename), "wb") as pdf_file:
+                        pdf_file.write(content)
+
+            with mock.patch("base.benchmarks.BENCHMARK_FIXTURE_FOLDERS", folders), \
+                    mock.patch("base.benchmarks.BASE_DIR", base_dir), \
+                    mock.patch.dict("base.benchmarks.BENCHMARK_CASES",
+                                    {"size": lambda fixture: lambda: os.path.getsize(fixture.pdf_path)}):
+                results = BenchmarkSuite(repeat=1, cases=["size"]).run()
+
+        self.assertEqual(sorted(results), ["size:data/contracts/c.pdf", "size:shared_contracts/a.pdf",
+                                           "size:shared_contracts/b.pdf"])
+
+    def test_find_regressions(self):
+        baseline = {"chunking:a.pdf": {"seconds": 1.0, "peak_memory_bytes": 1000},
+                    "parse:a.pdf": {"seconds": 0.0001, "peak_memory_bytes": 1000}}
+        results = {"chunking:a.pdf": {"seconds": 1.5, "peak_memory_bytes": 1100},
+                   # Slower, but within the timing noise.
+                   "parse:a.pdf": {"seconds": 0.0002, "peak_memory_bytes": 1000},
+                   "render:a.pdf": {"seconds": 9.0, "peak_memory_bytes": 1000}}
+        self.assertEqual(find_regressions(results, baseline, threshold=0.2),
+                         ["chunking:a.pdf: seconds 1.5 vs 1.0 in the baseline (+50%)"])
+        results["parse:a.pdf"] = {"error": "no result"}
+        self.assertEqual(find_regressions(results, baseline, threshold=0.2)[1], "parse:a.pdf: failed (no result)")
+
+
+class StandInLLMTests(TemporaryDataFolderMixin, SimpleTestCase):
+    @staticmethod
+    def worker():
+        # Every client has its own backend, like the workers of a server.
+        return StandInAzureOpenAI(latency=0, jitter=0, poll_seconds=0, backend=StandInBackend())
+
+    def test_threads_are_shared_by_the_workers(self):
+        first_worker, second_worker = self.worker(), self.worker()
+        thread = first_worker.beta.threads.create(messages=[{"role": "user", "content": "Summarize the contract"}])
+
+        second_worker.beta.threads.messages.create(thread_id=thread.id, role="user", content="And the fees?")
+        run = second_worker.beta.threads.runs.create(thread_id=thread.id, assistant_id="asst")
+        self.assertEqual(second_worker.beta.threads.runs.retrieve(run_id=run.id, thread_id=thread.id).status,
+                         "completed")
+
+        messages = first_worker.beta.threads.messages.list(thread_id=thread.id).data
+        self.assertEqual([message.role for message in messages], ["assistant", "user", "user"])
+        self.assertEqual(messages[0].content[0].text.value, STAND_IN_ANSWER)
+
+    def test_unknown_thread(self):
+        with self.assertRaisesRegex(ValueError, "Unknown stand-in thread"):
+            self.worker().beta.threads.messages.create(thread_id="thread_1", role="user", content="Hello")
+        self.assertFalse(os.path.exists(ThreadStore.get_thread_folder("thread_1")))
+
+
+class LoadTestTests(SimpleTestCase):
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix("summarization=2, health,"), {"summarization": 2.0, "health": 1.0})
+        for mix in ("unknown=1", "health=0", "health=fast"):
+            with self.assertRaises(ValueError):
+                parse_mix(mix)
+
+    def test_percentile(self):
+        values = [0.1 * index for index in range(1, 11)]
+        self.assertEqual(percentile(values, 0.5), values[4])
+        self.assertEqual(percentile(values, 0.99), values[9])
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_check_slo(self):
+        report = {"routes": {"summarization": {"p95_seconds": 4.0, "error_rate": 0.0},
+                             "health": {"p95_seconds": None, "error_rate": 0.5}}}
+        self.assertEqual(check_slo(report, max_p95_seconds=3, max_error_rate=0.1),
+                         ["summarization: p95 4.000s above 3s", "health: error rate 50.00% above 10.00%"])
+        self.assertEqual(check_slo(report), [])
+
+    def test_default_follow_up_reaches_the_llm(self):
+        facts = ContractFacts(payment_terms=[{"text": "within 30 days", "value": "30 days", "page": 1,
+                                              "context": "Invoices are payable within 30 days of receipt."}],
+                              durations=[{"text": "60 days", "value": "60 days", "page": 1,
+                                          "context": "Either party may terminate with 60 days written notice."}])
+        self.assertIsNotNone(facts.answer("What are the payment terms of the invoices?"))
+        self.assertIsNone(facts.answer(LOADTEST_FOLLOW_UP_QUERY))
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    data = {
+        "status": True, "message": gettext_lazy("Response Generated Successfully"), "status_code": 200,
+        "data": {"response": "Fees: 10 000 \u20ac \u2014 due \u2028 within 30 days\n\"net\"", "thread_id": None,
+                 "amounts": [decimal.Decimal("1.10"), 2.5, -3, 1e-3], "pages": (1, 2),
+                 "created_at": datetime.datetime(2024, 1, 5, 10, 30), 7: "page seven", "nested": [{"empty": []}, {}]},
+    }
+
+    def test_output_matches_the_stock_renderer(self):
+        self.assertEqual(ORJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_exponent_floats_are_written_the_shortest_way(self):
+        self.assertEqual(ORJSONRenderer().render({"value": 1e20}), b'{"value":1e20}')
+        self.assertEqual(JSONRenderer().render({"value": 1e20}), b'{"value":1e+20}')
+
+    def test_non_finite_floats(self):
+        for value in (float("nan"), float("inf")):
+            with self.assertRaisesRegex(ValueError, "Out of range float values"):
+                ORJSONRenderer().render({"data": {"scores": [value]}})
+        # A null that is not a float is kept.
+        self.assertEqual(ORJSONRenderer().render({"value": None}), b'{"value":null}')
+
+        renderer = ORJSONRenderer()
+        renderer.strict = False
+        self.assertEqual(renderer.render({"value": float("inf")}), b'{"value":Infinity}')
+
+
+class NegotiateEncodingTests(SimpleTestCase):
+    def test_gzip(self):
+        self.assertEqual(negotiate_encoding("gzip, deflate"), "gzip")
+        self.assertEqual(negotiate_encoding("GZIP;q=0.5"), "gzip")
+
+    def test_nothing_accepted(self):
+        self.assertIsNone(negotiate_encoding(""))
+        self.assertIsNone(negotiate_encoding("identity"))
+        self.assertIsNone(negotiate_encoding("gzip;q=0"))
+        self.assertIsNone(negotiate_encoding("gzip;q=abc"))
+
+    def test_wildcard(self):
+        self.assertEqual(negotiate_encoding("*"), next(iter(ENCODERS)))
+        self.assertEqual(negotiate_encoding("*;q=0.1, gzip;q=0.5"), "gzip")
+        self.assertNotEqual(negotiate_encoding("*, gzip;q=0"), "gzip")
+
+    def test_highest_weight_wins(self):
+        for encoding in ENCODERS:
+            if encoding != "gzip":
+                self.assertEqual(negotiate_encoding(f"gzip;q=0.5, {encoding};q=0.8"), encoding)
+                self.assertEqual(negotiate_encoding(f"gzip;q=0.8, {encoding};q=0.5"), "gzip")
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    content = b'{"response": "' + b"The supplier delivers the goods within 30 days. " * 100 + b'"}'
+
+    def compress(self, response, accept_encoding="gzip"):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_response_is_compressed(self):
+        response = HttpResponse(self.content)
+        response["ETag"] = '"v1"'
+        response = self.compress(response)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), self.content)
+        self.assertEqual(response["ETag"], 'W/"v1"')
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_small_or_unaccepted_responses_are_sent_as_is(self):
+        self.assertFalse(self.compress(HttpResponse(b"{}")).has_header("Content-Encoding"))
+        self.assertFalse(self.compress(HttpResponse(self.content), "identity").has_header("Content-Encoding"))
+
+    def test_streaming_response_is_compressed_chunk_by_chunk(self):
+        chunks = [b"data: " + self.content[:500] + b"\n\n", b"data: " + self.content[500:] + b"\n\n"]
+        response = self.compress(StreamingHttpResponse(iter(chunks)))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), b"".join(chunks))
+
+
+class AdmissionControllerTests(SimpleTestCase):
+    def setUp(self):
+        self.controller = AdmissionController(endpoint_tokens=100, client_tokens=60, seconds_per_token=0.1,
+                                              max_retry_after=30)
+
+    def test_idle_endpoint_admits_any_cost(self):
+        ticket, retry_after = self.controller.admit("contract/summary", "1.2.3.4", 1000)
+        self.assertIsNotNone(ticket)
+        self.assertIsNone(retry_after)
+
+    def test_rejects_past_the_endpoint_limit(self):
+        self.controller.admit("contract/summary", "a", 50)
+        self.controller.admit("contract/summary", "b", 40)
+        ticket, retry_after = self.controller.admit("contract/summary", "c", 20)
+        self.assertIsNone(ticket)
+        self.assertTrue(1 <= retry_after <= 30)
+        # Other endpoints have their own capacity.
+        self.assertIsNotNone(self.controller.admit("contract/compare", "c", 20)[0])
+
+    def test_rejects_past_the_client_limit_only_for_known_clients(self):
+        self.controller.admit("contract/summary", "a", 50)
+        self.assertIsNone(self.controller.admit("contract/compare", "a", 20)[0])
+        self.controller.admit("contract/chat", None, 50)
+        self.assertIsNotNone(self.controller.admit("contract/chat", None, 20)[0])
+
+    def test_release_frees_capacity(self):
+        ticket, _ = self.controller.admit("contract/summary", "a", 90)
+        self.assertIsNone(self.controller.admit("contract/summary", "b", 20)[0])
+        self.controller.release(ticket)
+        self.assertIsNotNone(self.controller.admit("contract/summary", "b", 20)[0])
+        self.assertEqual(self.controller.client_load, {"b": 20})
+
+
+class AdmissionCostTests(TemporaryDataFolderMixin, SimpleTestCase):
+    def test_uploads_are_estimated_from_their_size(self):
+        body = json.dumps({"contract_pdf": "A" * ADMISSION_PEEK_BYTES * 10})
+        request = RequestFactory().post("/contract/summarization/", body, content_type="application/json")
+        self.assertEqual(estimate_cost(request), ADMISSION_BASE_TOKENS + len(body) // ADMISSION_UPLOAD_BYTES_PER_TOKEN)
+
+    def test_follow_ups_are_estimated_from_their_thread(self):
+        ThreadStore.add_tokens("thread_2", 5000)
+        ThreadStore.set_alias("thread_1", "thread_2")
+        body = json.dumps({"thread_id": "thread_1", "user_query": "Explain the fees."})
+        request = RequestFactory().post("/contract/conversational/", body, content_type="application/json")
+        self.assertEqual(estimate_cost(request), ADMISSION_BASE_TOKENS + len(body) // CHARS_PER_TOKEN + 5000)
+
+    def test_client_key(self):
+        request = RequestFactory().post("/", HTTP_X_FORWARDED_FOR="6.6.6.6, 10.0.0.1", REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(get_client_key(request), "10.0.0.2")
+        # Behind a proxy, only the address the proxy appended is trusted.
+        with mock.patch.dict(os.environ, {"ADMISSION_CLIENT_HEADER": "X-Forwarded-For"}):
+            self.assertEqual(get_client_key(request), "10.0.0.1")
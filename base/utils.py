@@ -1,22 +1,98 @@
+import json
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 
 from base import BACKEND_LOGGER
-from base.constants import TEXT_LENGTH_THRESHOLD
+from base.clauses import (ClauseComparator, merge_clause_records,
+                          parse_clause_records)
+from base.constants import (CHUNK_SUMMARY_OUTPUT_TOKENS,
+                            CLAUSE_EXTRACTION_OUTPUT_TOKENS,
+                            CONTRACT_MAX_SECTIONS, CONTRACT_SECTION_WORKERS,
+                            CONTRACT_SUMMARY_OUTPUT_TOKENS,
+                            CONVERSATION_OUTPUT_TOKENS, MAX_TOKEN,
+                            REDUCE_OUTPUT_TOKENS, REDUCE_WORKERS,
+                            RETRIEVAL_OVERVIEW_SHARE,
+                            RETRIEVAL_PASSAGE_TOKENS,
+                            RETRIEVAL_PASSAGES_SHARE,
+                            REVENUE_LEAKAGE_OUTPUT_TOKENS)
+from base.contract_templates import COMPILED_CONTRACT_TEMPLATE
 from base.enums import ContractType
-from base.prompts import (CONTRACT_INFO_EXTRACTION, CONTRACT_TEMPLATE,
-                          REVENUE_LEAKAGE_POINTS)
+from base.extraction import ContractFacts, extract_contract_facts
+from base.master_contracts import MasterContractRegistry
+from base.prompts import (CHUNK_SUMMARY, CLAUSE_COMPARISON_CONTEXT,
+                          CLAUSE_DIFF_NARRATION,
+                          CONTRACT_CLAUSE_EXTRACTION,
+                          CONTRACT_CONVERSATION_OVERVIEW, CONTRACT_DRAFT_CONTEXT,
+                          CONTRACT_FACTS_CONTEXT, CONTRACT_PARAMETERS,
+                          CONTRACT_RESULT_CONTEXT, CONTRACT_RETRIEVAL_QUERY,
+                          CONTRACT_SECTION_GENERATION,
+                          CONTRACT_SECTION_OUTLINE, CONTRACT_SUMMARY,
+                          CONTRACT_TEMPLATE, CONTRACT_TEMPLATE_FILL,
+                          DEFAULT_CONTRACT_SECTIONS, REVENUE_LEAKAGE_CHUNK,
+                          REVENUE_LEAKAGE_POINTS, REVENUE_LEAKAGE_REDUCE,
+                          SUMMARY_REDUCE, TABLE_FORMAT_NOTE)
+from base.relevance import FINANCIAL_RELEVANCE_SCORER
+from backend.budget import TOKEN_BUDGET_PLANNER
+from backend.dedup import NEAR_DUPLICATE_FILTER
+from backend.document_profile import DocumentProfile
+from backend.metrics import (FOLLOW_UP_STRATEGY, propagate_context,
+                             tag_strategy)
+from backend.pdf_tables import TABLE_START
+from backend.reduce import HierarchicalReducer
+from backend.retrieval import BM25Index
+from backend.tracing import trace_span, traced
 from backend.utils import (AzureOpenAIAssistant, CustomValidation,
                                     UtilityFunctions)
 
 
+@traced()
+def reduce_partial_results(gpt_obj: AzureOpenAIAssistant, parts: list, reduce_prompt: str, task: str,
+                           thread_id: str) -> tuple:
+    """
+    Reduce per chunk results hierarchically and seed a fresh thread with the reduced result.
+
+    The thread the chunks were processed in holds every chunk, follow-ups go to the new
+    thread holding only the bounded result instead.
+
+    Args:
+        gpt_obj (AzureOpenAIAssistant): The assistant client.
+        parts (list): The per chunk results in document order.
+        reduce_prompt (str): Template merging a batch of results, with {parts} and {max_words}.
+        task (str): Name of the result for the follow-up context, e.g. "summary".
+        thread_id (str): The thread the chunks were processed in, kept when there is a single chunk.
+
+    Returns:
+        tuple: The reduced result and the thread id for follow-ups.
+    """
+    if len(parts) <= 1:
+        return "".join(parts), thread_id
+
+    output_tokens = TOKEN_BUDGET_PLANNER.output_budget(REDUCE_OUTPUT_TOKENS)
+    max_words = output_tokens * 3 // 4
+
+    def merge(batch):
+        gpt_response = gpt_obj.first_conversation(user_query=reduce_prompt.format(
+            parts="\n\n---\n\n".join(batch), max_words=max_words))
+        if not gpt_response["status"]:
+            raise CustomValidation(
+                f"Failed to generate response from Azure GPT Assitant while merging the {task}")
+        return gpt_response['response']
+
+    batch_tokens = TOKEN_BUDGET_PLANNER.payload_budget(
+        reduce_prompt.format(parts="", max_words=max_words), output_tokens)
+    result = HierarchicalReducer(merge, batch_tokens, output_tokens, REDUCE_WORKERS).reduce(parts)
+    return result, gpt_obj.create_thread(CONTRACT_RESULT_CONTEXT.format(task=task, result=result))
+
+
 class SummarizationStrategy(ABC):
     @abstractmethod
-    def summarize(self, text: str) -> str:
+    def summarize(self, profile: DocumentProfile, facts: ContractFacts = None) -> str:
         """
-        Summarize the given text.
+        Summarize the given document.
 
         Args:
-            text (str): The text to be summarized.
+            profile (DocumentProfile): Profile of the document to be summarized.
+            facts (ContractFacts, optional): Facts extracted locally from the document.
 
         Returns:
             str: The summarized text.
@@ -28,10 +104,17 @@ class LargeContractSummarization(SummarizationStrategy):
     def __init__(self) -> None:
         self.thread_id = None
         self.gpt_obj = None
+        self.facts = None
+
+    def build_prompt(self, chunk: str) -> str:
+        prompt = CHUNK_SUMMARY.format(chunk=chunk)
+        if self.facts:
+            prompt += CONTRACT_FACTS_CONTEXT.format(facts=self.facts.to_prompt_context())
+        return prompt
 
     def summarize_chunk(self, chunk: str) -> str:
         """
-        Summarize a chunk of text.
+        Summarize a chunk of text in a thread of its own, the packed chunks leave no room for a history.
 
         Args:
             chunk (str): A chunk of text to be summarized.
@@ -40,22 +123,12 @@ class LargeContractSummarization(SummarizationStrategy):
             str: The summarized text.
         """
         try:
-            prompt = f"Provide a clear and concise summary of the following text: {chunk}"
-
-            if self.thread_id is None:
-                gpt_response = self.gpt_obj.first_conversation(
-                    user_query=prompt)
-                if not gpt_response["status"]:
-                    raise CustomValidation(
-                        "Failed to generate response from Azure GPT Assitant for first conversation")
-                self.thread_id = gpt_response['thread_id']
-
-            else:
-                gpt_response = self.gpt_obj.next_conversion(
-                    user_query=prompt, thread_id=self.thread_id)
-                if not gpt_response["status"]:
-                    raise CustomValidation(
-                        "Failed to generate response from Azure GPT Assitant for after first conversation")
+            gpt_response = self.gpt_obj.first_conversation(
+                user_query=self.build_prompt(chunk))
+            if not gpt_response["status"]:
+                raise CustomValidation(
+                    "Failed to generate response from Azure GPT Assitant for first conversation")
+            self.thread_id = gpt_response['thread_id']
 
             return gpt_response['response']
 
@@ -67,24 +140,31 @@ class LargeContractSummarization(SummarizationStrategy):
                 f"Error occurred during Large Contract Chunk Summarization: {str(e)}")
             raise CustomValidation()
 
-    def summarize(self, pdf_text: str, gpt_obj: AzureOpenAIAssistant) -> str:
+    @traced()
+    def summarize(self, profile: DocumentProfile, gpt_obj: AzureOpenAIAssistant, facts: ContractFacts = None) -> str:
         """
         Summarize a large contract.
 
         Args:
-            pdf_text (str): The text of the large contract to be summarized.
+            profile (DocumentProfile): Profile of the large contract to be summarized.
+            facts (ContractFacts, optional): Facts added to the first chunk prompt.
 
         Returns:
             str: The summarized text.
         """
         try:
             self.gpt_obj = gpt_obj
+            self.facts = facts
 
             BACKEND_LOGGER.info("Inside Large Contract Summarization")
-            chunks = UtilityFunctions.split_text_into_chunks(pdf_text)
-            summaries = [self.summarize_chunk(chunk) for chunk in chunks]
-            combined_summary = ' '.join(summaries)
-            return combined_summary, self.thread_id
+            chunks, _ = NEAR_DUPLICATE_FILTER.filter(profile.chunks(MAX_TOKEN))
+            payloads = TOKEN_BUDGET_PLANNER.pack(chunks, self.build_prompt(""), CHUNK_SUMMARY_OUTPUT_TOKENS)
+            BACKEND_LOGGER.info(f"Summarizing {len(chunks)} chunks in {len(payloads)} calls")
+            summaries = []
+            for index, payload in enumerate(payloads):
+                with trace_span("chunk", chunk_index=index):
+                    summaries.append(self.summarize_chunk(payload))
+            return reduce_partial_results(self.gpt_obj, summaries, SUMMARY_REDUCE, "summary", self.thread_id)
 
         except CustomValidation as exc:
             raise exc
@@ -96,20 +176,23 @@ class LargeContractSummarization(SummarizationStrategy):
 
 
 class SmallContractSummarizationEngine(SummarizationStrategy):
-    def summarize(self, pdf_text: str, gpt_obj: AzureOpenAIAssistant) -> str:
+    @traced()
+    def summarize(self, profile: DocumentProfile, gpt_obj: AzureOpenAIAssistant, facts: ContractFacts = None) -> str:
         """
         Summarize a small contract.
 
         Args:
-            pdf_text (str): The text of the small contract to be summarized.
+            profile (DocumentProfile): Profile of the small contract to be summarized.
+            facts (ContractFacts, optional): Facts added to the prompt.
 
         Returns:
             str: The summarized text.
         """
         try:
             BACKEND_LOGGER.info("Inside Small Contract Summarization")
-            prompt = f"Provide clear and concise summary of {pdf_text} explaining the important dates, payment details \
-                and contract details"
+            prompt = CONTRACT_SUMMARY.format(contract_text=profile.text)
+            if facts:
+                prompt += CONTRACT_FACTS_CONTEXT.format(facts=facts.to_prompt_context())
 
             gpt_response = gpt_obj.first_conversation(user_query=prompt)
 
@@ -144,30 +227,36 @@ class ContractSummarizationEngine:
         """
         self.strategy = strategy
 
-    def summarize_contract(self, pdf_text: str, gpt_object: AzureOpenAIAssistant) -> str:
+    def summarize_contract(self, profile: DocumentProfile, gpt_object: AzureOpenAIAssistant,
+                           facts: ContractFacts = None) -> str:
         """
         Summarize the contract based on the chosen strategy.
 
         Args:
-            pdf_text (str): The text of the contract to be summarized.
+            profile (DocumentProfile): Profile of the contract to be summarized.
+            facts (ContractFacts, optional): Facts extracted locally from the contract.
 
         Returns:
             str: The summarized contract.
         """
-        return self.strategy.summarize(pdf_text, gpt_object)
+        return self.strategy.summarize(profile, gpt_object, facts)
 
-    def determine_strategy(self, pdf_text: str) -> SummarizationStrategy:
+    def determine_strategy(self, profile: DocumentProfile, facts: ContractFacts = None) -> SummarizationStrategy:
         """
-        Determine the appropriate strategy based on the length of the contract.
+        Determine the appropriate strategy based on whether the contract fits a single call.
 
         Args:
-            pdf_text (str): The text of the contract.
+            profile (DocumentProfile): Profile of the contract.
+            facts (ContractFacts, optional): Facts added to the prompt.
 
         Returns:
             SummarizationStrategy: The determined summarization strategy.
         """
         try:
-            if len(pdf_text.split()) > TEXT_LENGTH_THRESHOLD:
+            prompt_overhead = CONTRACT_SUMMARY.format(contract_text="")
+            if facts:
+                prompt_overhead += CONTRACT_FACTS_CONTEXT.format(facts=facts.to_prompt_context())
+            if not TOKEN_BUDGET_PLANNER.fits(profile.token_count, prompt_overhead, CONTRACT_SUMMARY_OUTPUT_TOKENS):
                 return LargeContractSummarization()
             else:
                 return SmallContractSummarizationEngine()
@@ -180,6 +269,7 @@ class ContractSummarizationEngine:
                 f"Error occurred while determining contract summarization strategy: {str(e)}")
             raise CustomValidation()
 
+    @traced()
     def generate_result(self, data: dict) -> str:
         """
         Generate the summarized contract.
@@ -197,13 +287,22 @@ class ContractSummarizationEngine:
             gpt_obj = AzureOpenAIAssistant()
 
             if base64_string:
-                pdf_text = UtilityFunctions.get_pdf_content(base64_string)
-                self.set_strategy(self.determine_strategy(pdf_text))
+                profile = UtilityFunctions.get_document_profile(base64_string)
+                facts = extract_contract_facts(profile)
+                self.set_strategy(self.determine_strategy(profile, facts))
+                tag_strategy(type(self.strategy).__name__)
                 summarized_contract, thread_id = self.summarize_contract(
-                    pdf_text, gpt_obj)
+                    profile, gpt_obj, facts)
+                gpt_obj.keep_thread(thread_id)
+                facts.save(thread_id)
                 return {"response": summarized_contract, "thread_id": thread_id}
 
             else:
+                tag_strategy(FOLLOW_UP_STRATEGY)
+                local_answer = ContractFacts.answer_from_thread(thread_id, user_query, gpt_obj)
+                if local_answer:
+                    return {"response": local_answer, "thread_id": thread_id}
+
                 gpt_response = gpt_obj.next_conversion(
                     user_prompt=user_query, thread_id=thread_id)
                 if not gpt_response['status']:
@@ -221,14 +320,18 @@ class ContractSummarizationEngine:
             raise CustomValidation()
 
 
+CLAUSE_PARAMETERS_TEXT = "\n".join(
+    f"{index}. {parameter}" for index, parameter in enumerate(CONTRACT_PARAMETERS, start=1))
+
+
 class ContractStandardComparisonEngine:
     def __init__(self) -> None:
         self.thread_id = None
         self.gpt_obj = AzureOpenAIAssistant()
 
-    def make_conversation_from_gpt(self, prompt):
+    def make_conversation_from_gpt(self, prompt, new_thread=False):
         try:
-            if self.thread_id is None:
+            if self.thread_id is None or new_thread:
                 BACKEND_LOGGER.info("first conversion..................")
                 gpt_response = self.gpt_obj.first_conversation(
                     user_query=prompt)
@@ -251,11 +354,31 @@ class ContractStandardComparisonEngine:
             raise CustomValidation(
                 "An error occurred during contract details extraction in Contract Standard Comparison.")
 
-    def extract_contract_deatils(self, contract_text_list):
+    @traced()
+    def extract_contract_deatils(self, contract_chunks) -> dict:
+        """
+        Extract the structured clauses of a contract, chunk by chunk.
+
+        Args:
+            contract_chunks (list[TextChunk]): The chunks of the contract.
+
+        Returns:
+            dict: Clauses merged per category, see `merge_clause_records`.
+        """
         try:
-            result = [self.make_conversation_from_gpt(prompt=CONTRACT_INFO_EXTRACTION.format(
-                contract_chuncked_text=chuck)) for chuck in contract_text_list]
-            return " ".join(result)
+            records = []
+            payloads = TOKEN_BUDGET_PLANNER.pack(
+                NEAR_DUPLICATE_FILTER.filter(contract_chunks)[0],
+                CONTRACT_CLAUSE_EXTRACTION.format(contract_chuncked_text="", parameters=CLAUSE_PARAMETERS_TEXT),
+                CLAUSE_EXTRACTION_OUTPUT_TOKENS)
+            for index, payload in enumerate(payloads):
+                with trace_span("chunk", chunk_index=index) as span:
+                    response = self.make_conversation_from_gpt(prompt=CONTRACT_CLAUSE_EXTRACTION.format(
+                        contract_chuncked_text=payload, parameters=CLAUSE_PARAMETERS_TEXT), new_thread=True)
+                    chunk_records = parse_clause_records(response)
+                    span.set_attribute("clause_records", len(chunk_records))
+                records.extend(chunk_records)
+            return merge_clause_records(records)
 
         except CustomValidation as exc:
             raise exc
@@ -266,24 +389,34 @@ class ContractStandardComparisonEngine:
             raise CustomValidation(
                 "An error occurred during contract details extraction in Contract Standard Comparison.")
 
-    def compare_standards(self, contract_standards: str, master_contract_standards: str) -> str:
+    def compare_standards(self, contract_standards: dict, master_contract_standards: dict) -> tuple:
         """
         Compare the standards of a contract with the master contract standards.
 
+        The clauses are aligned and diffed locally, the GPT is only asked to narrate the differences. Both
+        clause sets are then added to the narration thread, the thread returned for follow-ups.
+
         Args:
-            contract_standards (str): Standards identified from the contract.
-            master_contract_standards (str): Standards identified from the master contract.
+            contract_standards (dict): Clauses extracted from the contract.
+            master_contract_standards (dict): Clauses extracted from the master contract.
 
         Raises:
             CustomValidation: If there's a failure in generating the GPT response.
 
         Returns:
-            str: Comparison result.
+            tuple: Comparison narration and the structured differences.
         """
         try:
-            prompt = f"Compare the {contract_standards} standards with the {master_contract_standards} standards."
+            comparison = ClauseComparator.compare(contract_standards, master_contract_standards)
+            prompt = CLAUSE_DIFF_NARRATION.format(
+                matching_categories=", ".join(comparison["matching"]) or "None",
+                differences=json.dumps(comparison["differences"], separators=(",", ":")))
+            narration = self.make_conversation_from_gpt(prompt=prompt, new_thread=True)
 
-            return self.make_conversation_from_gpt(prompt=prompt)
+            self.gpt_obj.add_message(thread_id=self.thread_id, content=CLAUSE_COMPARISON_CONTEXT.format(
+                contract_clauses=json.dumps(contract_standards, separators=(",", ":")),
+                master_clauses=json.dumps(master_contract_standards, separators=(",", ":"))))
+            return narration, comparison
 
         except CustomValidation as exc:
             raise exc
@@ -294,12 +427,14 @@ class ContractStandardComparisonEngine:
             raise CustomValidation(
                 "An error occurred during standard comparison.")
 
+    @traced()
     def generate_result(self, data: dict) -> str:
         """
         Generate a result by comparing the standards of a contract with master contract standards.
 
         Args:
-            data (dict): Dictionary containing the base64-encoded PDF of the contract.
+            data (dict): Dictionary containing the base64-encoded PDF of the contract and either the
+                         base64-encoded PDF or the registered id of the master contract.
 
         Raises:
             CustomValidation: If there's a failure in PDF content extraction or standard comparison.
@@ -310,27 +445,32 @@ class ContractStandardComparisonEngine:
         try:
             base_base64_string = data.get("contract_pdf")
             master_base64_string = data.get("master_contract_pdf")
+            master_contract_id = data.get("master_contract_id")
             user_query = data.get("user_query")
             thread_id = data.get("thread_id")
 
-            if base_base64_string and master_base64_string:
-                base_pdf_text = UtilityFunctions.get_pdf_content(
+            if base_base64_string and (master_base64_string or master_contract_id):
+                base_profile = UtilityFunctions.get_document_profile(
                     base_base64_string)
-                master_pdf_text = UtilityFunctions.get_pdf_content(
-                    master_base64_string)
-                base_contract_info = UtilityFunctions.split_text_into_chunks_using_model(
-                    base_pdf_text, chunk_size=5000)
-                master_contract_info = UtilityFunctions.split_text_into_chunks_using_model(
-                    master_pdf_text, chunk_size=5000)
+                base_contract_info = base_profile.chunks(max_tokens=MAX_TOKEN)
                 base_contract_details = self.extract_contract_deatils(
                     base_contract_info)
-                master_contract_details = self.extract_contract_deatils(
-                    master_contract_info)
 
-                comparison_result = self.compare_standards(
+                if master_contract_id:
+                    master_contract_details = MasterContractRegistry.get_standards(
+                        master_contract_id)
+                else:
+                    master_profile = UtilityFunctions.get_document_profile(
+                        master_base64_string)
+                    master_contract_info = master_profile.chunks(max_tokens=MAX_TOKEN)
+                    master_contract_details = self.extract_contract_deatils(
+                        master_contract_info)
+
+                comparison_result, comparison = self.compare_standards(
                     base_contract_details, master_contract_details)
+                self.gpt_obj.keep_thread(self.thread_id)
 
-                return {"response": comparison_result, "thread_id": self.thread_id}
+                return {"response": comparison_result, "thread_id": self.thread_id, "comparison": comparison}
 
             else:
                 gpt_response = self.gpt_obj.next_conversion(
@@ -406,6 +546,7 @@ class CustomContractAuthoring(ContractAuthoringStrategy):
                 f"Error occurred during custom contract generation: {str(e)}")
             raise CustomValidation()
 
+    @traced()
     def generate_contract(self, gpt_obj: AzureOpenAIAssistant, **kwargs) -> str:
         """Generate a full custom contract based on user input.
 
@@ -425,11 +566,184 @@ class CustomContractAuthoring(ContractAuthoringStrategy):
             raise CustomValidation()
 
 
+class TemplateFillContractAuthoring(ContractAuthoringStrategy):
+    def __init__(self) -> None:
+        self.gpt_obj = None
+
+    def generate_contract_template(self, user_prompt: str) -> str:
+        """Generate a contract by asking the GPT for the template field values only.
+
+        The returned JSON is rendered locally into the compiled CONTRACT_TEMPLATE and the rendered
+        contract is added to the thread so follow-up edits work on the full document.
+
+        Args:
+            user_prompt (str): The user-provided input for the contract template.
+
+        Returns:
+            str: The rendered contract.
+        """
+        try:
+            prompt = CONTRACT_TEMPLATE_FILL.format(
+                user_prompt=user_prompt, fields=COMPILED_CONTRACT_TEMPLATE.describe_fields())
+
+            gpt_response = self.gpt_obj.first_conversation(
+                user_query=prompt)
+            if not gpt_response["status"]:
+                raise CustomValidation(
+                    "Failed to generate response from Azure GPT Assitant for first conversation")
+
+            template_values = UtilityFunctions.parse_json_response(gpt_response['response'], default={})
+            if not isinstance(template_values, dict):
+                template_values = {}
+            fields = template_values.get('fields')
+            contract = COMPILED_CONTRACT_TEMPLATE.render(
+                fields=fields if isinstance(fields, dict) else {},
+                scope_of_work=template_values.get('scope_of_work'),
+                custom_clauses=template_values.get('custom_clauses'))
+
+            self.gpt_obj.add_message(
+                thread_id=gpt_response['thread_id'], content=CONTRACT_DRAFT_CONTEXT.format(contract=contract))
+            return contract, gpt_response['thread_id']
+
+        except CustomValidation as exc:
+            raise exc
+        except Exception as e:
+            BACKEND_LOGGER.exception(
+                f"Error occurred during template contract generation: {str(e)}")
+            raise CustomValidation()
+
+    @traced()
+    def generate_contract(self, gpt_obj: AzureOpenAIAssistant, **kwargs) -> str:
+        """Generate a contract from the compiled template based on user input.
+
+        Returns:
+            str: The generated contract.
+        """
+        try:
+            BACKEND_LOGGER.info("Generating Template Contract")
+            self.gpt_obj = gpt_obj
+            user_prompt = kwargs.get('user_prompt')
+            return self.generate_contract_template(user_prompt)
+        except CustomValidation as exc:
+            raise exc
+        except Exception as e:
+            BACKEND_LOGGER.exception(
+                f"Error occurred during template contract generation: {str(e)}")
+            raise CustomValidation()
+
+
+class SectionParallelContractAuthoring(ContractAuthoringStrategy):
+    def __init__(self, max_workers: int = CONTRACT_SECTION_WORKERS) -> None:
+        self.gpt_obj = None
+        self.max_workers = max_workers
+
+    def plan_outline(self, user_prompt: str) -> tuple:
+        """Plan the section outline of the contract.
+
+        Args:
+            user_prompt (str): The user-provided input for the contract.
+
+        Returns:
+            tuple: The contract title, the sections as {"title", "brief"} dicts and the thread id of the plan.
+        """
+        prompt = CONTRACT_SECTION_OUTLINE.format(
+            user_prompt=user_prompt, contract_template=CONTRACT_TEMPLATE, max_sections=CONTRACT_MAX_SECTIONS)
+        gpt_response = self.gpt_obj.first_conversation(user_query=prompt)
+        if not gpt_response["status"]:
+            raise CustomValidation(
+                "Failed to generate response from Azure GPT Assitant for first conversation")
+
+        outline = UtilityFunctions.parse_json_response(gpt_response['response'], default={})
+        outline = outline if isinstance(outline, dict) else {}
+        sections = [
+            {"title": str(section["title"]).strip(), "brief": str(section.get("brief") or "").strip()}
+            for section in outline.get("sections") or []
+            if isinstance(section, dict) and str(section.get("title") or "").strip()
+        ][:CONTRACT_MAX_SECTIONS]
+        if not sections:
+            BACKEND_LOGGER.warning("Contract outline could not be parsed, using the default sections")
+            sections = [{"title": title, "brief": title} for title in DEFAULT_CONTRACT_SECTIONS]
+
+        title = str(outline.get("title") or "Contract Agreement").strip()
+        return title, sections, gpt_response['thread_id']
+
+    @traced()
+    def generate_section(self, user_prompt: str, contract_title: str, outline: str, section: dict) -> str:
+        """Generate one section of the contract in a thread of its own.
+
+        Returns:
+            str: The section text.
+        """
+        prompt = CONTRACT_SECTION_GENERATION.format(
+            user_prompt=user_prompt, contract_title=contract_title, outline=outline,
+            section_title=section["title"], section_brief=section["brief"] or section["title"])
+        gpt_response = self.gpt_obj.first_conversation(user_query=prompt)
+        if not gpt_response["status"]:
+            raise CustomValidation(
+                f"Failed to generate the contract section: {section['title']}")
+        return gpt_response['response'].strip()
+
+    def generate_contract_template(self, user_prompt: str) -> str:
+        """Generate a contract by planning its outline and writing the sections concurrently.
+
+        Sections are generated with at most `max_workers` requests in flight, assembled in
+        outline order and the assembled contract is added to the outline thread for follow-ups.
+
+        Args:
+            user_prompt (str): The user-provided input for the contract.
+
+        Returns:
+            str: The assembled contract.
+        """
+        try:
+            contract_title, sections, thread_id = self.plan_outline(user_prompt)
+            outline = "\n".join(f"{index}. {section['title']}" for index, section in enumerate(sections, 1))
+            BACKEND_LOGGER.info(f"Generating {len(sections)} contract sections")
+
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(sections)))) as executor:
+                section_texts = list(executor.map(
+                    propagate_context(
+                        lambda section: self.generate_section(user_prompt, contract_title, outline, section)),
+                    sections))
+
+            contract = "\n\n".join([contract_title.upper(), *section_texts])
+            self.gpt_obj.add_message(thread_id=thread_id, content=CONTRACT_DRAFT_CONTEXT.format(contract=contract))
+            return contract, thread_id
+
+        except CustomValidation as exc:
+            raise exc
+        except Exception as e:
+            BACKEND_LOGGER.exception(
+                f"Error occurred during sectioned contract generation: {str(e)}")
+            raise CustomValidation()
+
+    @traced()
+    def generate_contract(self, gpt_obj: AzureOpenAIAssistant, **kwargs) -> str:
+        """Generate a full contract section by section based on user input.
+
+        Returns:
+            str: The generated contract.
+        """
+        try:
+            BACKEND_LOGGER.info("Generating Sectioned Contract")
+            self.gpt_obj = gpt_obj
+            user_prompt = kwargs.get('user_prompt')
+            return self.generate_contract_template(user_prompt)
+        except CustomValidation as exc:
+            raise exc
+        except Exception as e:
+            BACKEND_LOGGER.exception(
+                f"Error occurred during sectioned contract generation: {str(e)}")
+            raise CustomValidation()
+
+
 class ContractAuthoringEngine:
     def __init__(self):
         """Initialize the ContractAuthoringEngine with available contract authoring strategies."""
         self.strategies = {
-            ContractType.CUSTOM.value: CustomContractAuthoring()
+            ContractType.CUSTOM.value: CustomContractAuthoring(),
+            ContractType.TEMPLATE.value: TemplateFillContractAuthoring(),
+            ContractType.SECTIONED.value: SectionParallelContractAuthoring(),
         }
 
     def generate_contract(self, contract_type: str, gpt_obj: AzureOpenAIAssistant,  **kwargs) -> str:
@@ -448,8 +762,10 @@ class ContractAuthoringEngine:
         if not strategy:
             raise CustomValidation(
                 f"Unsupported contract type: {contract_type}")
+        tag_strategy(type(strategy).__name__)
         return strategy.generate_contract(gpt_obj, **kwargs)
 
+    @traced()
     def generate_result(self, data: dict) -> str:
         """Generate the contract result based on input data.
 
@@ -473,9 +789,11 @@ class ContractAuthoringEngine:
             if contract_type:
                 generated_contract, thread_id = self.generate_contract(
                     contract_type, gpt_obj, user_prompt=user_prompt)
+                gpt_obj.keep_thread(thread_id)
                 return {"response": generated_contract, "thread_id": thread_id}
 
             else:
+                tag_strategy(FOLLOW_UP_STRATEGY)
                 gpt_response = gpt_obj.next_conversion(
                     user_prompt=user_query, thread_id=thread_id)
                 if not gpt_response["status"]:
@@ -496,10 +814,19 @@ class ContractSpendAnalyticsEngine:
     def __init__(self) -> None:
         self.thread_id = None
         self.gpt_obj = AzureOpenAIAssistant()
+        self.facts = None
+
+    def build_prompt(self, chunk: str) -> str:
+        prompt = REVENUE_LEAKAGE_CHUNK.format(chunk=chunk, revenue_leakage_points=REVENUE_LEAKAGE_POINTS)
+        if TABLE_START in chunk:
+            prompt += TABLE_FORMAT_NOTE
+        if self.facts:
+            prompt += CONTRACT_FACTS_CONTEXT.format(facts=self.facts.to_prompt_context())
+        return prompt
 
     def identify_revenue_leakage(self, chunk: str) -> str:
         """
-        Identify potential revenue leakages in a text chunk.
+        Identify potential revenue leakages in a text chunk, in a thread of its own.
 
         Args:
             chunk (str): A chunk of text from the document to analyze.
@@ -512,24 +839,12 @@ class ContractSpendAnalyticsEngine:
             str: GPT response containing potential revenue leakages.
         """
         try:
-            prompt = f"Identify the potential revenue leakages in the {chunk} by referring to \
-                the {REVENUE_LEAKAGE_POINTS}"
-
-            if self.thread_id is None:
-                gpt_response = self.gpt_obj.first_conversation(
-                    user_query=prompt)
-                if not gpt_response["status"]:
-                    raise CustomValidation(
-                        "Failed to generate response from Azure GPT Assitant for first conversation")
-
-                self.thread_id = gpt_response['thread_id']
-
-            else:
-                gpt_response = self.gpt_obj.next_conversion(
-                    user_prompt=prompt, thread_id=self.thread_id)
-                if not gpt_response["status"]:
-                    raise CustomValidation(
-                        "Failed to generate response from Azure GPT Assitant for after first conversation")
+            gpt_response = self.gpt_obj.first_conversation(
+                user_query=self.build_prompt(chunk))
+            if not gpt_response["status"]:
+                raise CustomValidation(
+                    "Failed to generate response from Azure GPT Assitant for first conversation")
+            self.thread_id = gpt_response['thread_id']
 
             return gpt_response['response']
 
@@ -541,12 +856,13 @@ class ContractSpendAnalyticsEngine:
                 f"Error occurred in identify_revenue_leakage of Contract Spend Analytics: {str(e)}")
             raise CustomValidation()
 
-    def summarize_document(self, document: str) -> str:
+    @traced()
+    def summarize_document(self, profile: DocumentProfile) -> str:
         """
         Summarize the entire document by analyzing chunks for revenue leakage.
 
         Args:
-            document (str): The full text of the document to summarize.
+            profile (DocumentProfile): Profile of the document to summarize.
 
         Raises:
             CustomValidation: If the revenue leakage identification fails.
@@ -556,10 +872,21 @@ class ContractSpendAnalyticsEngine:
             str: Combined summary of potential revenue leakages in the document.
         """
         try:
-            chunks = UtilityFunctions.split_text_into_chunks(document)
-            summaries = [self.identify_revenue_leakage(
-                chunk) for chunk in chunks]
-            combined_summary = ' '.join(summaries)
+            unique_chunks, _ = NEAR_DUPLICATE_FILTER.filter(profile.chunks(MAX_TOKEN))
+            relevant_chunks = [unique_chunks[index] for index in FINANCIAL_RELEVANCE_SCORER.select(
+                [chunk.text for chunk in unique_chunks])]
+            # Worst case overhead, a payload holding a table gets the table format note.
+            payloads = TOKEN_BUDGET_PLANNER.pack(
+                relevant_chunks, self.build_prompt("") + TABLE_FORMAT_NOTE, REVENUE_LEAKAGE_OUTPUT_TOKENS)
+            BACKEND_LOGGER.info(
+                f"Relevance prefilter kept {len(relevant_chunks)} of {len(unique_chunks)} chunks for spend analytics, "
+                f"sent in {len(payloads)} calls")
+            summaries = []
+            for index, payload in enumerate(payloads):
+                with trace_span("chunk", chunk_index=index):
+                    summaries.append(self.identify_revenue_leakage(payload))
+            combined_summary, self.thread_id = reduce_partial_results(
+                self.gpt_obj, summaries, REVENUE_LEAKAGE_REDUCE, "revenue leakage analysis", self.thread_id)
             return combined_summary
 
         except CustomValidation as exc:
@@ -570,6 +897,7 @@ class ContractSpendAnalyticsEngine:
                 f"Error occurred while summarizing the document in Contract Spend Analytics: {str(e)}")
             raise CustomValidation()
 
+    @traced()
     def generate_result(self, data: dict) -> str:
         """
         Generate a result by analyzing the contract PDF for revenue leakages.
@@ -591,12 +919,20 @@ class ContractSpendAnalyticsEngine:
             user_query = data.get("user_query")
             thread_id = data.get("thread_id")
             if base64_string:
-                pdf_text = UtilityFunctions.get_pdf_content(base64_string)
+                profile = UtilityFunctions.get_document_profile(base64_string)
+                self.facts = extract_contract_facts(profile)
 
-                contract_analysis = self.summarize_document(pdf_text)
+                contract_analysis = self.summarize_document(profile)
+                self.gpt_obj.keep_thread(self.thread_id)
+                self.facts.save(self.thread_id)
                 return {"response": contract_analysis, "thread_id": self.thread_id}
 
             else:
+                tag_strategy(FOLLOW_UP_STRATEGY)
+                local_answer = ContractFacts.answer_from_thread(thread_id, user_query, self.gpt_obj)
+                if local_answer:
+                    return {"response": local_answer, "thread_id": thread_id}
+
                 gpt_response = self.gpt_obj.next_conversion(
                     user_prompt=user_query, thread_id=thread_id)
                 if not gpt_response["status"]:
@@ -619,6 +955,78 @@ class SimpleContractConversationalEngine:
         self.thread_id = None
         self.gpt_obj = AzureOpenAIAssistant()
 
+    def build_passages(self, profile: DocumentProfile) -> list:
+        """
+        Split the contract into retrieval passages labelled with their page number.
+
+        Args:
+            profile (DocumentProfile): Profile of the contract.
+
+        Returns:
+            list: (token count, passage) pairs in document order.
+        """
+        return [(chunk.token_count, f"[Page {profile.page_of(chunk.start_char) + 1}] {chunk.text}")
+                for chunk in profile.chunks(RETRIEVAL_PASSAGE_TOKENS)]
+
+    def passage_budget(self, prompt_overhead: str, share: float) -> int:
+        """
+        Return the tokens of contract text a prompt may carry, a share of the payload budget of the call.
+        """
+        return max(int(TOKEN_BUDGET_PLANNER.payload_budget(prompt_overhead, CONVERSATION_OUTPUT_TOKENS) * share), 1)
+
+    def select_passages(self, passages: list, budget: int) -> list:
+        """
+        Keep passages in order while their tokens fit the budget.
+        """
+        selected, selected_tokens = [], 0
+        for token_count, passage in passages:
+            if selected_tokens + token_count > budget:
+                break
+            selected.append(passage)
+            selected_tokens += token_count
+        return selected
+
+    def build_first_prompt(self, profile: DocumentProfile, passages: list, facts: ContractFacts = None) -> str:
+        """
+        Build the first prompt, embedding the whole contract only when it fits the overview budget.
+        """
+        facts_context = CONTRACT_FACTS_CONTEXT.format(facts=facts.to_prompt_context()) if facts else ""
+        budget = self.passage_budget(
+            CONTRACT_CONVERSATION_OVERVIEW.format(passages="") + facts_context, RETRIEVAL_OVERVIEW_SHARE)
+        if profile.token_count <= budget:
+            return f"Analysis the passed contract, provide the response of user query based on passed contract \
+                    text. CONTRACT TEXT : {profile.text}" + facts_context
+
+        overview = self.select_passages(passages, budget)
+        return CONTRACT_CONVERSATION_OVERVIEW.format(passages="\n\n".join(overview)) + facts_context
+
+    def build_follow_up_prompt(self, user_query: str, thread_id: str) -> str:
+        """
+        Attach the most relevant contract passages of the thread to the user query.
+
+        As many passages as fit the retrieval budget are attached. Threads without a retrieval index get the
+        user query unchanged.
+        """
+        try:
+            index = BM25Index.load(thread_id)
+        except Exception as e:
+            BACKEND_LOGGER.exception(
+                f"Failed to load retrieval index of thread {thread_id}: {str(e)}")
+            index = None
+
+        if index is None:
+            return user_query
+
+        budget = self.passage_budget(
+            CONTRACT_RETRIEVAL_QUERY.format(passages="", user_query=user_query), RETRIEVAL_PASSAGES_SHARE)
+        passages = self.select_passages(
+            [(TOKEN_BUDGET_PLANNER.count_tokens(passage), passage)
+             for _, passage in index.search(user_query, max(budget // RETRIEVAL_PASSAGE_TOKENS, 1))], budget)
+        if not passages:
+            return user_query
+        return CONTRACT_RETRIEVAL_QUERY.format(passages="\n\n".join(passages), user_query=user_query)
+
+    @traced()
     def generate_result(self, data: dict) -> str:
         try:
             BACKEND_LOGGER.info("Inside Simple Contract Conversation")
@@ -627,20 +1035,34 @@ class SimpleContractConversationalEngine:
             user_query = data.get("user_query")
             thread_id = data.get("thread_id")
             if base64_string:
-                pdf_text = UtilityFunctions.get_pdf_content(base64_string)
-                prompt = f"Analysis the passed contract, provide the response of user query based on passed contract \
-                    text. CONTRACT TEXT : {pdf_text}"
+                profile = UtilityFunctions.get_document_profile(base64_string)
+                passages = self.build_passages(profile)
+                facts = extract_contract_facts(profile)
+                prompt = self.build_first_prompt(profile, passages, facts)
                 gpt_response = self.gpt_obj.first_conversation(
                     user_query=prompt)
                 if not gpt_response["status"]:
                     raise CustomValidation(
                         "Failed to generate response from Azure GPT Assitant for after first conversation")
-                self.thread_id = gpt_response['thread_id']
+                self.thread_id = self.gpt_obj.keep_thread(gpt_response['thread_id'])
+
+                try:
+                    BM25Index.build([passage for _, passage in passages]).save(self.thread_id)
+                except Exception as e:
+                    BACKEND_LOGGER.exception(
+                        f"Failed to persist retrieval index of thread {self.thread_id}: {str(e)}")
+                facts.save(self.thread_id)
+
                 return {"response": gpt_response['response'], "thread_id": self.thread_id}
 
             else:
+                tag_strategy(FOLLOW_UP_STRATEGY)
+                local_answer = ContractFacts.answer_from_thread(thread_id, user_query, self.gpt_obj)
+                if local_answer:
+                    return {"response": local_answer, "thread_id": thread_id}
+
                 gpt_response = self.gpt_obj.next_conversion(
-                    user_prompt=user_query, thread_id=thread_id)
+                    user_prompt=self.build_follow_up_prompt(user_query, thread_id), thread_id=thread_id)
                 if not gpt_response["status"]:
                     raise CustomValidation(
                         "Failed to generate response from Azure GPT Assitant for after first conversation")
@@ -6,6 +6,7 @@ from base.utils import (ContractAuthoringEngine, ContractSpendAnalyticsEngine,
                         ContractStandardComparisonEngine,
                         ContractSummarizationEngine,
                         SimpleContractConversationalEngine)
+from backend.metrics import timed_stage
 from backend.utils import CustomResponse, CustomValidation
 
 from .serializers import (ContractAuthoringSerializer,
@@ -25,8 +26,10 @@ class ContractSummarization(APIView):
     def post(self, request, *args, **kwargs):
         try:
             serializer = ContractSummarizationSerializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            response = ContractSummarizationEngine().generate_result(serializer.data)
+            with timed_stage("validation"):
+                serializer.is_valid(raise_exception=True)
+                data = serializer.data
+            response = ContractSummarizationEngine().generate_result(data)
             return CustomResponse(data=response)
 
         except CustomValidation as exc:
@@ -45,8 +48,10 @@ class ContractAuthoring(APIView):
     def post(self, request, *args, **kwargs):
         try:
             serializer = ContractAuthoringSerializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            response = ContractAuthoringEngine().generate_result(serializer.data)
+            with timed_stage("validation"):
+                serializer.is_valid(raise_exception=True)
+                data = serializer.data
+            response = ContractAuthoringEngine().generate_result(data)
             return CustomResponse(data=response)
 
         except CustomValidation as exc:
@@ -66,8 +71,10 @@ class ContractStandardComparison(APIView):
         try:
             serializer = ContractStandardComparisonSerializer(
                 data=request.data)
-            serializer.is_valid(raise_exception=True)
-            response = ContractStandardComparisonEngine().generate_result(serializer.data)
+            with timed_stage("validation"):
+                serializer.is_valid(raise_exception=True)
+                data = serializer.data
+            response = ContractStandardComparisonEngine().generate_result(data)
             return CustomResponse(data=response)
 
         except CustomValidation as exc:
@@ -86,8 +93,10 @@ class ContractSpendAnalytics(APIView):
     def post(self, request, *args, **kwargs):
         try:
             serializer = ContractSpendAnalyticsSerializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            response = ContractSpendAnalyticsEngine().generate_result(serializer.data)
+            with timed_stage("validation"):
+                serializer.is_valid(raise_exception=True)
+                data = serializer.data
+            response = ContractSpendAnalyticsEngine().generate_result(data)
             return CustomResponse(data=response)
 
         except CustomValidation as exc:
@@ -106,8 +115,10 @@ class ContractConversational(APIView):
     def post(self, request, *args, **kwargs):
         try:
             serializer = ContractConversationalSerializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            response = SimpleContractConversationalEngine().generate_result(serializer.data)
+            with timed_stage("validation"):
+                serializer.is_valid(raise_exception=True)
+                data = serializer.data
+            response = SimpleContractConversationalEngine().generate_result(data)
             return CustomResponse(data=response)
 
         except CustomValidation as exc: